@@ -1,24 +1,23 @@
 import subprocess
 import os
-import uproot
 import numpy as np
+from tesssapy.schema import BranchSchema
 
 
 class PyRunner:
+    # columns read from the events tree, resolved to branch names by BranchSchema
+    columns = ["rx", "ry", "rz", "timeStamp", "edep"]
+
     def __init__(self, file_path):
         self.file_path = file_path  
 
     def get_root_tree(self):
         """Load arrays from ROOT TTree"""
-        with uproot.open(self.file_path) as root_file:
-            tree = root_file["events"]
-            Params = list(tree.keys())
-            rx   = tree[Params[7]].array(library="np")
-            ry   = tree[Params[8]].array(library="np")
-            rz   = tree[Params[9]].array(library="np")
-            t    = tree[Params[13]].array(library="np")
-            edep = tree[Params[16]].array(library="np")
-        return rx, ry, rz, t, edep
+        # raises a KeyError listing the available branches if a column is missing
+        arrays = BranchSchema(self.columns).resolve(self.file_path).read(self.file_path)
+        if arrays is None:
+            raise OSError(f"Cannot read the events tree of {self.file_path}")
+        return tuple(arrays[col] for col in self.columns)
 
 
 def run_macro(executable, macro_file, output_file):
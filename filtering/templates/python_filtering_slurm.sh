@@ -0,0 +1,28 @@
+#!/bin/bash
+#SBATCH --job-name=CuFilter            # Job name
+#SBATCH --output=CuFilter_%A_%a.out    # Standard output log
+#SBATCH --error=CuFilter_%A_%a.err     # Error log
+#SBATCH --time=2-23:30:00
+#SBATCH --cpus-per-task=8
+#SBATCH --partition=long
+#SBATCH --mem-per-cpu=3GB
+#SBATCH --array=0-2                     # 3 tasks: 0=K40, 1=Th232, 2=U238
+
+# Same as single_filtering_slurm.sh, with the Python filter (no ROOT needed)
+
+# Liste des isotopes
+ISOTOPES=("K40" "Th232" "U238")
+ISO=${ISOTOPES[$SLURM_ARRAY_TASK_ID]}
+
+# Dossiers
+INPUT_DIR="path/to/your/simulation/data"  # à remplacer
+OUT_FOLDER="path/to/your/output/data"     # à remplacer
+mkdir -p "$OUT_FOLDER"
+
+echo "----------------------------------------"
+echo "Processing isotope: $ISO"
+echo "----------------------------------------"
+
+python -m tesssapy.filtering "$OUT_FOLDER" "$INPUT_DIR"/Cu_${ISO}_*.root --workers "$SLURM_CPUS_PER_TASK"
+
+echo "Job for $ISO finished!"
@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+from .norm_table import LAYER_ALIASES
+
+
+class ActivityScan:
+    """
+    Spectra and rates for many alternative activity (or flux) tables at once.
+
+    The normalization is linear in the activity, so the spectra of a dataset
+    are kept per unit activity, in a SpectrumTensor of shape (layer, isotope,
+    bin), with their Monte Carlo statistical errors. M candidate tables are then an (M, layer, isotope) matrix, and all
+    their spectra come out of one matrix product, without reading any data.
+
+    How to use:
+    >>> scan = sim.activity_scan()                        # sim is a g4_sim_proc
+    >>> A, S = scan.matrix([assay_1, assay_2])            # DataFrames in the materials_data.csv format
+    >>> res = scan.evaluate(A, S, e_lo=0, e_hi=100)
+    >>> res["rate"], res["layer_rate"]                    # shapes (M,) and (M, layer)
+    """
+
+    def __init__(self, unit_spectra, component="internals"):
+        self.unit = unit_spectra
+        self.component = component
+        self.layers = self.unit.layers
+        self.isotopes = self.unit.isotopes
+        self.energy = self.unit.energy
+
+    def matrix(self, tables, rate_col=None, sigma_col="Sigma"):
+        """
+        Build the (M, layer, isotope) activity and sigma matrices from M tables.
+
+        Each table is a DataFrame in the format of materials_data.csv (Material,
+        Isotope, Activity, Sigma) or of rock_data.csv (Particule, Isotope, Flux,
+        Sigma). (layer, isotope) missing from a table get 0. The sigma matrix is
+        None if the tables have no sigma column.
+        """
+        if isinstance(tables, pd.DataFrame):
+            tables = [tables]
+        internals = self.component == "internals"
+        layer_col = "Material" if internals else "Particule"
+        rate_col = rate_col or ("Activity" if internals else "Flux")
+
+        shape = (len(tables), len(self.layers), len(self.isotopes))
+        A = np.zeros(shape, dtype=np.float64)
+        S = np.zeros(shape, dtype=np.float64) if all(sigma_col in t for t in tables) else None
+        for m, t in enumerate(tables):
+            if not internals and "Material" in t:
+                t = t[t["Material"].astype(str).str.strip().str.lower() == self.component]
+            layer = t[layer_col].astype(str).str.strip().replace(LAYER_ALIASES)
+            l = layer.map(self.unit.layer_index)
+            i = t["Isotope"].astype(str).str.strip().map(self.unit.iso_index)
+            ok = (l.notna() & i.notna()).to_numpy()
+            l, i = l[ok].astype(int).to_numpy(), i[ok].astype(int).to_numpy()
+            A[m, l, i] = pd.to_numeric(t[rate_col], errors="coerce").fillna(0.0).to_numpy()[ok]
+            if S is not None:
+                S[m, l, i] = pd.to_numeric(t[sigma_col], errors="coerce").fillna(0.0).to_numpy()[ok]
+        return A, S
+
+    def evaluate(self, activities, sigmas=None, e_lo=None, e_hi=None):
+        """
+        Spectra and rates of M activity tables given as an (M, layer, isotope) matrix.
+
+        Rates are the sum of the spectrum over the bins whose center is in
+        [e_lo, e_hi] (the whole range by default), as in print_simulation_summary.
+        Errors are those of g4_sim_proc: the Monte Carlo statistics and, if
+        given, the sigmas (propagated bin by bin), in quadrature over isotopes.
+        Returns a dict of arrays:
+            counts (M, bin), layer_counts (M, layer, bin), rate (M,), layer_rate (M, layer)
+        and the matching *_err entries.
+        """
+        A = np.asarray(activities, dtype=np.float64)
+        if A.ndim == 2:
+            A = A[None]
+        U = self.unit.counts
+
+        window = np.ones(len(self.energy), dtype=bool)
+        if e_lo is not None:
+            window &= self.energy >= e_lo
+        if e_hi is not None:
+            window &= self.energy <= e_hi
+        U_rate = U[:, :, window].sum(axis=2)          # (layer, isotope) rate per unit activity
+
+        res = {}
+        res["layer_counts"] = np.einsum("mli,lib->mlb", A, U, optimize=True)
+        res["counts"] = res["layer_counts"].sum(axis=1)
+        res["layer_rate"] = np.einsum("mli,li->ml", A, U_rate)
+        res["rate"] = res["layer_rate"].sum(axis=1)
+
+        # statistical errors are independent between bins: quadrature over bins too
+        A2, U_var = np.square(A), np.square(self.unit.counts_err)
+        layer_var = np.einsum("mli,lib->mlb", A2, U_var, optimize=True)
+        layer_rate_var = np.einsum("mli,li->ml", A2, U_var[:, :, window].sum(axis=2))
+        if sigmas is not None:
+            S2 = np.square(np.asarray(sigmas, dtype=np.float64).reshape(A.shape))
+            layer_var += np.einsum("mli,lib->mlb", S2, np.square(U), optimize=True)
+            # a sigma scales every bin of its isotope together: linear sum over bins, quadrature over isotopes
+            layer_rate_var += np.einsum("mli,li->ml", S2, np.square(U_rate))
+        res["layer_counts_err"] = np.sqrt(layer_var)
+        res["counts_err"] = np.sqrt(layer_var.sum(axis=1))
+        res["layer_rate_err"] = np.sqrt(layer_rate_var)
+        res["rate_err"] = np.sqrt(layer_rate_var.sum(axis=1))
+        return res
@@ -0,0 +1,287 @@
+import os
+import json
+import pandas as pd
+from functools import partial
+from .schema import BranchSchema
+from .events import TASK_KEY
+from .get_norm_param import read_run_metadata
+from .dataset_index import COLUMNS, DatasetIndex, parse_file_name
+from .parallel import pool_map
+from .fiducial import POSITION_COLUMNS, Box, Cylinder
+
+# pyarrow is optional, only needed to export or read a store
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as pads
+    import pyarrow.fs as pafs
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# Columns of the events tree used by the analysis (levels, cuts, coincidences, edep)
+STORE_COLUMNS = ["eventID", "clusterIndex", "timeStamp", "rx", "ry", "rz", "edep"]
+# Columns stored only when the tree has them (weight of biased runs, see g4_sim_proc(weight=...))
+OPTIONAL_COLUMNS = ["weight", TASK_KEY]
+# Directory levels of the store: <root>/component=internals/layer=Cu/isotope=K40/bias=boff/task=3/part.arrow
+PARTITIONS = ["component", "layer", "isotope", "bias", "task"]
+SUFFIXES = {"arrow": ".arrow", "parquet": ".parquet"}
+
+
+def require_pyarrow():
+    if pa is None:
+        raise ImportError("pyarrow is needed for the Arrow/Parquet store: pip install pyarrow")
+
+
+def is_store_file(file_path):
+    return file_path.endswith(tuple(SUFFIXES.values()))
+
+
+def store_format(file_path):
+    return "ipc" if file_path.endswith(SUFFIXES["arrow"]) else "parquet"
+
+
+def read_store_metadata(file_path):
+    """beamOn and masses of a store file, from its schema metadata (the data is not read)."""
+    require_pyarrow()
+    if store_format(file_path) == "ipc":
+        with pa.memory_map(file_path) as source:
+            metadata = pa.ipc.open_file(source).schema.metadata or {}
+    else:
+        metadata = pq.read_schema(file_path, memory_map=True).metadata or {}
+    return json.loads(metadata.get(b"tesssa", b'{"beamon": null, "masses": {}}'))
+
+
+def cut_expression(cut):
+    """
+    pyarrow expression keeping the hits a fiducial Box or Cylinder keeps,
+    with the arithmetic of its mask; None for other cuts.
+    """
+    x, y, z = (pc.field(col) for col in POSITION_COLUMNS)
+    if isinstance(cut, Box):
+        expr = None
+        for r, lo, hi in zip((x, y, z), cut.lo.tolist(), cut.hi.tolist()):
+            inside = (r - lo >= cut.margin) & (pc.scalar(hi) - r >= cut.margin)
+            expr = inside if expr is None else expr & inside
+        return expr
+    if isinstance(cut, Cylinder):
+        dx, dy = x - cut.center[0], y - cut.center[1]
+        return ((pc.scalar(float(cut.radius)) - pc.sqrt(dx * dx + dy * dy) >= cut.margin)
+                & (z - cut.z_lo >= cut.margin) & (pc.scalar(float(cut.z_hi)) - z >= cut.margin))
+    return None
+
+
+def store_filter(cuts=(), level="hit", xLow=None, xHigh=None):
+    """
+    pyarrow expression of the selections the store reader can apply itself
+    (predicate pushdown, see ArrowSchema): the fiducial cuts and, at hit
+    level, the energy range [xLow, xHigh] of the histograms. The energy of
+    an event is a sum over its hits, so its range is not cut on the hits.
+    Other cuts are still applied after the read. None if nothing applies.
+
+    How to use:
+    >>> schema = ArrowSchema(["rx", "ry", "rz", "edep"], filter=store_filter([Box(lo, hi)], "hit", 0, 5000))
+    """
+    require_pyarrow()
+    exprs = [expr for expr in map(cut_expression, cuts or []) if expr is not None]
+    if level == "hit" and xLow is not None:
+        exprs.append(pc.field("edep") >= xLow)
+    if level == "hit" and xHigh is not None:
+        exprs.append(pc.field("edep") <= xHigh)
+    if not exprs:
+        return None
+    expr = exprs[0]
+    for other in exprs[1:]:
+        expr = expr & other
+    return expr
+
+
+def open_store_dataset(paths):
+    """pyarrow dataset of store files, memory-mapped for Arrow IPC files."""
+    require_pyarrow()
+    paths = [paths] if isinstance(paths, str) else list(paths)
+    return pads.dataset(paths, format=store_format(paths[0]), filesystem=pafs.LocalFileSystem(use_mmap=True))
+
+
+def export_file(file_path, out_path, columns=STORE_COLUMNS, fmt="arrow", step_size="100 MB",
+                optional=OPTIONAL_COLUMNS):
+    """
+    Write the columns of the events tree of one ROOT file to an Arrow IPC (or
+    Parquet) file, chunk by chunk, with its beamOn and masses in the schema
+    metadata. The optional columns are added when the tree has them. Returns
+    the number of rows written.
+    """
+    require_pyarrow()
+    schema = BranchSchema([col for col in columns if col != "edep"] + ["edep"], optional=optional).resolve(file_path)
+    meta = read_run_metadata(file_path)
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    tmp_path = out_path + ".tmp"
+
+    writer, rows = None, 0
+    try:
+        for arrays in schema.iterate(file_path, step_size=step_size):
+            batch = pa.record_batch({col: pa.array(a) for col, a in arrays.items()})
+            if writer is None:
+                arrow_schema = batch.schema.with_metadata({"tesssa": json.dumps(meta)})
+                writer = pa.ipc.new_file(tmp_path, arrow_schema) if fmt == "arrow" \
+                    else pq.ParquetWriter(tmp_path, arrow_schema)
+            writer.write_batch(batch.replace_schema_metadata(arrow_schema.metadata))
+            rows += batch.num_rows
+        if writer is None:
+            # no readable tree: empty file, still carrying the beamOn of the task
+            arrow_schema = pa.schema([(col, pa.float64()) for col in schema.branches or schema.columns],
+                                     metadata={"tesssa": json.dumps(meta)})
+            writer = pa.ipc.new_file(tmp_path, arrow_schema) if fmt == "arrow" \
+                else pq.ParquetWriter(tmp_path, arrow_schema)
+    finally:
+        if writer is not None:
+            writer.close()
+    # readers never see a half-written file
+    os.replace(tmp_path, out_path)
+    return rows
+
+
+def export_job(job, columns=STORE_COLUMNS, fmt="arrow", step_size="100 MB"):
+    file_path, out_path = job
+    return export_file(file_path, out_path, columns, fmt, step_size)
+
+
+class ArrowSchema(BranchSchema):
+    """
+    BranchSchema reading the columns of Arrow IPC / Parquet store files
+    instead of ROOT trees, so every reader of sim_processing works on a store.
+
+    Only the columns needed are read (projection) and filter, a pyarrow
+    expression, is applied by the reader (predicate pushdown). IPC files are
+    memory-mapped: reading a file again is served by the page cache.
+
+    How to use:
+    >>> import pyarrow.dataset as pads
+    >>> schema = ArrowSchema(["edep"], filter=pads.field("edep") > 10)
+    >>> edep = schema.read(path)["edep"]
+    """
+
+    def __init__(self, columns, filter=None, optional=()):
+        require_pyarrow()
+        super().__init__(columns, optional=optional)
+        self.filter = filter
+
+    def resolve(self, file_paths):
+        """Check the columns against the schema of the first store file."""
+        if isinstance(file_paths, str):
+            file_paths = [file_paths]
+        if not file_paths:
+            return self
+        names = open_store_dataset(file_paths[0]).schema.names
+        missing = [col for col in self.columns if col not in names]
+        if missing:
+            raise KeyError(f"Columns {missing} not found in {file_paths[0]}. Available columns: {sorted(names)}")
+        self.branches = {col: col for col in self.columns + self.optional if col in names}
+        return self
+
+    def read_columns(self):
+        """Columns to read: the resolved ones, optional columns of the store included."""
+        return list(self.branches) if self.branches else self.columns
+
+    def read(self, file_path, **kwargs):
+        """Read the columns of one store file, as a dict column -> NumPy array (None if unreadable)."""
+        try:
+            table = open_store_dataset(file_path).to_table(columns=self.read_columns(), filter=self.filter)
+        except (OSError, pa.ArrowException):
+            return None
+        return {col: table.column(col).to_numpy() for col in table.column_names}
+
+    def iterate(self, file_path, step_size="100 MB", **kwargs):
+        """Read one store file batch by batch (step_size rows if an int, whole record batches otherwise)."""
+        try:
+            dataset = open_store_dataset(file_path)
+        except (OSError, pa.ArrowException):
+            return
+        batch_size = step_size if isinstance(step_size, int) else 1 << 20
+        for batch in dataset.to_batches(columns=self.read_columns(), filter=self.filter, batch_size=batch_size):
+            if batch.num_rows:
+                yield {col: batch.column(col).to_numpy() for col in batch.schema.names}
+
+
+class ArrowStore:
+    """
+    Columnar copy of the filtered hits, partitioned by component, layer,
+    isotope, bias and task (hive directories), in Arrow IPC or Parquet files.
+
+    Only STORE_COLUMNS (and OPTIONAL_COLUMNS found, the weight of biased
+    runs and the task key of compacted shards) are kept, and each file carries the beamOn and masses of
+    its task in the schema metadata, so a store is enough to normalize the
+    spectra. Other tools can read it as a hive partitioned dataset.
+
+    How to use:
+    >>> store = ArrowStore("path/to/store")
+    >>> store.export(DatasetIndex("path/to/filtered").select(stage="filtered"), workers=8)
+    >>> store.select(component="internals", layer="Cu", isotope="K40")          # like DatasetIndex.select
+    >>> store.scan(["edep"], pads.field("edep") > 100, layer="Cu").to_pandas()  # pushed down to the reader
+    >>> g4_sim_proc("internals", "path/to/store", stage="arrow")
+    """
+
+    select = DatasetIndex.select
+
+    def __init__(self, root, fmt="arrow", columns=STORE_COLUMNS):
+        require_pyarrow()
+        self.root = root
+        self.fmt = fmt
+        self.columns = list(columns)
+        self.refresh()
+
+    def file_path(self, fields):
+        parts = [f"{key}={fields[key]}" for key in PARTITIONS]
+        return os.path.join(self.root, *parts, "part" + SUFFIXES[self.fmt])
+
+    def refresh(self):
+        """Table of the store files, with the columns of a DatasetIndex (stage "arrow")."""
+        rows = []
+        for dirpath, _, file_names in os.walk(self.root):
+            fields = dict(part.split("=", 1) for part in os.path.relpath(dirpath, self.root).split(os.sep)
+                          if "=" in part)
+            fields = {key: None if value == "None" else value for key, value in fields.items()}
+            if set(fields) != set(PARTITIONS):
+                continue
+            for name in file_names:
+                if not is_store_file(name):
+                    continue
+                path = os.path.join(dirpath, name)
+                st = os.stat(path)
+                rows.append({**fields, "task": int(fields["task"]), "stage": "arrow", "path": path,
+                             "size": st.st_size, "mtime": st.st_mtime_ns})
+        self.table = pd.DataFrame(rows, columns=COLUMNS)
+        return self
+
+    def export(self, files, workers=1, step_size="100 MB"):
+        """
+        Export the rows of a DatasetIndex table (or a list of file paths) to the
+        store, on `workers` processes. Returns the number of rows of each file.
+        """
+        paths = list(files["path"]) if isinstance(files, pd.DataFrame) else list(files)
+        jobs = []
+        for path in paths:
+            fields = parse_file_name(os.path.basename(path))
+            if fields is None:
+                print(f"Skipping {path}: unknown file name")
+                continue
+            jobs.append((path, self.file_path(fields)))
+
+        func = partial(export_job, columns=self.columns, fmt=self.fmt, step_size=step_size)
+        rows = list(pool_map(func, jobs, workers=workers))
+        self.refresh()
+        return rows
+
+    def run_metadata(self, files):
+        """dict path -> {"beamon", "masses"} for the rows of a store table, from the schema metadata."""
+        return {path: read_store_metadata(path) for path in files["path"]}
+
+    def scan(self, columns=None, filter=None, **partitions):
+        """
+        Read the store as one table: only the columns given, the rows matching
+        filter (a pyarrow expression) and the partitions given (e.g. layer="Cu").
+        """
+        files = self.select(**partitions)
+        if files.empty:
+            return None
+        return open_store_dataset(files["path"]).to_table(columns=columns, filter=filter)
@@ -0,0 +1,159 @@
+import numpy as np
+from .schema import BranchSchema
+from .events import TASK_KEY, event_ids
+from .histogram import StreamHist
+from .parallel import pool_map
+
+# Delayed coincidences of the decay chains (energies in keV, times in ns as in the timeStamp branch):
+# the prompt beta is followed by the alpha of a short-lived polonium within a few half-lives.
+DECAY_CHAINS = {
+    "BiPo214": {"prompt": (0.0, 3270.0), "delayed": (7000.0, 8000.0), "min_delay": 0.0, "window": 1.0e6},  # Po214 T1/2 = 164 us
+    "BiPo212": {"prompt": (0.0, 2254.0), "delayed": (8500.0, 9000.0), "min_delay": 0.0, "window": 3.0e3},  # Po212 T1/2 = 0.3 us
+}
+
+
+def merge_deposits(event, t, edep, resolution):
+    """
+    Sort the hits by (event, time) and merge the hits of an event closer in time
+    than resolution into one deposit (energy summed, time of the first hit).
+
+    Returns (event, t, energy) of the deposits, sorted by (event, time).
+    """
+    order = np.lexsort((t, event))
+    event, t, edep = event[order], t[order], edep[order]
+    new = np.ones(len(t), dtype=bool)
+    new[1:] = (event[1:] != event[:-1]) | (np.diff(t) > resolution)
+    starts = np.flatnonzero(new)
+    return event[starts], t[starts], np.add.reduceat(edep.astype(np.float64), starts)
+
+
+def event_time_keys(event, t):
+    """
+    Sortable (event, time) keys for searchsorted.
+
+    Complex numbers sort lexicographically in NumPy (real part, then imaginary
+    part), so event + 1j*t keeps the deposits of an event together and in time
+    order, and a window in time never reaches another event.
+    """
+    return event.astype(np.float64) + 1j * t.astype(np.float64)
+
+
+def count_in_window(keys, targets, t_lo, t_hi):
+    """For each target, the number of keys of the same event with time in [target + t_lo, target + t_hi]."""
+    lo = np.searchsorted(keys, targets + 1j * t_lo, side="left")
+    hi = np.searchsorted(keys, targets + 1j * t_hi, side="right")
+    return hi - lo
+
+
+class CoincidenceAnalysis:
+    """
+    Time coincidences between the energy deposits of each event, from the
+    timeStamp of the hits.
+
+    Hits are merged into deposits (resolution, in ns), sorted by (event, time),
+    then every window query is a searchsorted. A deposit with another deposit
+    of its event within +-window is coincident, and so are the deposits of the
+    decay chains given (see DECAY_CHAINS). Files are read in chunks of whole
+    events and processed in parallel. The histogram range is widened, at the
+    same bin width, to hold the prompt and delayed windows of every chain
+    (the BiPo alphas lie above the default xHigh).
+
+    Output StreamHists of the deposit energy:
+        "all"            : every deposit
+        "anticoincident" : deposits without any coincidence, kept by a veto
+        "coincident"     : deposits with a coincidence (window or chain), removed by a veto
+        <chain>          : deposits of each decay chain (prompt and delayed)
+
+    How to use:
+    >>> ana = CoincidenceAnalysis(window=1000, chains=["BiPo214"])
+    >>> hists = ana.run(index.select(layer="Cu", isotope="U238", stage="filtered")["path"], workers=4)
+    >>> hists["anticoincident"].counts, hists["BiPo214"].counts
+    """
+
+    def __init__(self, window=1.0e3, resolution=10.0, chains=(), bins=5000, xLow=0, xHigh=5000,
+                 step_size="100 MB"):
+        self.window = window
+        self.resolution = resolution
+        self.chains = {name: DECAY_CHAINS[name] if isinstance(name, str) else name for name in chains}
+        self.bins, self.xLow, self.xHigh = bins, xLow, xHigh
+        self.cover_chains()
+        self.step_size = step_size
+        self.schema = BranchSchema(["eventID", "timeStamp", "edep"], optional=[TASK_KEY])
+
+    def cover_chains(self):
+        """Widen [xLow, xHigh] at the same bin width to hold every prompt and delayed window."""
+        windows = [chain[part] for chain in self.chains.values() for part in ("prompt", "delayed")]
+        if not windows:
+            return
+        width = (self.xHigh - self.xLow) / self.bins
+        low = min([self.xLow] + [w[0] for w in windows])
+        high = max([self.xHigh] + [w[1] for w in windows])
+        extra_low = int(np.ceil((self.xLow - low) / width))
+        extra_high = int(np.ceil((high - self.xHigh) / width))
+        self.xLow -= extra_low * width
+        self.xHigh += extra_high * width
+        self.bins += extra_low + extra_high
+
+    def new_hists(self):
+        names = ["all", "anticoincident", "coincident"] + list(self.chains)
+        return {name: StreamHist(self.bins, self.xLow, self.xHigh) for name in names}
+
+    def tag(self, event, t, energy):
+        """Return the coincident mask and the mask of each chain for deposits sorted by (event, time)."""
+        keys = event_time_keys(event, t)
+        # the deposit itself is always in its window
+        coincident = count_in_window(keys, keys, -self.window, self.window) > 1
+
+        chain_tags = {}
+        for name, chain in self.chains.items():
+            prompt = (energy >= chain["prompt"][0]) & (energy <= chain["prompt"][1])
+            delayed = (energy >= chain["delayed"][0]) & (energy <= chain["delayed"][1])
+            # prompt with a delayed deposit after it, delayed with a prompt deposit before it
+            is_prompt = prompt & (count_in_window(keys[delayed], keys, chain["min_delay"], chain["window"]) > 0)
+            is_delayed = delayed & (count_in_window(keys[prompt], keys, -chain["window"], -chain["min_delay"]) > 0)
+            chain_tags[name] = is_prompt | is_delayed
+            coincident |= chain_tags[name]
+        return coincident, chain_tags
+
+    def fill(self, hists, arrays):
+        """Tag and histogram a chunk of whole events."""
+        if len(arrays["edep"]) == 0:
+            return
+        event, t, energy = merge_deposits(event_ids(arrays), arrays["timeStamp"], arrays["edep"], self.resolution)
+        coincident, chain_tags = self.tag(event, t, energy)
+        hists["all"].fill(energy)
+        hists["anticoincident"].fill(energy[~coincident])
+        hists["coincident"].fill(energy[coincident])
+        for name, mask in chain_tags.items():
+            hists[name].fill(energy[mask])
+
+    def process(self, file_path):
+        """
+        Histograms of one file. The hits of the last event of a chunk are kept
+        for the next chunk, so an event is never split (hits are written event
+        by event).
+        """
+        hists = self.new_hists()
+        carry = None
+        for arrays in self.schema.iterate(file_path, step_size=self.step_size):
+            if carry is not None:
+                arrays = {col: np.concatenate([carry[col], arrays[col]]) for col in arrays}
+            if len(arrays["eventID"]) == 0:
+                continue
+            event = event_ids(arrays)
+            last = event == event[-1]
+            carry = {col: a[last] for col, a in arrays.items()}
+            self.fill(hists, {col: a[~last] for col, a in arrays.items()})
+        if carry is not None:
+            self.fill(hists, carry)
+        return hists
+
+    def run(self, file_paths, workers=1):
+        """Merged histograms of every file, processed on `workers` processes."""
+        file_paths = list(file_paths)
+        self.schema.resolve(file_paths)
+        hists = self.new_hists()
+        for file_hists in pool_map(self.process, file_paths, workers=workers):
+            for name, h in file_hists.items():
+                hists[name].merge(h)
+        return hists
@@ -0,0 +1,188 @@
+import os
+import json
+import argparse
+import numpy as np
+import pandas as pd
+import uproot
+from .filtering import VDFilter, read_macro_text, merge_run_macros
+from .get_norm_param import read_macro_lines, lines_to_frame, extract_beamon
+from .events import TASK_KEY
+from .dataset_index import FILE_PATTERN, DatasetIndex
+from .parallel import pool_map
+from .prefetch import parse_size
+
+MANIFEST = "taskManifest"
+GROUP_COLUMNS = ["component", "layer", "isotope", "bias"]
+
+
+def shard_name(file_name, shard):
+    """Name of a shard from the name of one of its task files: the task id replaced by the shard number."""
+    m = FILE_PATTERN.match(file_name)
+    bias = f"_{m['bias']}" if m["bias"] else ""
+    return f"{file_name[:m.start('task')]}{shard}{bias}"
+
+
+def manifest_records(root_file):
+    """Manifest of an opened shard as a list of dicts, None if the file is not a shard."""
+    try:
+        return json.loads(str(root_file[MANIFEST]))
+    except Exception:
+        return None
+
+
+def read_manifest(file_path):
+    """Tasks merged into a shard (file, task, beamon, entries, entry_start), empty if not a shard."""
+    try:
+        records = manifest_records(uproot.open(file_path))
+    except Exception:
+        records = None
+    if records is None:
+        return pd.DataFrame(columns=["file", "task", "beamon", "entries", "entry_start"])
+    return pd.DataFrame(records)
+
+
+def read_beamon(root_file):
+    """beamOn of the runMacro of an opened file, None if missing."""
+    try:
+        return extract_beamon(lines_to_frame(read_macro_lines(root_file, "runMacro")))
+    except KeyError:
+        return None
+
+
+class Compactor(VDFilter):
+    """
+    Merge the filtered task files of each (component, layer, isotope, bias)
+    into a few large shards, so reading a campaign opens a handful of files
+    instead of one per SLURM array task.
+
+    Task files are packed in task order into shards of about shard_size bytes
+    (one task file never spans two shards). Each shard is a regular filtered
+    file, {layer}_{isotope}_{shard}_{bias}_filtered.root: its runMacro holds
+    the beamOn summed over its tasks (task files without any hit included),
+    so g4_sim_proc reads a compacted folder as it is and the normalization is
+    unchanged. The "taskManifest" TObjString lists the file, task id, beamOn,
+    entries and first entry of every task (see read_manifest). Every task
+    numbers its events from 0, so the hits carry the index of their task in
+    the manifest (TASK_KEY branch), used with eventID to key events and
+    clusters. Shards can be compacted again: their manifests are merged.
+
+    How to use:
+    >>> Compactor("path/to/compacted", shard_size="2 GB").run(DatasetIndex("path/to/filtered").select(stage="filtered"))
+    >>> g4_sim_proc("internals", "path/to/compacted")
+
+    From a shell: python -m tesssapy.compaction path/to/compacted path/to/filtered --shard-size "2 GB" --workers 4
+    """
+
+    def __init__(self, out_folder="compacted", shard_size="1 GB", tree_name="events", step_size="100 MB"):
+        # a VDFilter without volume selection, writing every hit to one output
+        self.out_folder = out_folder
+        self.shard_size = parse_size(shard_size)
+        self.single, self.volume, self.volumes = True, None, [None]
+        self.volume_branch = None
+        self.tree_name = tree_name
+        self.step_size = step_size
+        self.task_offsets = {}  # input path -> TASK_KEY of its first task, set by compact()
+
+    def coded_names(self, tree):
+        """{branch: names} of the branches stored as int32 codes by VDFilter (with a <branch>_names TObjString)."""
+        directory = tree.file.root_directory
+        return {branch: np.array(str(directory[f"{branch}_names"]).split("\n"))
+                for branch in tree.keys() if f"{branch}_names" in directory}
+
+    def split_branches(self, tree):
+        # coded branches are decoded and coded again, the codes of each task file differ
+        numeric, strings = super().split_branches(tree)
+        coded = [branch for branch in self.coded_names(tree) if branch in numeric]
+        numeric = {b: t for b, t in numeric.items() if b not in coded}
+        numeric.setdefault(TASK_KEY, np.int32)
+        return numeric, strings + coded
+
+    def read_chunks(self, tree, columns):
+        names = self.coded_names(tree)
+        offset = self.task_offsets.get(tree.file.file_path, 0)
+        in_tree = TASK_KEY in tree.keys()
+        if not in_tree:
+            columns = [col for col in columns if col != TASK_KEY]
+        for arrays in super().read_chunks(tree, columns):
+            for branch, values in names.items():
+                if branch in arrays:
+                    arrays[branch] = values[arrays[branch]]
+            # task files have one task, the tasks of a shard input are shifted after the previous inputs
+            n = len(next(iter(arrays.values())))
+            arrays[TASK_KEY] = (arrays[TASK_KEY] + offset).astype(np.int32) if in_tree \
+                else np.full(n, offset, dtype=np.int32)
+            yield arrays
+
+    def groups(self, arrays):
+        return {None: np.arange(len(next(iter(arrays.values()))))}
+
+    def plan(self, files):
+        """Split the rows of a DatasetIndex table into shards: list of (shard name, [(path, task), ...])."""
+        shards = []
+        for _, group in files.groupby(GROUP_COLUMNS, dropna=False, sort=True):
+            group = group.sort_values("task", kind="stable")
+            shard, size = [], 0
+            for row in group.itertuples(index=False):
+                if shard and size + row.size > self.shard_size:
+                    shards.append(shard)
+                    shard, size = [], 0
+                shard.append((row.path, int(row.task), tuple(getattr(row, col) for col in GROUP_COLUMNS)))
+                size += row.size
+            shards.append(shard)
+        numbers, plan = {}, []
+        for shard in shards:
+            key = shard[0][2]
+            numbers[key] = numbers.get(key, -1) + 1
+            plan.append((shard_name(os.path.basename(shard[0][0]), numbers[key]), [(p, t) for p, t, _ in shard]))
+        return plan
+
+    def compact(self, job):
+        """Write one shard. Returns (output path, hits kept)."""
+        name, tasks = job
+        task_ids = dict(tasks)
+        inputs = self.open_inputs([path for path, _ in tasks])
+        manifest, run_macros, geometry, start = [], [], None, 0
+        self.task_offsets = {}
+        try:
+            for path, f in inputs:
+                try:
+                    entries = int(f[self.tree_name].num_entries) if self.tree_name in f else 0
+                except Exception as e:
+                    print(f"Could not read {self.tree_name} in {path}: {e}")
+                    continue
+                run_macros.append(read_macro_text(f, "runMacro"))
+                geometry = geometry or read_macro_text(f, "geometryTable")
+                self.task_offsets[path] = len(manifest)
+                records = manifest_records(f)
+                if records is None:
+                    records = [{"file": os.path.basename(path), "task": task_ids[path],
+                                "beamon": read_beamon(f), "entries": entries, "entry_start": 0}]
+                manifest.extend({**record, "entry_start": start + record["entry_start"]} for record in records)
+                start += entries
+
+            outputs = self.write(name, inputs, merge_run_macros(run_macros), geometry,
+                                 extra={MANIFEST: json.dumps(manifest)})
+        finally:
+            for _, f in inputs:
+                f.close()
+        output_path, kept = outputs.get(None, (None, 0))
+        if kept != start:
+            print(f"Warning: {output_path} has {kept} entries, its task files {start}")
+        return output_path, kept
+
+    def run(self, files, workers=1):
+        """Compact the rows of a DatasetIndex table, shards written on `workers` processes."""
+        return list(pool_map(self.compact, self.plan(files), workers=workers))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge the filtered task files into large shards.")
+    parser.add_argument("out_folder")
+    parser.add_argument("in_folder")
+    parser.add_argument("--shard-size", default="1 GB")
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    files = DatasetIndex(args.in_folder).select(stage="filtered")
+    for output_path, kept in Compactor(args.out_folder, args.shard_size).run(files, args.workers):
+        print(f"Writing {kept} entries to {output_path}")
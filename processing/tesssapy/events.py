@@ -0,0 +1,129 @@
+import numpy as np
+from .schema import BranchSchema
+
+# Columns identifying the hits summed together, per aggregation level
+EVENT_KEYS = {
+    "hit":     [],
+    "event":   ["eventID"],
+    "cluster": ["eventID", "clusterIndex"],
+}
+# Index of the task file of each hit in a compacted shard (see compaction.py). Every task
+# numbers its events from 0, so events and clusters of a shard are keyed by it first.
+TASK_KEY = "taskIndex"
+
+
+def optional_keys(by):
+    """Optional columns to read with the keys of a level: the task key of compacted shards."""
+    return [] if by == "hit" else [TASK_KEY]
+
+
+def event_ids(arrays):
+    """eventID of the hits of a chunk, made unique across the tasks of a compacted shard."""
+    event = arrays["eventID"]
+    if TASK_KEY not in arrays:
+        return event
+    return (arrays[TASK_KEY].astype(np.int64) << 32) | event.astype(np.int64)
+
+
+def group_sum(keys, edep, multiplicity=None, weight=None):
+    """
+    Sum edep over the rows with equal keys, with one sort and np.add.reduceat.
+
+    keys is a list of arrays (the first one varies slowest in the output).
+    multiplicity gives the number of hits of each row (1 per hit if None), so
+    partial sums can be summed again. weight (per-event weights of a biased
+    run, the same for every hit of an event) gives the weight of each group,
+    taken from its first row. Returns (keys, energy, multiplicity, weight)
+    with one row per group, sorted by keys (weight is None if not given).
+    """
+    edep = np.asarray(edep)
+    if multiplicity is None:
+        multiplicity = np.ones(len(edep), dtype=np.int64)
+    if len(edep) == 0:
+        weight = None if weight is None else np.asarray(weight, dtype=np.float64)[:0]
+        return [np.asarray(k)[:0] for k in keys], edep[:0].astype(np.float64), multiplicity[:0], weight
+
+    keys = [np.asarray(k) for k in keys]
+    if len(keys) == 1 and np.all(keys[0][1:] >= keys[0][:-1]):
+        order = slice(None)     # hits are usually written event by event, no sort needed
+    elif len(keys) == 1:
+        order = np.argsort(keys[0], kind="stable")
+    else:
+        order = np.lexsort(keys[::-1])
+    keys = [k[order] for k in keys]
+    new = np.zeros(len(edep), dtype=bool)
+    new[0] = True
+    for k in keys:
+        new[1:] |= k[1:] != k[:-1]
+    starts = np.flatnonzero(new)
+
+    energy = np.add.reduceat(edep[order].astype(np.float64), starts)
+    multiplicity = np.add.reduceat(multiplicity[order], starts)
+    if weight is not None:
+        weight = np.asarray(weight, dtype=np.float64)[order][starts]
+    return [k[starts] for k in keys], energy, multiplicity, weight
+
+
+class EventAggregator:
+    """
+    Total energy and number of hits per event (or per cluster of an event),
+    accumulated over chunks of hits.
+
+    Each chunk is reduced on its own, then the partial sums are reduced again
+    at the end, so the hits of an event may be split over several chunks and
+    do not need to be sorted. With a weight column, each event keeps its weight.
+    Chunks with a TASK_KEY column (compacted shards) are keyed by task first.
+
+    How to use:
+    >>> agg = EventAggregator("event")
+    >>> for chunk in schema.iterate(file_path):
+    ...     agg.fill(chunk)
+    >>> events = agg.result()      # {"eventID", "energy", "multiplicity"}
+    """
+
+    def __init__(self, by="event", weight=None):
+        if by not in EVENT_KEYS or by == "hit":
+            raise ValueError(f"Unknown aggregation level: {by}")
+        self.by = by
+        self.key_columns = EVENT_KEYS[by]
+        self.weight = weight    # weight column, None for unweighted runs
+        self.partials = []
+
+    def fill(self, arrays):
+        """Reduce a chunk given as a dict column -> array (key columns, edep and the weight column)."""
+        if not self.partials:
+            self.key_columns = ([TASK_KEY] if TASK_KEY in arrays else []) + EVENT_KEYS[self.by]
+        weight = arrays[self.weight] if self.weight else None
+        self.partials.append(group_sum([arrays[col] for col in self.key_columns], arrays["edep"], weight=weight))
+
+    def result(self):
+        """Return a dict with the key columns, energy, multiplicity (and weight) of every event."""
+        if not self.partials:
+            keys = [np.zeros(0, dtype=np.int64) for _ in self.key_columns]
+            energy, multiplicity = np.zeros(0), np.zeros(0, dtype=np.int64)
+            weight = np.zeros(0) if self.weight else None
+        elif len(self.partials) == 1:
+            keys, energy, multiplicity, weight = self.partials[0]
+        else:
+            keys = [np.concatenate([p[0][i] for p in self.partials]) for i in range(len(self.key_columns))]
+            weight = np.concatenate([p[3] for p in self.partials]) if self.weight else None
+            keys, energy, multiplicity, weight = group_sum(keys, np.concatenate([p[1] for p in self.partials]),
+                                                           np.concatenate([p[2] for p in self.partials]), weight)
+        result = {**dict(zip(self.key_columns, keys)), "energy": energy, "multiplicity": multiplicity}
+        if self.weight:
+            result["weight"] = weight
+        return result
+
+
+def read_events(file_path, by="event", schema=None, step_size="100 MB"):
+    """
+    Return the energy and multiplicity per event (or cluster) of one file.
+
+    Events are identified within the file, i.e. per (file, eventID). Empty
+    arrays if the file cannot be read.
+    """
+    schema = schema or BranchSchema(EVENT_KEYS[by] + ["edep"], optional=optional_keys(by))
+    agg = EventAggregator(by)
+    for chunk in schema.iterate(file_path, step_size=step_size):
+        agg.fill(chunk)
+    return agg.result()
@@ -0,0 +1,153 @@
+import numpy as np
+from .schema import BranchSchema
+from .histogram import StreamHist
+from .parallel import pool_map
+
+POSITION_COLUMNS = ["rx", "ry", "rz"]
+
+
+class Box:
+    """
+    Fiducial box [lo, hi] in x, y, z (same unit as rx, ry, rz, mm by default).
+
+    A hit is kept if it is inside the box and at least margin away from its
+    surface.
+
+    How to use:
+    >>> cut = Box((-50, -50, -50), (50, 50, 50), margin=5)
+    >>> keep = cut.mask(arrays)          # arrays with rx, ry, rz
+    """
+
+    def __init__(self, lo, hi, margin=0.0):
+        self.columns = POSITION_COLUMNS
+        self.lo = np.asarray(lo, dtype=np.float64)
+        self.hi = np.asarray(hi, dtype=np.float64)
+        self.margin = margin
+
+    def __repr__(self):
+        return f"Box(lo={self.lo.tolist()}, hi={self.hi.tolist()}, margin={self.margin})"
+
+    def distance(self, x, y, z):
+        """Distance to the surface, positive inside and negative outside (outside: along the worst axis)."""
+        d = np.full(np.shape(x), np.inf)
+        for r, lo, hi in zip((x, y, z), self.lo, self.hi):
+            d = np.minimum(d, np.minimum(r - lo, hi - r))
+        return d
+
+    def mask(self, arrays):
+        return self.distance(arrays["rx"], arrays["ry"], arrays["rz"]) >= self.margin
+
+
+class Cylinder:
+    """
+    Fiducial cylinder along z: radius around (x0, y0), between z_lo and z_hi.
+
+    A hit is kept if it is inside the cylinder and at least margin away from
+    its side and end caps.
+
+    How to use:
+    >>> cut = Cylinder(40, -60, 60, margin=5)
+    >>> keep = cut.mask(arrays)
+    """
+
+    def __init__(self, radius, z_lo, z_hi, center=(0.0, 0.0), margin=0.0):
+        self.columns = POSITION_COLUMNS
+        self.radius = radius
+        self.z_lo, self.z_hi = z_lo, z_hi
+        self.center = tuple(float(c) for c in center)
+        self.margin = margin
+
+    def __repr__(self):
+        return (f"Cylinder(radius={self.radius}, z_lo={self.z_lo}, z_hi={self.z_hi}, "
+                f"center={list(self.center)}, margin={self.margin})")
+
+    def distance(self, x, y, z):
+        """Distance to the surface, positive inside and negative outside (outside: along the worst direction)."""
+        rho = np.hypot(np.asarray(x) - self.center[0], np.asarray(y) - self.center[1])
+        return np.minimum(self.radius - rho, np.minimum(z - self.z_lo, self.z_hi - z))
+
+    def mask(self, arrays):
+        return self.distance(arrays["rx"], arrays["ry"], arrays["rz"]) >= self.margin
+
+
+class Occupancy3D:
+    """
+    3D histogram of the hit positions, filled chunk by chunk.
+
+    How to use:
+    >>> occ = Occupancy3D((50, 50, 50), ((-100, 100), (-100, 100), (-100, 100)))
+    >>> occ.fill(arrays["rx"], arrays["ry"], arrays["rz"], weights=arrays["edep"])
+    >>> occ.counts.shape, occ.edges
+    """
+
+    def __init__(self, bins, extent):
+        self.bins = tuple(bins)
+        self.extent = tuple(tuple(e) for e in extent)
+        self.edges = [np.linspace(lo, hi, n + 1) for n, (lo, hi) in zip(self.bins, self.extent)]
+        self.counts = np.zeros(self.bins, dtype=np.int64)   # number of hits per voxel
+        self.sumw = np.zeros(self.bins, dtype=np.float64)   # sum of weights (e.g. edep) per voxel
+
+    def fill(self, x, y, z, weights=None):
+        sample = np.column_stack([x, y, z])
+        if len(sample) == 0:
+            return
+        counts, _ = np.histogramdd(sample, self.edges)
+        self.counts += counts.astype(np.int64)
+        if weights is None:
+            self.sumw += counts
+        else:
+            sumw, _ = np.histogramdd(sample, self.edges, weights=weights)
+            self.sumw += sumw
+
+    def merge(self, other):
+        if self.bins != other.bins or self.extent != other.extent:
+            raise ValueError("Cannot merge occupancies with different binning.")
+        self.counts += other.counts
+        self.sumw += other.sumw
+        return self
+
+
+class SpatialStage:
+    """
+    Fiducial cut and 3D occupancy, evaluated with the edep spectrum in a
+    single chunked read of rx, ry, rz and edep.
+
+    Each file gives the edep StreamHist of the hits passing the cut and the
+    Occupancy3D of all hits (edep-weighted in sumw), or of the kept hits only
+    with occupancy_after_cut=True.
+
+    How to use:
+    >>> stage = SpatialStage(Cylinder(40, -60, 60, margin=5), (40, 40, 40), ((-100, 100),) * 3)
+    >>> hist, occ = stage.run(index.select(layer="Cu", isotope="K40", stage="filtered")["path"], workers=4)
+    """
+
+    def __init__(self, fiducial=None, occupancy_bins=(50, 50, 50), extent=((-500, 500),) * 3,
+                 bins=5000, xLow=0, xHigh=5000, occupancy_after_cut=False, step_size="100 MB"):
+        self.fiducial = fiducial
+        self.occupancy_bins, self.extent = occupancy_bins, extent
+        self.bins, self.xLow, self.xHigh = bins, xLow, xHigh
+        self.occupancy_after_cut = occupancy_after_cut
+        self.step_size = step_size
+        self.schema = BranchSchema(POSITION_COLUMNS + ["edep"])
+
+    def process(self, file_path):
+        """Return (StreamHist, Occupancy3D) of one file."""
+        h = StreamHist(self.bins, self.xLow, self.xHigh)
+        occ = Occupancy3D(self.occupancy_bins, self.extent)
+        for arrays in self.schema.iterate(file_path, step_size=self.step_size):
+            keep = self.fiducial.mask(arrays) if self.fiducial is not None else np.ones(len(arrays["edep"]), bool)
+            h.fill(arrays["edep"][keep])
+            sel = keep if self.occupancy_after_cut else slice(None)
+            occ.fill(arrays["rx"][sel], arrays["ry"][sel], arrays["rz"][sel], weights=arrays["edep"][sel])
+        return h, occ
+
+    def run(self, file_paths, workers=1):
+        """Merged (StreamHist, Occupancy3D) of every file, processed on `workers` processes."""
+        file_paths = list(file_paths)
+        self.schema.resolve(file_paths)
+        h = StreamHist(self.bins, self.xLow, self.xHigh)
+        occ = Occupancy3D(self.occupancy_bins, self.extent)
+        for file_h, file_occ in pool_map(self.process, file_paths, workers=workers):
+            h.merge(file_h)
+            occ.merge(file_occ)
+        return h, occ
@@ -0,0 +1,329 @@
+import os
+import re
+import argparse
+import numpy as np
+import uproot
+from .get_norm_param import read_macro_lines
+from .histogram import MultiHist
+from .parallel import pool_map
+
+VOLUME = "virtualDetector"
+MACROS = ("runMacro", "geometryTable")
+
+
+def read_macro_text(root_file, name):
+    """Return the text of a TMacro (or TObjString) of an opened ROOT file, or None if missing."""
+    try:
+        return "\n".join(read_macro_lines(root_file, name))
+    except KeyError:
+        return None
+
+
+def merge_run_macros(texts):
+    """
+    runMacro of a group of files: the one of the first file, with the beamOn
+    replaced by the sum over the group so the normalization stays right.
+    """
+    texts = [t for t in texts if t is not None]
+    if not texts:
+        return None
+    beamon = 0
+    for text in texts:
+        m = re.search(r"^\s*/run/beamOn\s+(\d+)", text, flags=re.MULTILINE)
+        beamon += int(m.group(1)) if m else 0
+    return re.sub(r"^(\s*/run/beamOn\s+)\d+", rf"\g<1>{beamon}", texts[0], count=1, flags=re.MULTILINE)
+
+
+def volume_mask(volume, name):
+    """Mask of the hits whose volume (name, or id for an integer branch) is name."""
+    if volume.dtype.kind in "iu":
+        return volume == name
+    return volume.astype(str) == name
+
+
+def volume_keys(volume):
+    """Volume names as str (ids stay integers)."""
+    return volume if volume.dtype.kind in "iu" else volume.astype(str)
+
+
+def split_by_volume(volume, volumes=None):
+    """
+    Categorical group-by of the hits on their volume, with a single sort.
+
+    Returns {volume: row indices}, for the volumes given or for every volume
+    found if volumes is None.
+    """
+    values, codes = np.unique(volume_keys(volume), return_inverse=True)
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(len(values) + 1))
+    return {v.item(): order[bounds[k]:bounds[k + 1]] for k, v in enumerate(values)
+            if volumes is None or v.item() in volumes}
+
+
+class VolumeCut:
+    """
+    Keep the hits of one volume, to histogram raw simulation files directly
+    (see g4_sim_proc(stage="raw")) without writing filtered files.
+    """
+
+    def __init__(self, volume=VOLUME):
+        self.columns = ["volume"]
+        self.volume = volume
+
+    def __repr__(self):
+        return f"VolumeCut(volume={self.volume!r})"
+
+    def mask(self, arrays):
+        return volume_mask(arrays["volume"], self.volume)
+
+
+class VDFilter:
+    """
+    Keep the hits of the events tree in one volume (the virtual detector), with
+    uproot and NumPy only, as VD_single_filtering.cc / VD_group_filtering.cc do
+    with ROOT.
+
+    The input is read in chunks of step_size, the selection is a vectorized
+    comparison of the volume branch, and the kept hits are appended to the
+    output tree. Every branch is kept, the volume branch included, as
+    tree->CopyTree does; string branches are stored as int32 codes (see
+    write). runMacro and geometryTable are carried through as TObjStrings
+    (uproot cannot write TMacros), which read_macro_lines reads like the
+    TMacros.
+
+    volume can also be a list of volumes, or "all" for every volume found:
+    the hits are then split by volume in the same read (one sort per chunk)
+    into <out_folder>/<volume>/<name>_filtered.root.
+
+    How to use:
+    >>> vd = VDFilter("path/to/filtered")
+    >>> vd.run(glob.glob("path/to/raw/Cu_K40_*.root"), workers=8)     # one output per file
+    >>> vd.filter_group(glob.glob("path/to/raw/Cu_K40_*.root"), "Cu_K40")  # one output for the group
+    >>> VDFilter("path/to/filtered", volume=["virtualDetector", "ShieldA"]).run(files)
+
+    From a shell: python -m tesssapy.filtering path/to/filtered path/to/raw/*.root --workers 8
+    """
+
+    def __init__(self, out_folder="filtered", volume=VOLUME, volume_branch="volume", tree_name="events",
+                 step_size="100 MB"):
+        self.out_folder = out_folder
+        self.single = isinstance(volume, (str, int)) and volume != "all"
+        self.volume = volume if self.single else None
+        # volumes written (None: every volume found)
+        self.volumes = [volume] if self.single else (None if volume == "all" else list(volume))
+        self.volume_branch = volume_branch
+        self.tree_name = tree_name
+        self.step_size = step_size
+
+    def output_path(self, name, volume=None):
+        folder = self.out_folder if self.single else os.path.join(self.out_folder, str(volume))
+        return os.path.join(folder, f"{name}_filtered.root")
+
+    def split_branches(self, tree):
+        """Return ({numeric branch: dtype}, [string branches]) of a tree."""
+        numeric, strings = {}, []
+        for name, branch in tree.items():
+            interp = branch.interpretation
+            if isinstance(interp, uproot.AsDtype):
+                numeric[name] = interp.to_dtype
+            elif isinstance(interp, uproot.AsStrings):
+                strings.append(name)
+            else:
+                print(f"Branch {name} ({interp}) cannot be written with uproot, skipped.")
+        return numeric, strings
+
+    def select(self, arrays):
+        """Mask of the hits in the selected volume."""
+        return volume_mask(arrays[self.volume_branch], self.volume)
+
+    def groups(self, arrays):
+        """{volume: row indices} of the hits of a chunk to write."""
+        if self.single:
+            return {self.volume: np.flatnonzero(self.select(arrays))}
+        return split_by_volume(arrays[self.volume_branch], self.volumes)
+
+    def open_inputs(self, input_paths):
+        """[(path, opened ROOT file)] of the inputs that can be opened: each file is opened once."""
+        inputs = []
+        for path in input_paths:
+            try:
+                inputs.append((path, uproot.open(path)))
+            except Exception as e:
+                print(f"Could not open file: {path} ({e})")
+        return inputs
+
+    def read_chunks(self, tree, columns):
+        """Chunks of the input tree, as dicts branch -> NumPy array."""
+        return tree.iterate(columns, library="np", step_size=self.step_size)
+
+    def write(self, name, inputs, run_macro, geometry, extra=None):
+        """
+        Filter the trees of inputs (see open_inputs) into one output file per
+        volume, with the macros and the TObjStrings of extra (name -> text) in
+        each. Returns {volume: (output path, hits kept)}.
+
+        String branches (volume, ...) are written as int32 codes: code i is
+        line i of the "<branch>_names" TObjString next to the tree, e.g.
+        volume_names = "virtualDetector\nShieldA" for volume codes 0 and 1.
+        The codes are shared by all the inputs of one call, in order of first
+        appearance.
+        """
+        trees = []
+        for path, f in inputs:
+            try:
+                trees.append(f[self.tree_name])
+            except Exception as e:
+                print(f"Could not read {self.tree_name} in {path}: {e}")
+        if not trees:
+            return {}
+
+        numeric, strings = self.split_branches(trees[0])
+        types = {**numeric, **{branch: np.int32 for branch in strings}}
+        names = {branch: {} for branch in strings}     # string branch -> {value: code}
+        outputs = {}                                   # volume -> [file, tree, hits kept]
+
+        def output(volume):
+            if volume not in outputs:
+                path = self.output_path(name, volume)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                f = uproot.recreate(path)
+                outputs[volume] = [f, f.mktree(self.tree_name, types), 0]
+            return outputs[volume]
+
+        try:
+            # requested volumes get an output even without hits, as with the ROOT macros
+            for volume in self.volumes or []:
+                output(volume)
+            columns = list(types)
+            if self.volume_branch and self.volume_branch not in columns:
+                columns.append(self.volume_branch)
+            for tree in trees:
+                for arrays in self.read_chunks(tree, columns):
+                    for volume, rows in self.groups(arrays).items():
+                        if len(rows) == 0:
+                            continue
+                        chunk = {branch: arrays[branch][rows] for branch in numeric}
+                        for branch in strings:
+                            values, inverse = np.unique(arrays[branch][rows].astype(str), return_inverse=True)
+                            codes = np.array([names[branch].setdefault(v, len(names[branch])) for v in values],
+                                             dtype=np.int32)
+                            chunk[branch] = codes[inverse]
+                        out = output(volume)
+                        out[1].extend(chunk)
+                        out[2] += len(rows)
+
+            for f, _, _ in outputs.values():
+                # one name per line, in code order (dicts keep the insertion order)
+                for branch, codes in names.items():
+                    f[f"{branch}_names"] = "\n".join(codes)
+                if run_macro is not None:
+                    f["runMacro"] = run_macro
+                if geometry is not None:
+                    f["geometryTable"] = geometry
+                for key, text in (extra or {}).items():
+                    f[key] = text
+        finally:
+            for f, _, _ in outputs.values():
+                f.close()
+        return {volume: (f.file_path, kept) for volume, (f, _, kept) in outputs.items()}
+
+    def filter_file(self, input_path):
+        """
+        Filter one file into <out_folder>[/<volume>]/<name>_filtered.root.
+        Returns {volume: (output path, hits kept)}.
+        """
+        name = os.path.basename(input_path).replace(".root", "")
+        inputs = self.open_inputs([input_path])
+        if not inputs:
+            return {}
+        f = inputs[0][1]
+        with f:
+            macros = {m: read_macro_text(f, m) for m in MACROS}
+            return self.write(name, inputs, macros["runMacro"], macros["geometryTable"])
+
+    def filter_group(self, input_paths, base_name):
+        """
+        Filter several files into one <out_folder>[/<volume>]/<base_name>_filtered.root,
+        with the beamOn of runMacro summed over the files. Each file is opened
+        once for its macros and its hits. Returns {volume: (output path, hits kept)}.
+        """
+        inputs = self.open_inputs(input_paths)
+        try:
+            run_macros, geometry = [], None
+            for _, f in inputs:
+                run_macros.append(read_macro_text(f, "runMacro"))
+                geometry = geometry or read_macro_text(f, "geometryTable")
+            return self.write(os.path.basename(base_name), inputs, merge_run_macros(run_macros), geometry)
+        finally:
+            for _, f in inputs:
+                f.close()
+
+    def run(self, input_paths, workers=1):
+        """Filter every file on `workers` processes. Returns a list of {volume: (output path, hits kept)}."""
+        return list(pool_map(self.filter_file, list(input_paths), workers=workers))
+
+
+class VolumeHistograms:
+    """
+    edep histogram of every volume, from a single read of the volume and edep
+    branches: every chunk fills the histograms of all its volumes in one pass
+    (MultiHist), nothing written.
+
+    How to use:
+    >>> vh = VolumeHistograms("all")
+    >>> hists = vh.run(glob.glob("path/to/raw/Cu_K40_*.root"), workers=8)
+    >>> hists["virtualDetector"].counts, hists["ShieldA"].counts
+    """
+
+    def __init__(self, volumes="all", bins=5000, xLow=0, xHigh=5000, volume_branch="volume", tree_name="events",
+                 step_size="100 MB"):
+        self.volumes = None if volumes == "all" else ([volumes] if isinstance(volumes, str) else list(volumes))
+        self.bins, self.xLow, self.xHigh = bins, xLow, xHigh
+        self.volume_branch = volume_branch
+        self.tree_name = tree_name
+        self.step_size = step_size
+
+    def process(self, file_path):
+        """{volume: StreamHist} of one file."""
+        mh = MultiHist(self.bins, self.xLow, self.xHigh, keys=self.volumes or [])
+        try:
+            tree = uproot.open(file_path)[self.tree_name]
+        except Exception as e:
+            print(f"Could not read {self.tree_name} in {file_path}: {e}")
+            return {volume: mh.hist(volume) for volume in mh.index}
+        for arrays in tree.iterate([self.volume_branch, "edep"], library="np", step_size=self.step_size):
+            volume, edep = volume_keys(arrays[self.volume_branch]), arrays["edep"]
+            if self.volumes is not None:
+                keep = np.isin(volume, self.volumes)
+                volume, edep = volume[keep], edep[keep]
+            mh.fill(volume, edep)
+        return {volume: mh.hist(volume) for volume in mh.index}
+
+    def run(self, file_paths, workers=1):
+        """Merged {volume: StreamHist} of every file, processed on `workers` processes."""
+        hists = {}
+        for file_hists in pool_map(self.process, list(file_paths), workers=workers):
+            for volume, h in file_hists.items():
+                if volume in hists:
+                    hists[volume].merge(h)
+                else:
+                    hists[volume] = h
+        return hists
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Keep the virtual detector hits of GEANT4 output files.")
+    parser.add_argument("out_folder")
+    parser.add_argument("inputs", nargs="+")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--group", default=None, help="write the inputs into a single <group>_filtered.root")
+    parser.add_argument("--volume", nargs="+", default=[VOLUME],
+                        help="volume(s) to keep, \"all\" to split every volume into its own folder")
+    args = parser.parse_args()
+
+    volume = args.volume[0] if len(args.volume) == 1 else args.volume
+    vd = VDFilter(args.out_folder, volume=volume)
+    results = [vd.filter_group(args.inputs, args.group)] if args.group else vd.run(args.inputs, args.workers)
+    for outputs in results:
+        for output_path, kept in outputs.values():
+            print(f"Writing {kept} entries to {output_path}")
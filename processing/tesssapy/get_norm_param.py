@@ -1,10 +1,148 @@
+import os
+import json
 import uproot
 import pandas as pd
 import warnings
-from collections import defaultdict
+from .parallel import pool_map
 
 warnings.simplefilter("ignore")
 
+METADATA_FILE = ".tesssa_metadata.json"
+
+
+def read_macro_lines(root_file, objname):
+    """
+    Return the lines of a TMacro stored in an opened ROOT file.
+
+    A TObjString (written instead of the TMacro by the Python filtering, see
+    filtering.py) is split into lines.
+    """
+    if objname not in root_file:
+        raise KeyError(f"'{objname}' not found in file. Run f.classnames() to locate it.")
+    obj = root_file[objname]
+
+    if isinstance(obj, str):
+        return obj.splitlines()
+
+    if "fLines" not in obj.all_members:
+        raise KeyError("object has no member 'fLines' — not a TMacro-like object?")
+
+    lines = []
+    for item in obj.member("fLines"):
+        if isinstance(item, (bytes, bytearray)):
+            s = item.decode("utf-8", errors="ignore")
+        else:
+            s = str(item)
+        if s is not None:
+            lines.append(s.rstrip("\n"))
+    return lines
+
+
+def lines_to_frame(lines):
+    """Split the non-empty lines of a TMacro into a DataFrame of whitespace separated fields."""
+    rows = [ln.strip().split() for ln in lines if ln.strip()]
+    return pd.DataFrame(rows)
+
+
+def extract_beamon(df):
+    """Extract the number after '/run/beamOn' from a runMacro DataFrame."""
+    if df.empty or df.shape[1] < 2:
+        return None
+    mask = df.iloc[:, 0] == '/run/beamOn'
+    if mask.any():
+        val = df.loc[mask, df.columns[1]].iloc[0]
+        try:
+            return int(val)
+        except (ValueError, TypeError):
+            return None
+    return None
+
+
+def compute_total_mass(df):
+    """Sum the mass (2nd column) per material (last column) of a geometryTable DataFrame."""
+    if df.empty or df.shape[1] < 2:
+        return {}
+    mass = pd.to_numeric(df[df.columns[1]], errors="coerce")
+    material = df[df.columns[-1]].astype(str)
+    ok = mass.notna()
+    return mass[ok].groupby(material[ok], sort=False).sum().to_dict()
+
+
+def read_run_metadata(file_path):
+    """
+    Read the beamOn number and the total mass per material of one file.
+
+    Both TMacros are read from a single open of the file. Missing macros give
+    None (beamOn) or an empty dict (masses).
+    """
+    meta = {"beamon": None, "masses": {}}
+    try:
+        f = uproot.open(file_path)
+    except Exception:
+        return meta
+    try:
+        meta["beamon"] = extract_beamon(lines_to_frame(read_macro_lines(f, "runMacro")))
+    except KeyError:
+        pass
+    try:
+        meta["masses"] = compute_total_mass(lines_to_frame(read_macro_lines(f, "geometryTable")))
+    except KeyError:
+        pass
+    return meta
+
+
+class RunMetadata:
+    """
+    beamOn and masses of every file of a dataset, cached on disk.
+
+    Entries are keyed by file path and only reused if the size and mtime of
+    the file did not change, so a repeated run does not open any ROOT file.
+
+    How to use:
+    >>> meta = RunMetadata("path/to/filtered").collect(index.select(layer="Cu", isotope="K40"))
+    >>> sum(m["beamon"] for m in meta.values())
+    """
+
+    def __init__(self, folder_path, cache_file=METADATA_FILE):
+        self.cache_path = os.path.join(folder_path, cache_file) if cache_file else None
+        self.cache = {}
+        if self.cache_path is not None and os.path.exists(self.cache_path):
+            try:
+                with open(self.cache_path) as f:
+                    self.cache = json.load(f)
+            except (OSError, ValueError):
+                self.cache = {}
+
+    def save(self):
+        """Write the cache next to the data (skipped if the folder is read-only)."""
+        if self.cache_path is None:
+            return
+        try:
+            with open(self.cache_path, "w") as f:
+                json.dump(self.cache, f)
+        except OSError:
+            pass
+
+    def collect(self, files, workers=1):
+        """
+        Return a dict path -> {"beamon", "masses"} for the rows of a DatasetIndex table.
+
+        Only the files not cached (or changed since) are opened, on `workers` processes.
+        """
+        def is_stale(row):
+            entry = self.cache.get(row.path)
+            return entry is None or entry["size"] != row.size or entry["mtime"] != row.mtime
+
+        missing = [row for row in files.itertuples(index=False) if is_stale(row)]
+
+        for row, meta in zip(missing, pool_map(read_run_metadata, [row.path for row in missing], workers=workers)):
+            self.cache[row.path] = {"size": int(row.size), "mtime": int(row.mtime), **meta}
+        if missing:
+            self.save()
+
+        return {path: self.cache[path] for path in files["path"]}
+
+
 class GetNormParam:
     def __init__(self, root_path: str, objname: str):
         """
@@ -20,6 +158,8 @@ class GetNormParam:
         >>> print(gnp.beamon_number)
         >>> gnp = GetNormParam("path/to/file.root", "geometryTable")
         >>> print(gnp.total_mass)
+
+        To get both from a single open of the file, use read_run_metadata.
         """
         
         self.root_path = root_path
@@ -40,56 +180,12 @@ class GetNormParam:
     def _load_geometry_uproot(self):
         """load a TMacro into a pandas DataFrame."""
         f = uproot.open(self.root_path)
-
-        if self.objname not in f:
-            raise KeyError(f"'{self.objname}' not found in file. Run f.classnames() to locate it.")
-        obj = f[self.objname]
-
-        if "fLines" not in obj.all_members:
-            raise KeyError("object has no member 'fLines' — not a TMacro-like object?")
-        lines_list = obj.member("fLines")
-
-        # Build list of strings
-        lines = []
-        for item in lines_list:
-            if isinstance(item, (bytes, bytearray)):
-                s = item.decode("utf-8", errors="ignore")
-            else:
-                s = str(item)
-            if s is not None:
-                lines.append(s.rstrip("\n"))
-
-        rows = [ln.strip().split() for ln in lines if ln.strip()]
-        df = pd.DataFrame(rows)
-        
-        return df
+        return lines_to_frame(read_macro_lines(f, self.objname))
 
     def _extract_beamon_number(self):
         """Extract the number after '/run/beamOn' from the DataFrame."""
-        mask = self.df.iloc[:,0] == '/run/beamOn'
-        if mask.any():
-            val = self.df.loc[mask, self.df.columns[1]].iloc[0]
-            try:
-                return int(val)
-            except (ValueError, TypeError):
-                return None
-        return None
+        return extract_beamon(self.df)
 
     def _compute_total_mass(self):
         """Compute the total mass per material from the DataFrame."""
-        if self.df.empty:
-            return {}
-
-        material_col = self.df.columns[-1]
-        mass_col = self.df.columns[1]
-
-        total_mass = defaultdict(float)
-        for _, row in self.df.iterrows():
-            try:
-                mass = float(row[mass_col])
-                material = str(row[material_col])
-                total_mass[material] += mass
-            except (ValueError, TypeError):
-                continue
-
-        return dict(total_mass)
+        return compute_total_mass(self.df)
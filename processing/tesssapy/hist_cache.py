@@ -0,0 +1,140 @@
+import os
+import json
+import time
+import hashlib
+import h5py
+from .histogram import StreamHist
+
+CACHE_FILE = ".tesssa_hists.h5"
+MAX_ENTRIES = 20000     # entries kept per cache file, the oldest ones are dropped above it
+
+
+class HistCache:
+    """
+    On-disk cache of the per-file partial results of g4_sim_proc.load_raw_data:
+    histogram, number of entries, beamOn and masses.
+
+    Entries are keyed by file path and by the reading configuration (branches,
+    binning, cuts applied to the hits and weight branch), and only reused if the size and mtime of the file did not
+    change. Reprocessing a campaign then only reads the new or modified files.
+    Size and mtime are taken from the file itself, not from the DatasetIndex
+    row, so files overwritten in place are always seen as modified.
+
+    On close, the entries of files that no longer exist are dropped, then the
+    oldest entries above max_entries (see prune); clear() drops everything.
+    The free space of the HDF5 file is tracked in the file, so later runs
+    reuse the space of the dropped entries.
+
+    How to use:
+    >>> with HistCache("path/to/filtered", {"edep": "edep"}, 20, 0, 5000) as cache:
+    ...     cached = cache.get(row)          # (StreamHist, meta) or None
+    ...     cache.put(row, hist, meta)
+    """
+
+    def __init__(self, folder_path, branches, bins, xLow, xHigh, cache_file=CACHE_FILE, cuts=None, weight=None,
+                 max_entries=MAX_ENTRIES):
+        self.bins, self.xLow, self.xHigh = bins, xLow, xHigh
+        self.max_entries = max_entries
+        config = {"branches": branches, "bins": bins, "xLow": xLow, "xHigh": xHigh}
+        if cuts is not None:
+            config["cuts"] = repr(cuts)
+        if weight is not None:
+            config["weight"] = weight
+        self.config = json.dumps(config, sort_keys=True)
+        self.cache_path = os.path.join(folder_path, cache_file)
+        try:
+            if os.path.exists(self.cache_path):
+                self.h5 = h5py.File(self.cache_path, "a")
+            else:
+                # the free-space strategy can only be set when the file is created
+                self.h5 = h5py.File(self.cache_path, "x", fs_strategy="fsm", fs_persist=True)
+        except OSError as e:
+            print(f"Histogram cache unavailable ({e}), reading every file.")
+            self.h5 = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.h5 is not None:
+            self.prune()
+            self.h5.close()
+            self.h5 = None
+
+    def prune(self):
+        """
+        Drop the entries of files that no longer exist, then the oldest entries
+        (by time written) above max_entries. Returns the number of entries dropped.
+        """
+        if self.h5 is None:
+            return 0
+        dropped, kept = [], []
+        for name, grp in self.h5.items():
+            if os.path.exists(grp.attrs["path"]):
+                # entries written before the time was kept count as the oldest
+                kept.append((grp.attrs.get("written", 0), name))
+            else:
+                dropped.append(name)
+        kept.sort()
+        dropped += [name for _, name in kept[:max(0, len(kept) - self.max_entries)]]
+        for name in dropped:
+            del self.h5[name]
+        return len(dropped)
+
+    def clear(self):
+        """Drop every entry."""
+        if self.h5 is not None:
+            for name in list(self.h5):
+                del self.h5[name]
+
+    def key(self, file_path):
+        return hashlib.sha1(f"{file_path}|{self.config}".encode()).hexdigest()
+
+    @staticmethod
+    def stamp(file_path):
+        """(size, mtime in ns) of a file, None if it cannot be stat'ed."""
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return None
+        return st.st_size, st.st_mtime_ns
+
+    def get(self, row):
+        """Return (StreamHist, meta) for a DatasetIndex row, or None if not cached or stale."""
+        if self.h5 is None:
+            return None
+        grp = self.h5.get(self.key(row.path))
+        if grp is None or self.stamp(row.path) != (grp.attrs["size"], grp.attrs["mtime"]):
+            return None
+
+        h = StreamHist(self.bins, self.xLow, self.xHigh)
+        h.counts[:] = grp["counts"][:]
+        h.sumw[:] = grp["sumw"][:]
+        # entries cached before sumw2 was kept are unweighted: sumw2 = counts
+        h.sumw2[:] = grp["sumw2"][:] if "sumw2" in grp else grp["counts"][:]
+        h.entries = int(grp.attrs["entries"])
+        beamon = int(grp.attrs["beamon"])
+        meta = {"beamon": beamon if beamon >= 0 else None, "masses": json.loads(grp.attrs["masses"])}
+        return h, meta
+
+    def put(self, row, hist, meta):
+        """Store the partial result of one file, replacing any previous entry."""
+        stamp = self.stamp(row.path)
+        if self.h5 is None or stamp is None:
+            return
+        name = self.key(row.path)
+        if name in self.h5:
+            del self.h5[name]
+        grp = self.h5.create_group(name)
+        grp.attrs["path"] = row.path
+        grp.attrs["size"], grp.attrs["mtime"] = stamp
+        grp.attrs["written"] = time.time_ns()
+        grp.attrs["entries"] = int(hist.entries)
+        grp.attrs["beamon"] = -1 if meta["beamon"] is None else int(meta["beamon"])
+        grp.attrs["masses"] = json.dumps(meta["masses"])
+        grp.create_dataset("counts", data=hist.counts, compression="gzip")
+        grp.create_dataset("sumw", data=hist.sumw, compression="gzip")
+        grp.create_dataset("sumw2", data=hist.sumw2, compression="gzip")
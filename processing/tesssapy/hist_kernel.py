@@ -0,0 +1,99 @@
+import numpy as np
+
+# numba is optional: without it the same binning runs with NumPy
+try:
+    import numba
+except ImportError:
+    numba = None
+
+NO_SUMW2 = np.zeros((0, 0), dtype=np.float64)
+
+
+def uniform_bins(X, edges):
+    """
+    Bin index of every value for uniform edges, computed arithmetically (no
+    search), -1 outside [edges[0], edges[-1]].
+
+    Same convention as np.histogram: the last bin includes the upper edge, and
+    values falling on an edge after rounding are put on the side the edges
+    array says.
+    """
+    nbins = len(edges) - 1
+    xLow, xHigh = edges[0], edges[-1]
+    X = np.asarray(X, dtype=np.float64)
+    with np.errstate(invalid="ignore"):
+        idx = ((X - xLow) * (nbins / (xHigh - xLow))).astype(np.intp)
+    inside = (X >= xLow) & (X <= xHigh)
+    idx[~inside] = 0
+    idx[idx == nbins] -= 1
+    idx[X < edges[idx]] -= 1
+    idx[(X >= edges[idx + 1]) & (idx != nbins - 1)] += 1
+    idx[~inside] = -1
+    return idx
+
+
+def fill_numpy(codes, X, weights, edges, counts, sumw, sumw2):
+    """fill_uniform with NumPy: one bincount over the flat (key, bin) index per array."""
+    nkeys, nbins = counts.shape
+    idx = uniform_bins(X, edges)
+    ok = idx >= 0
+    flat = codes[ok] * nbins + idx[ok]
+    counts += np.bincount(flat, minlength=nkeys * nbins).reshape(nkeys, nbins)
+    w = weights[ok]
+    sumw += np.bincount(flat, weights=w, minlength=nkeys * nbins).reshape(nkeys, nbins)
+    if sumw2.size:
+        sumw2 += np.bincount(flat, weights=w * w, minlength=nkeys * nbins).reshape(nkeys, nbins)
+
+
+def _fill_loop(codes, X, weights, edges, counts, sumw, sumw2):
+    # one pass over the values, bin found by arithmetic then corrected against the edges like uniform_bins
+    nbins = counts.shape[1]
+    xLow, xHigh = edges[0], edges[nbins]
+    scale = nbins / (xHigh - xLow)
+    with_sumw2 = sumw2.size > 0
+    for i in range(X.shape[0]):
+        x = X[i]
+        if not (x >= xLow and x <= xHigh):
+            continue
+        b = int((x - xLow) * scale)
+        if b == nbins:
+            b -= 1
+        if x < edges[b]:
+            b -= 1
+        elif b != nbins - 1 and x >= edges[b + 1]:
+            b += 1
+        k = codes[i]
+        w = weights[i]
+        counts[k, b] += 1
+        sumw[k, b] += w
+        if with_sumw2:
+            sumw2[k, b] += w * w
+
+
+fill_numba = numba.njit(nogil=True)(_fill_loop) if numba is not None else None
+
+
+def fill_uniform(codes, X, weights, edges, counts, sumw, sumw2=NO_SUMW2, engine=None):
+    """
+    Fill several histograms with the same uniform edges in one pass over a chunk.
+
+    codes gives the histogram (row of counts, sumw, sumw2, of shape
+    (n histograms, n bins)) of every value, e.g. np.unique(volume,
+    return_inverse=True)[1]; weights defaults to 1. sumw2 (sum of squared
+    weights) is skipped if empty. engine is "numba", "numpy" or None for numba
+    when installed.
+    """
+    X = np.ascontiguousarray(X, dtype=np.float64)
+    codes = np.ascontiguousarray(codes, dtype=np.intp)
+    weights = np.ones(len(X)) if weights is None else np.ascontiguousarray(weights, dtype=np.float64)
+    if len(X) == 0:
+        return
+    if engine is None:
+        engine = "numba" if fill_numba is not None else "numpy"
+    if engine == "numba":
+        if fill_numba is None:
+            raise ImportError("numba is not installed, use engine='numpy'")
+        fill_numba(codes, X, weights, edges, counts, sumw, sumw2)
+    else:
+        fill_numpy(codes, X, weights, edges, counts, sumw, sumw2)
+
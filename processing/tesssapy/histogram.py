@@ -0,0 +1,164 @@
+import numpy as np
+from .hist_kernel import fill_uniform
+
+
+def make_edges(binning, bins, xLow, xHigh, min_low=None):
+    """
+    Bin edges for a binning given as "linear", "log" or an array of edges.
+
+    A log binning cannot start at 0: if xLow <= 0 it starts at min_low
+    (e.g. the width of the base bins) instead.
+    """
+    if isinstance(binning, str):
+        if binning == "linear":
+            return np.linspace(xLow, xHigh, bins + 1)
+        if binning == "log":
+            low = xLow if xLow > 0 else min_low
+            if low is None or low <= 0:
+                raise ValueError("A log binning needs a strictly positive lower edge.")
+            return np.geomspace(low, xHigh, bins + 1)
+        raise ValueError(f"Unknown binning: {binning}")
+
+    edges = np.asarray(binning, dtype=np.float64)
+    if edges.ndim != 1 or len(edges) < 2 or np.any(np.diff(edges) <= 0):
+        raise ValueError("Bin edges must be a 1D increasing array with at least 2 values.")
+    return edges
+
+
+class StreamHist:
+    """
+    Running histogram with fixed binning, filled chunk by chunk.
+
+    Memory stays bounded by the number of bins whatever the number of values
+    filled, so it can replace the accumulation of every edep value in a list.
+    With weights (biased runs), sumw is the weighted spectrum and sqrt(sumw2)
+    its statistical error; without, both equal counts.
+
+    How to use:
+    >>> h = StreamHist(20, 0, 5000)
+    >>> h.fill(edep_file_1)
+    >>> h.fill(edep_file_2)
+    >>> h.fill(edep_file_3, weights=w_file_3)
+    >>> centers, counts, edges = h.centers, h.counts, h.edges
+    """
+
+    def __init__(self, bins, xLow, xHigh):
+        self.bins = bins
+        self.xLow = xLow
+        self.xHigh = xHigh
+        self.edges = np.linspace(xLow, xHigh, bins + 1)
+        self.counts = np.zeros(bins, dtype=np.int64)  # number of entries per bin
+        self.sumw = np.zeros(bins, dtype=np.float64)  # sum of weights per bin
+        self.sumw2 = np.zeros(bins, dtype=np.float64) # sum of squared weights per bin
+        self.entries = 0                              # number of values filled (in or out of range)
+
+    @property
+    def centers(self):
+        return (self.edges[:-1] + self.edges[1:]) / 2.0
+
+    def fill(self, X, weights=None):
+        """Bin a chunk of values and add it to the running arrays."""
+        X = np.asarray(X)
+        if X.size == 0:
+            return
+        # bin index computed arithmetically (numba kernel if installed), same result as np.histogram
+        weights = None if weights is None else np.ravel(weights)
+        fill_uniform(np.zeros(X.size, dtype=np.intp), X.ravel(), weights, self.edges,
+                     self.counts[None], self.sumw[None], self.sumw2[None])
+        self.entries += X.size
+
+    def merge(self, other):
+        """Add the content of another StreamHist with the same binning."""
+        if not np.array_equal(self.edges, other.edges):
+            raise ValueError("Cannot merge histograms with different binning.")
+        self.counts += other.counts
+        self.sumw += other.sumw
+        self.sumw2 += other.sumw2
+        self.entries += other.entries
+        return self
+
+    def rebin(self, edges):
+        """
+        Sum the bins into the bins defined by edges, without rereading any data.
+
+        Each bin is split between the new bins it overlaps, in proportion to the
+        overlap (values taken as uniform within a bin), so new bins finer than
+        these ones (log binning at low energy) get their share instead of
+        alternating between empty and doubled bins. The result is exact when the
+        new edges fall on edges of this histogram. Parts of bins outside the new
+        edges are dropped. Returns (counts, sumw, sumw2), counts as floats.
+        """
+        edges = np.asarray(edges, dtype=np.float64)
+        # cumulative content at the new edges, linear within each bin
+        def split(values):
+            cum = np.concatenate([[0.0], np.cumsum(values, dtype=np.float64)])
+            return np.diff(np.interp(edges, self.edges, cum))
+
+        return split(self.counts), split(self.sumw), split(self.sumw2)
+
+
+class MultiHist:
+    """
+    Histograms of the same uniform binning for many keys (layer/isotope,
+    volume, particle, ...), filled together in one pass over each chunk.
+
+    How to use:
+    >>> mh = MultiHist(5000, 0, 5000)
+    >>> mh.fill(arrays["volume"], arrays["edep"])           # one histogram per volume found
+    >>> mh.counts[mh.index["virtualDetector"]], mh.sumw2[...]
+    """
+
+    def __init__(self, bins, xLow, xHigh, keys=(), engine=None):
+        self.bins, self.xLow, self.xHigh = bins, xLow, xHigh
+        self.edges = np.linspace(xLow, xHigh, bins + 1)
+        self.engine = engine
+        self.index = {}
+        self.counts = np.zeros((0, bins), dtype=np.int64)
+        self.sumw = np.zeros((0, bins), dtype=np.float64)
+        self.sumw2 = np.zeros((0, bins), dtype=np.float64)
+        self.entries = np.zeros(0, dtype=np.int64)
+        self.add_keys(keys)
+
+    def add_keys(self, keys):
+        new = [key for key in dict.fromkeys(keys) if key not in self.index]
+        for key in new:
+            self.index[key] = len(self.index)
+        if new:
+            pad = ((0, len(new)), (0, 0))
+            self.counts = np.pad(self.counts, pad)
+            self.sumw = np.pad(self.sumw, pad)
+            self.sumw2 = np.pad(self.sumw2, pad)
+            self.entries = np.pad(self.entries, (0, len(new)))
+
+    def fill(self, keys, X, weights=None):
+        """Fill the values X with their key (one array of keys, or a single key for the whole chunk)."""
+        X = np.asarray(X)
+        if np.ndim(keys) == 0:
+            self.add_keys([keys])
+            codes = np.full(len(X), self.index[keys], dtype=np.intp)
+        else:
+            values, inverse = np.unique(np.asarray(keys), return_inverse=True)
+            self.add_keys([v.item() for v in values])
+            codes = np.array([self.index[v.item()] for v in values], dtype=np.intp)[inverse.ravel()]
+        fill_uniform(codes, X, weights, self.edges, self.counts, self.sumw, self.sumw2, self.engine)
+        self.entries += np.bincount(codes, minlength=len(self.index))
+
+    def merge(self, other):
+        if not np.array_equal(self.edges, other.edges):
+            raise ValueError("Cannot merge histograms with different binning.")
+        self.add_keys(other.index)
+        rows = [self.index[key] for key in other.index]
+        self.counts[rows] += other.counts
+        self.sumw[rows] += other.sumw
+        self.sumw2[rows] += other.sumw2
+        self.entries[rows] += other.entries
+        return self
+
+    def hist(self, key):
+        """StreamHist of one key."""
+        h = StreamHist(self.bins, self.xLow, self.xHigh)
+        if key in self.index:
+            row = self.index[key]
+            h.counts[:], h.sumw[:], h.sumw2[:] = self.counts[row], self.sumw[row], self.sumw2[row]
+            h.entries = int(self.entries[row])
+        return h
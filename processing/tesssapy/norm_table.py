@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+
+# The materials CSV names the pure copper "PCu", the geometryTable of the simulation "PureCu"
+LAYER_ALIASES = {"PureCu": "PCu"}     # name used in the tables
+GEO_NAMES = {"PCu": "PureCu"}         # name used in the geometryTable
+
+KEYS = ["component", "layer", "isotope"]
+COLUMNS = ["geo_layer", "exposure", "rate", "rate_err"]
+
+
+def build_norm_table(materials, rock):
+    """
+    Compile materials_data.csv and rock_data.csv into one table indexed by
+    (component, layer, isotope), with the columns:
+
+    - geo_layer : name of the layer in the geometryTable (mass lookup)
+    - exposure  : surface in cm2 (rock, concrete), NaN for internals (mass read from the files)
+    - rate      : activity in Bq/kg (internals) or flux (rock, concrete)
+    - rate_err  : sigma of the rate
+
+    The number of primaries is not in the tables, it is the beamOn read from
+    the files (see unit_factors). Names are stripped and aliased here, and only
+    the first row of a duplicated key is kept, so lookups afterwards are plain
+    index accesses.
+
+    How to use:
+    >>> table = build_norm_table(materials, rock)
+    >>> table.loc[("internals", "PCu", "K40")]
+    """
+    def strip(col):
+        return col.astype(str).str.strip()
+
+    internals = pd.DataFrame({
+        "component": "internals",
+        "layer": strip(materials["Material"]).replace(LAYER_ALIASES),
+        "isotope": strip(materials["Isotope"]),
+        "exposure": np.nan,
+        "rate": pd.to_numeric(materials["Activity"], errors="coerce"),
+        "rate_err": pd.to_numeric(materials["Sigma"], errors="coerce"),
+    })
+    outer = pd.DataFrame({
+        "component": strip(rock["Material"]).str.lower(),
+        "layer": strip(rock["Particule"]),
+        "isotope": strip(rock["Isotope"]),
+        "exposure": pd.to_numeric(rock["Surface"], errors="coerce"),
+        "rate": pd.to_numeric(rock["Flux"], errors="coerce"),
+        "rate_err": pd.to_numeric(rock["Sigma"], errors="coerce"),
+    })
+
+    table = pd.concat([internals, outer], ignore_index=True)
+    table["geo_layer"] = table["layer"].map(lambda l: GEO_NAMES.get(l, l))
+    dup = table.duplicated(KEYS)
+    if dup.any():
+        for key in table.loc[dup, KEYS].itertuples(index=False):
+            print(f"Warning: multiple rows found for {' '.join(key)}, using the first one.")
+    return table[~dup].set_index(KEYS)[COLUMNS]
+
+
+def layer_isotopes(table, component):
+    """Return {layer: [isotopes]} of a component, in the order of the CSV files."""
+    sub = table.loc[component].index
+    return {layer: sub[sub.get_level_values("layer") == layer].get_level_values("isotope").tolist()
+            for layer in sub.get_level_values("layer").unique()}
+
+
+def exposure_scale(exposure, beamon, SecPerDay, detMass):
+    """
+    Counts per (kg.day) of one histogram entry for a unit activity (or flux),
+    one value per (layer, isotope):
+
+        scale = exposure * SecPerDay / beamon / detMass
+    """
+    return (np.asarray(exposure, dtype=np.float64) * SecPerDay *
+            (1.0 / np.asarray(beamon, dtype=np.float64))) * (1.0 / detMass)
+
+
+def unit_factors(exposure, beamon, Bin, SecPerDay, detMass):
+    """
+    Normalization of the raw histograms of N (layer, isotope) for a unit
+    activity (or flux), shape (N, bins):
+
+        factor = exposure * SecPerDay / beamon * Bin / detMass
+
+    exposure and beamon have one value per (layer, isotope), Bin is the
+    per-bin 1/width. The normalization is linear in the rate: the spectrum of
+    a (layer, isotope) is factor * rate.
+    """
+    return (np.asarray(exposure, dtype=np.float64) * SecPerDay *
+            (1.0 / np.asarray(beamon, dtype=np.float64)))[:, None] * np.asarray(Bin)[None, :] * (1.0 / detMass)
+
@@ -0,0 +1,61 @@
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+
+def get_workers(workers):
+    """Number of worker processes to use: None means all the available cores."""
+    if workers is None:
+        return os.cpu_count() or 1
+    return max(1, int(workers))
+
+
+def picklable(obj):
+    """True if obj can be sent to a worker process (lambdas and local functions cannot)."""
+    try:
+        pickle.dumps(obj)
+    except (pickle.PicklingError, AttributeError, TypeError):
+        return False
+    return True
+
+
+def pool_map(func, items, workers=1, chunksize=None):
+    """
+    Apply func to every item, on a process pool when workers > 1.
+
+    Results are yielded in the order of items whatever the order in which the
+    workers finish, so merging them is deterministic. func must be picklable
+    (a module-level function or a functools.partial of one).
+    Falls back to a serial map if func or an item cannot be pickled (checked
+    before starting: items are file paths or small tuples) or no process pool
+    can be started, and for the items not yielded yet if the pool breaks (a
+    worker killed, a result that cannot be pickled). Errors raised by func
+    itself are not caught.
+    """
+    items = list(items)
+    workers = get_workers(workers)
+    done = 0    # results already yielded
+
+    if workers > 1 and len(items) > 1:
+        if not picklable((func, items)):
+            print(f"{func!r} or its items cannot be sent to worker processes, running serially.")
+            yield from map(func, items)
+            return
+        try:
+            pool = ProcessPoolExecutor(max_workers=min(workers, len(items)))
+        except (OSError, NotImplementedError, ValueError) as e:
+            print(f"Process pool unavailable ({e}), running serially.")
+        else:
+            if chunksize is None:
+                chunksize = max(1, len(items) // (4 * workers))
+            try:
+                with pool:
+                    for result in pool.map(func, items, chunksize=chunksize):
+                        yield result
+                        done += 1
+                return
+            except (BrokenProcessPool, pickle.PicklingError) as e:
+                print(f"Process pool failed ({e}), running the {len(items) - done} remaining items serially.")
+
+    yield from map(func, items[done:])
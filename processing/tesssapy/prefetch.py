@@ -0,0 +1,93 @@
+import io
+import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+UNITS = {"": 1, "B": 1, "K": 1 << 10, "KB": 1 << 10, "M": 1 << 20, "MB": 1 << 20, "G": 1 << 30, "GB": 1 << 30,
+         "T": 1 << 40, "TB": 1 << 40}
+
+
+def parse_size(size):
+    """Number of bytes of an int or of a string like "512 MB"."""
+    if isinstance(size, (int, float)):
+        return int(size)
+    m = re.fullmatch(r"\s*([\d.]+)\s*([KMGT]?B?)\s*", size.upper())
+    if m is None:
+        raise ValueError(f"Cannot parse a memory size from {size!r}")
+    return int(float(m.group(1)) * UNITS[m.group(2)])
+
+
+class InMemoryFile(io.BytesIO):
+    """
+    In-memory copy of a file for uproot.open. uproot closes the file objects
+    it is given, this one stays readable so the file can be opened again
+    (tree, then macros); its memory is freed with the last reference.
+    """
+
+    def __init__(self, data, name=None):
+        super().__init__(data)
+        self.name = name
+
+    def close(self):
+        pass
+
+
+def read_bytes(file_path):
+    """Content of a file, or None if it cannot be read (the reader then reports it)."""
+    try:
+        with open(file_path, "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def prefetch(items, load=read_bytes, depth=2, memory="512 MB", sizes=None, threads=1):
+    """
+    Yield (item, load(item)) in order, loading up to depth items ahead on
+    background threads while the consumer works on the current one.
+
+    sizes (bytes per item, e.g. the size column of a DatasetIndex table)
+    bound the memory held by loaded items not consumed yet: an item is only
+    started if it fits in the budget with the ones in flight. An item larger
+    than the whole budget is never loaded: (item, None) is yielded and the
+    consumer reads it directly. depth=0 loads each item when it is needed.
+
+    How to use:
+    >>> for path, data in prefetch(files["path"], depth=4, memory="1 GB", sizes=files["size"]):
+    ...     h.fill(read_edep(io.BytesIO(data)))
+    """
+    items = list(items)
+    sizes = [0] * len(items) if sizes is None else [int(s) for s in sizes]
+    budget = parse_size(memory)
+
+    pending = deque()   # (index, future or None if too large) started and not yet yielded
+    held = 0            # bytes of the pending items
+    start = 0
+    with ThreadPoolExecutor(max_workers=max(1, threads)) as pool:
+        for i in range(len(items)):
+            # keep the next depth items in flight, as far as the budget allows
+            while start < len(items) and start <= i + depth:
+                if sizes[start] > budget:
+                    pending.append((start, None))
+                elif held + sizes[start] <= budget:
+                    pending.append((start, pool.submit(load, items[start])))
+                    held += sizes[start]
+                else:
+                    break
+                start += 1
+            k, future = pending.popleft()
+            if future is None:
+                yield items[k], None
+                continue
+            yield items[k], future.result()
+            held -= sizes[k]
+
+
+def prefetched_sources(file_paths, depth=2, memory="512 MB", sizes=None):
+    """
+    Yield, for every file, an in-memory copy readable by uproot.open (or the
+    path itself if the file could not be read ahead or is larger than the
+    memory budget), prefetching the next ones.
+    """
+    for file_path, data in prefetch(file_paths, read_bytes, depth, memory, sizes):
+        yield InMemoryFile(data, file_path) if data is not None else file_path
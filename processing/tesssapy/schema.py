@@ -0,0 +1,108 @@
+import uproot
+
+# Accepted branch names of the events tree written by TesseractSim, per column.
+# The first name found in a dataset is used, so a renamed branch only needs
+# to be added here.
+BRANCH_ALIASES = {
+    "file":         ("file",),
+    "ID":           ("ID",),
+    "eventID":      ("eventID",),
+    "clusterIndex": ("clusterIndex",),
+    "timeStamp":    ("timeStamp", "t"),
+    "volume":       ("volume",),
+    "rx":           ("rx",),
+    "ry":           ("ry",),
+    "rz":           ("rz",),
+    "edep":         ("edep",),
+}
+
+
+class BranchSchema:
+    """
+    Resolve the branches needed from the events tree once per dataset, then
+    read only those branches from each file as NumPy arrays.
+
+    A column missing from the tree raises a KeyError instead of silently
+    reading another branch. optional columns are read when the dataset has
+    them and skipped otherwise (e.g. the task key of compacted shards).
+
+    How to use:
+    >>> schema = BranchSchema(["edep"]).resolve(file_paths)
+    >>> edep = schema.read(file_paths[0])["edep"]
+    """
+
+    def __init__(self, columns, tree_name="events", optional=()):
+        self.columns = list(columns)
+        self.optional = [col for col in optional if col not in self.columns]
+        self.tree_name = tree_name
+        self.branches = None  # column -> branch name, set by resolve()
+
+    def open_tree(self, file_path):
+        """Return the events tree of a file, or None if the file cannot be read."""
+        try:
+            return uproot.open(file_path)[self.tree_name]
+        except Exception:
+            return None
+
+    def resolve(self, file_paths):
+        """Match the columns to the branches of the first readable file of the dataset."""
+        if isinstance(file_paths, str):
+            file_paths = [file_paths]
+
+        for file_path in file_paths:
+            tree = self.open_tree(file_path)
+            if tree is not None:
+                break
+        else:
+            return self
+
+        keys = set(tree.keys())
+        branches, missing = {}, []
+        for col in self.columns:
+            found = next((name for name in BRANCH_ALIASES.get(col, (col,)) if name in keys), None)
+            if found is None:
+                missing.append(col)
+            else:
+                branches[col] = found
+
+        if missing:
+            raise KeyError(f"Columns {missing} not found in '{self.tree_name}' of {file_path}. "
+                           f"Available branches: {sorted(keys)}")
+        for col in self.optional:
+            found = next((name for name in BRANCH_ALIASES.get(col, (col,)) if name in keys), None)
+            if found is not None:
+                branches[col] = found
+        self.branches = branches
+        return self
+
+    def read(self, file_path, **kwargs):
+        """
+        Read the resolved branches of one file.
+
+        Returns a dict column -> NumPy array, or None if the file cannot be read.
+        Extra keyword arguments are passed to TTree.arrays (entry_start, entry_stop, ...).
+        """
+        if self.branches is None:
+            self.resolve(file_path)
+        tree = self.open_tree(file_path)
+        if tree is None or self.branches is None:
+            return None
+
+        arrays = tree.arrays(list(self.branches.values()), library="np", **kwargs)
+        return {col: arrays[branch] for col, branch in self.branches.items()}
+
+    def iterate(self, file_path, step_size="100 MB", **kwargs):
+        """
+        Read the resolved branches of one file chunk by chunk.
+
+        Yields dicts column -> NumPy array of at most step_size (entries or
+        memory size), nothing if the file cannot be read.
+        """
+        if self.branches is None:
+            self.resolve(file_path)
+        tree = self.open_tree(file_path)
+        if tree is None or self.branches is None:
+            return
+
+        for arrays in tree.iterate(list(self.branches.values()), library="np", step_size=step_size, **kwargs):
+            yield {col: arrays[branch] for col, branch in self.branches.items()}
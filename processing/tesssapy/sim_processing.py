@@ -1,29 +1,128 @@
-import uproot
 import numpy as np
 import matplotlib.pyplot as plt 
 import matplotlib.cm as cm
-import os
-import glob
-import pandas as pd
 from tqdm import tqdm
 import warnings
+from functools import partial
 from .utils import get_cached_data, load_style_file
-from .get_norm_param import GetNormParam
+from .get_norm_param import RunMetadata, read_run_metadata
+from .histogram import StreamHist, make_edges
+from .parallel import pool_map, get_workers
+from .schema import BranchSchema
+from .dataset_index import DatasetIndex
+from .hist_cache import HistCache
+from .spectrum import SpectrumTensor
+from .norm_table import build_norm_table, layer_isotopes, exposure_scale, unit_factors
+from .activity_scan import ActivityScan
+from .rate_index import RateIndex
+from .events import EVENT_KEYS, EventAggregator, optional_keys, read_events
+from .filtering import VolumeCut
+from .arrow_store import ArrowSchema, ArrowStore, is_store_file, read_store_metadata, store_filter
+from .prefetch import prefetched_sources
 
 warnings.simplefilter("ignore")
 
 materials = get_cached_data("materials_data.csv")
 rock      = get_cached_data("rock_data.csv")
+norm_table = build_norm_table(materials, rock)   # (component, layer, isotope) -> normalization inputs
 
 plt.style.use(load_style_file('SetStyle_mplstyle.txt'))
 
+# Weight branch written by the biased runs (bias="bon"), histogrammed by default for them
+BIAS_WEIGHT = "weight"
+
+
+def read_edep(file_path, schema=None):
+    """Return the edep array of the events tree of a filtered file (empty if unreadable)."""
+    schema = schema or BranchSchema(["edep"])
+    arrays = schema.read(file_path)
+    if arrays is None:
+        return []
+    return arrays["edep"]
+
+
+def cut_columns(cuts):
+    """Columns needed by a list of cuts, in order and without duplicates."""
+    return list(dict.fromkeys(col for cut in cuts or [] for col in cut.columns))
+
+
+def read_energy_weights(file_path, schema=None, level="hit", cuts=None, weight=None):
+    """
+    Return (energies, weights) to histogram: edep per hit, or summed per event
+    or per cluster. With cuts (volume of a raw file, fiducial volume, see
+    filtering.py and fiducial.py), only the hits passing all of them are kept,
+    evaluated chunk by chunk in the same read as edep. weight is the weight
+    column of biased runs (one weight per event, see EventAggregator); weights
+    is None without it.
+    """
+    if not cuts and weight is None:
+        if level == "hit":
+            return read_edep(file_path, schema), None
+        return read_events(file_path, level, schema)["energy"], None
+
+    def keep(arrays):
+        mask = np.ones(len(arrays["edep"]), dtype=bool)
+        for cut in cuts or []:
+            mask &= cut.mask(arrays)
+        return mask
+
+    schema = schema or BranchSchema(EVENT_KEYS[level] + cut_columns(cuts) + ([weight] if weight else []) + ["edep"],
+                                    optional=optional_keys(level))
+    if level == "hit":
+        edep, weights = [], []
+        for arrays in schema.iterate(file_path):
+            mask = keep(arrays)
+            edep.append(arrays["edep"][mask])
+            weights.append(arrays[weight][mask] if weight else None)
+        if not edep:
+            return [], ([] if weight else None)
+        return np.concatenate(edep), (np.concatenate(weights) if weight else None)
+    agg = EventAggregator(level, weight)
+    for arrays in schema.iterate(file_path):
+        mask = keep(arrays)
+        agg.fill({col: a[mask] for col, a in arrays.items()})
+    events = agg.result()
+    return events["energy"], events.get("weight")
+
+
+def hist_file(file_path, bins, xLow, xHigh, schema=None, level="hit", cuts=None, weight=None):
+    """Histogram the edep of one file, run by the workers of g4_sim_proc.load_raw_data."""
+    h = StreamHist(bins, xLow, xHigh)
+    h.fill(*read_energy_weights(file_path, schema, level, cuts, weight))
+    return h
+
+
+def process_file(file_path, bins, xLow, xHigh, schema=None, level="hit", cuts=None, weight=None):
+    """Histogram one file and read its run metadata, run by the workers of g4_sim_proc.load_raw_data."""
+    # file_path can also be an in-memory copy of a ROOT file (see prefetch.py)
+    store = isinstance(file_path, str) and is_store_file(file_path)
+    meta = read_store_metadata(file_path) if store else read_run_metadata(file_path)
+    return hist_file(file_path, bins, xLow, xHigh, schema, level, cuts, weight), meta
+
+
 class g4_sim_proc:
 
-    def __init__(self, compoment, folder_path, bias="boff",  plots= True):
+    def __init__(self, compoment, folder_path, bias="boff",  plots= True, stream=True, workers=1, cache=True,
+                 level="hit", fiducial=None, stage="filtered", prefetch=0, prefetch_memory="512 MB", weight=None):
         
         # ======== parameters ========
         self.compoment = compoment      # internals, rock, concrete      
         self.folder_path = folder_path  # path to the folder containing the root files
+        self.stream = stream            # bin each file when read instead of keeping every edep value
+        self.workers = workers          # number of processes reading files (None = all cores)
+        self.cache = cache              # reuse the per-file histograms cached by a previous run
+        self.level = level              # histogram the edep per "hit", or summed per "event" or "cluster"
+        self.fiducial = fiducial        # fiducial cut on rx, ry, rz (Box, Cylinder), None keeps every hit
+        self.stage = stage              # read the "filtered" files, the "raw" ones with the VD cut done in memory,
+                                        # or an "arrow" store (folder_path is then the root of an ArrowStore)
+        # weight branch: None uses BIAS_WEIGHT for biased runs (a missing branch raises a KeyError)
+        # and no weight otherwise, False histograms a biased run unweighted
+        self.weight = (BIAS_WEIGHT if bias == "bon" else None) if weight is None else (weight or None)
+        self.prefetch = prefetch        # files read ahead on a thread when running on a single process (0: off),
+                                        # whole files are read: worth it on a network filesystem only
+        self.prefetch_memory = prefetch_memory  # at most this much read ahead
+        # cuts applied to the hits while reading
+        self.cuts = ([VolumeCut()] if stage == "raw" else []) + ([fiducial] if fiducial is not None else [])
         print(f"Processing files in {self.folder_path}")
         
         # ======== constants ========
@@ -31,12 +130,17 @@ class g4_sim_proc:
         self.SecPerDay = float(3600 * 24)
         self.xLow = 0
         self.xHigh = 5000
-        self.Bins = 20 
-        self.BinSize = (self.xHigh - self.xLow) / self.Bins
-        self.Bin = float(1.0 / self.BinSize)
+        self.baseBins = 5000    # fine base binning (1 keV) the data is accumulated with
+        self.BaseBinSize = (self.xHigh - self.xLow) / self.baseBins
+        self.set_binning("linear", 20)
         
         # ======== variables ========
         self.data = {}
+        self.data_weights = {}
+        self.schema = None
+        self.hists = {}
+        self.files = {}
+        self.run_meta = None
         self.data_counts = {}
         self.counts = {}
         self.counts_err = {}
@@ -54,218 +158,276 @@ class g4_sim_proc:
             self.get_spectrum_totals()
         self.print_simulation_summary()
         
-    def get_root_tree(self, file_path):
-        try:
-            root_file = uproot.open(file_path)
-            tree = root_file["events"]
-            Params = tree.keys()
-            
-            if not tree:
-                return []
-            edep = np.array(tree.arrays(Params[16])[Params[16]])
-            return edep
-        
-        except Exception as e:
-            return []
+    def get_root_tree_weights(self, file_path):
+        return read_energy_weights(file_path, self.schema, self.level, self.cuts, self.weight)
     
-    def hist_it(self, X):
-        counts, edges = np.histogram(X, self.Bins,[self.xLow,self.xHigh]) #, bins = logbins)
+    def set_binning(self, binning="linear", bins=None):
+        """
+        Set the binning of the spectra: "linear", "log" (bins between xLow and xHigh)
+        or an array of bin edges in keV. Bin is the per-bin 1/width used in the normalization.
+        """
+        self.Bins = bins or self.Bins
+        self.edges = make_edges(binning, self.Bins, self.xLow, self.xHigh, min_low=self.BaseBinSize)
+        self.Bins = len(self.edges) - 1
+        self.BinSize = np.diff(self.edges)
+        self.Bin = 1.0 / self.BinSize
+
+    def rebin(self, binning="linear", bins=None):
+        """
+        Recompute the normalized spectra and totals with another binning, without
+        rereading the data: the streamed base histograms are summed into the new bins.
+
+        How to use:
+        >>> s.rebin("log", 50)
+        >>> s.rebin(np.arange(0, 201, 5))   # 5 keV bins on the low-energy region
+        """
+        self.set_binning(binning, bins)
+        self.normalize_data()
+        self.get_totals()
+
+    def hist_it(self, X, weights=None):
+        counts, edges = np.histogram(X, self.edges, weights=weights)
         centers = (edges[:-1] + edges[1:]) / 2.0
         return centers, counts, edges
+
+    def get_hist(self, layer, iso):
+        """Return centers, counts and edges for a (layer, isotope), streamed or not."""
+        if self.stream:
+            counts, sumw, _ = self.hists[layer][iso].rebin(self.edges)
+            centers = (self.edges[:-1] + self.edges[1:]) / 2.0
+            return centers, (sumw if self.weight else counts), self.edges
+        return self.hist_it(self.data[layer][iso], self.get_weights(layer, iso))
+
+    def get_weights(self, layer, iso):
+        """Weights of the values of self.data (non-streamed), None for unweighted runs."""
+        return self.data_weights[layer][iso] if self.weight else None
+
+    def get_sumw2(self, layer, iso):
+        """Return the sum of squared weights of a (layer, isotope) with the current binning."""
+        if self.stream:
+            return self.hists[layer][iso].rebin(self.edges)[2]
+        weights = self.get_weights(layer, iso)
+        return np.histogram(self.data[layer][iso], self.edges,
+                            weights=None if weights is None else np.square(weights))[0]
+
+    def get_base_hist(self, layer, iso):
+        """Return the counts (sum of weights) and sum of squared weights of a (layer, isotope) at the base binning."""
+        if self.stream:
+            h = self.hists[layer][iso]
+            return (h.sumw, h.sumw2) if self.weight else (h.counts, h.counts)
+        weights = self.get_weights(layer, iso)
+        base = (self.baseBins, [self.xLow, self.xHigh])
+        counts, _ = np.histogram(self.data[layer][iso], *base, weights=weights)
+        if weights is None:
+            return counts, counts
+        sumw2, _ = np.histogram(self.data[layer][iso], *base, weights=np.square(weights))
+        return counts, sumw2
     
+    def prefetching(self):
+        """
+        Read the files ahead in the main process: single process runs on
+        filtered ROOT files only. Raw files are read with their branches
+        projected (prefetching would load every branch), store files are memory-mapped.
+        """
+        return bool(self.prefetch) and get_workers(self.workers) == 1 and self.stage == "filtered"
+
+    def sources(self, rows):
+        """Files to read for DatasetIndex rows: prefetched in-memory copies, or the paths."""
+        if self.prefetching():
+            return prefetched_sources([row.path for row in rows], self.prefetch, self.prefetch_memory,
+                                      [row.size for row in rows])
+        return (row.path for row in rows)
+
+    def read_files(self, rows):
+        """
+        Return (StreamHist, meta) for every DatasetIndex row, in order.
+
+        Files found in the histogram cache are not opened again, the others
+        are read on the worker pool and added to the cache.
+        """
+        hist_cache = HistCache(self.folder_path, self.schema.branches, self.baseBins, self.xLow, self.xHigh,
+                               cuts=self.cuts or None, weight=self.weight) \
+            if self.cache else None
+        results = [hist_cache.get(row) if hist_cache else None for row in rows]
+        todo = [i for i, result in enumerate(results) if result is None]
+
+        func = partial(process_file, bins=self.baseBins, xLow=self.xLow, xHigh=self.xHigh, schema=self.schema,
+                       level=self.level, cuts=self.cuts, weight=self.weight)
+        if self.prefetching():
+            # one process: the next files are read on a thread while this one is histogrammed
+            done = map(func, self.sources([rows[i] for i in todo]))
+        else:
+            done = pool_map(func, [rows[i].path for i in todo], workers=self.workers)
+        with tqdm(total=len(todo), desc="Processing Files", unit="file") as pbar:
+            for i, result in zip(todo, done):
+                results[i] = result
+                if hist_cache:
+                    hist_cache.put(rows[i], *result)
+                pbar.update(1)
+
+        if hist_cache:
+            hist_cache.close()
+            print(f"{len(rows) - len(todo)} files taken from the histogram cache.")
+        return results
+
     def load_raw_data(self):
-        
-        # ======== functions ========
-        def get_layers_and_isotopes(component):
-            if component == "internals":
-                layers = materials["Material"].unique().tolist()
-                get_isotopes = lambda l: materials[materials["Material"] == l]["Isotope"].unique().tolist()
-            else:
-                material_type = "Rock" if component == "rock" else "Concrete"
-                layers = rock[rock["Material"] == material_type]["Particule"].unique().tolist()
-                get_isotopes = lambda l: rock[rock["Particule"] == l]["Isotope"].unique().tolist()
-            return layers, get_isotopes
-
-        def build_filepath(component, layer, iso, i,bias="boff"):
-            if component == "internals":
-                return f"{self.folder_path}/{layer}_{iso}_{i}_{bias}_filtered.root"
-
-            prefix = "Rock" if component == "rock" else "Concrete"
-            
-            if layer == "Neutrons":
-                return f"{self.folder_path}/{prefix}_{layer}_{i}_{bias}_filtered.root"
-            
-            return f"{self.folder_path}/{prefix}_{layer}_{iso}_{i}_{bias}_filtered.root"
-        
-        # ======== main code ========
-        layers, get_isotopes = get_layers_and_isotopes(self.compoment)
+        layer_isos = layer_isotopes(norm_table, self.compoment)
+        layers = list(layer_isos)
         if self.compoment != "internals":
             self.particule = layers
 
-        total_files = sum(len(glob.glob(f"{self.folder_path}/{layer}*.root")) for layer in layers)
-
-        with tqdm(total=total_files, desc="Processing Files", unit="file") as pbar:
-            for layer in layers:
-                isotopes = get_isotopes(layer)
-                self.data[layer] = {iso: [] for iso in isotopes}
-                self.data_counts[layer] = {iso: 0 for iso in isotopes}
-                for iso in isotopes:
-                    for i in range(300):
-                        file_path = build_filepath(self.compoment, layer, iso, i,self.bias)
-
-                        if not os.path.exists(file_path):
-                            continue
-                        data = self.get_root_tree(file_path)
-                        if data is not None and len(data) > 0:
-                            self.data[layer][iso].extend(data)
-                            self.data_counts[layer][iso] += 1
-                        pbar.update(1)
+        # one scan of the folder instead of probing every possible task id
+        self.index = ArrowStore(self.folder_path) if self.stage == "arrow" else DatasetIndex(self.folder_path)
+
+        jobs = []
+        for layer in layers:
+            isotopes = layer_isos[layer]
+            self.data[layer] = {iso: [] for iso in isotopes}
+            self.data_weights[layer] = {iso: [] for iso in isotopes}
+            self.hists[layer] = {iso: StreamHist(self.baseBins, self.xLow, self.xHigh) for iso in isotopes}
+            self.data_counts[layer] = {iso: 0 for iso in isotopes}
+            self.files[layer] = {}
+            for iso in isotopes:
+                files = self.index.select(self.compoment, layer, iso, bias=self.bias, stage=self.stage)
+                self.files[layer][iso] = files
+                jobs.extend((layer, iso, row) for row in files.itertuples(index=False))
+
+        # branch names are resolved and checked once for the whole dataset
+        columns = EVENT_KEYS[self.level] + cut_columns(self.cuts) + ([self.weight] if self.weight else []) + ["edep"]
+        if self.stage == "arrow":
+            # the fiducial and energy cuts are also pushed down to the store reader, fewer rows are read
+            self.schema = ArrowSchema(columns, filter=store_filter(self.cuts, self.level, self.xLow, self.xHigh),
+                                      optional=optional_keys(self.level))
+        else:
+            self.schema = BranchSchema(columns, optional=optional_keys(self.level))
+        self.schema.resolve([row.path for _, _, row in jobs])
+        if self.stream:
+            # partial histograms are merged in the order of jobs, so the merge is deterministic
+            results = self.read_files([row for _, _, row in jobs])
+            self.run_meta = {row.path: meta for (_, _, row), (_, meta) in zip(jobs, results)}
+            for (layer, iso, _), (h, _) in zip(jobs, results):
+                if h.entries > 0:
+                    self.hists[layer][iso].merge(h)
+                    self.data_counts[layer][iso] += 1
+        else:
+            sources = self.sources([row for _, _, row in jobs])
+            for (layer, iso, row), source in tqdm(zip(jobs, sources), total=len(jobs), desc="Processing Files",
+                                                  unit="file"):
+                data, weights = self.get_root_tree_weights(source)
+                if data is not None and len(data) > 0:
+                    self.data[layer][iso].extend(data)
+                    if weights is not None:
+                        self.data_weights[layer][iso].extend(weights)
+                    self.data_counts[layer][iso] += 1
 
         print("Data loading complete.", self.data_counts)
 
     def normalize_data(self):
-        # Load shielding and particle names from macros instead of CSVs
-        self.shielding = materials["Material"].unique().tolist()
+        # Layer names (shielding materials or particles) from the normalization table
+        self.shielding = list(layer_isotopes(norm_table, "internals"))
         self.particle = rock["Particule"].unique().tolist()
 
-        def compute_normalized_counts(X, Y, norm, norm_err):
-            return np.multiply(Y, norm), np.multiply(Y, norm_err), X
-
-        def get_parameters(component, layer, iso, file_path):
+        def get_run_parameters(layer, iso, geo_layer, files):
             """
-            Return normalization parameters based on macros inside the ROOT file.
+            Return (mass, beamOn) of a (layer, isotope) from the macros of its ROOT files.
 
-            Robust to the PureCu <-> PCu naming mismatch and to pandas selection issues.
+            The beamOn is summed over every task file of the (layer, isotope),
+            including the files without any hit in the virtual detector. The mass
+            is looked up with the geometryTable name of the layer (PCu -> PureCu).
             """
+            meta = [self.run_meta[path] for path in files["path"]]
+            beamon = sum(m["beamon"] for m in meta if m["beamon"])
+            # same geometry in every task file
+            masses = next((m["masses"] for m in meta if m["masses"]), {})
+            return masses.get(geo_layer, 0.0), beamon
 
-            # --- name mapping: what to use when querying geometry vs materials ---
-            # geometry (GetNormParam) stores "PureCu"
-            # your materials CSV uses "PCu"
-            geo_name_map = {"PCu": "PureCu", "PureCu": "PureCu"}    # what geometry expects
-            mat_name_map = {"PCu": "PCu", "PureCu": "PCu"}          # what materials table expects
-
-            # Normalize input (strip whitespace)
-            layer_in = layer.strip() if isinstance(layer, str) else layer
-            iso_in = iso.strip() if isinstance(iso, str) else iso
-
-            # Decide names to use for lookup
-            geo_layer = geo_name_map.get(layer_in, layer_in)
-            mat_layer = mat_name_map.get(layer_in, layer_in)
-
-            if component == "internals":
-                # --- Mass from geometryTable ---
-                geo = GetNormParam(file_path, "geometryTable")
-                masses = getattr(geo, "total_mass", {}) or {}
-                mass_val = masses.get(geo_layer, 0.0)
-
-                # --- BeamOn from runMacro ---
-                run = GetNormParam(file_path, "runMacro")
-                beamon = getattr(run, "beamon_number", 1) or 1
-
-                # --- Lookup activity and sigma in materials dataframe ---
-                
-                sel = materials[
-                    (materials["Material"] == mat_layer) & (materials["Isotope"] == iso_in)
-                ]
-
-                if sel.empty:
-                    # no matching row
-                    print(f"No data for {mat_layer} {iso_in}: materials selection returned empty")
-                    return mass_val, beamon, None, None
-
-                # If multiple rows, pick the first (or you can decide to aggregate)
-                if len(sel) > 1:
-                    print(f"Warning: multiple rows found for {mat_layer} {iso_in}, using the first one.")
-
-                try:
-                    # use iat to extract the scalar value from the column directly
-                    activity = float(sel["Activity"].iat[0])
-                    sigma = float(sel["Sigma"].iat[0])
-                except Exception as e:
-                    print(f"Error converting Activity/Sigma to float for {mat_layer} {iso_in}: {e}")
-                    return mass_val, beamon, None, None
-
-                return mass_val, beamon, activity, sigma
-
-            else:
-                # Rock or Concrete: beamOn also from macro
-                run = GetNormParam(file_path, "runMacro")
-                beamon = getattr(run, "beamon_number", 1) or 1
-
-                mat = "Rock" if component == "rock" else "Concrete"
-                
-                sel = rock[
-                    (rock["Material"] == mat) &
-                    (rock["Particule"] == layer_in) &
-                    (rock["Isotope"] == iso_in)
-                ]
-
-                if sel.empty:
-                    print(f"No data for {mat} {layer_in} {iso_in}: rock selection returned empty")
-                    return None, beamon, None, None
-
-                if len(sel) > 1:
-                    print(f"Warning: multiple rows found for {mat} {layer_in} {iso_in}, using the first one.")
-
-                try:
-                    surface = float(sel["Surface"].iat[0])
-                    flux = float(sel["Flux"].iat[0])
-                    sigma = float(sel["Sigma"].iat[0])
-                except Exception as e:
-                    print(f"Error converting Surface/Flux/Sigma to float for {mat} {layer_in} {iso_in}: {e}")
-                    return None, beamon, None, None
-
-                return surface, beamon, flux, sigma
-
-        # --- loop as before ---
+        # ======== main code ========
         if self.compoment not in ["internals", "rock", "concrete"]:
             print("Unknown component:", self.compoment)
             return
 
-        layers = self.shielding if self.compoment == "internals" else self.particle
-
-        for layer in layers:
-            self.counts[layer], self.counts_err[layer], self.energy[layer] = {}, {}, {}
-            isotopes = (
-                materials[materials["Material"] == layer]["Isotope"].tolist()
-                if self.compoment == "internals"
-                else rock[rock["Particule"] == layer]["Isotope"].tolist()
-            )
-            for iso in isotopes:
-                try:
-                    X, Y, self.edges = self.hist_it(self.data[layer][iso])
-
-                    # Grab the first file path we used for this layer/iso
-                    file_path = f"{self.folder_path}/{layer}_{iso}_1_boff_filtered.root" \
-                        if self.compoment == "internals" \
-                        else f"{self.folder_path}/{('Rock' if self.compoment=='rock' else 'Concrete')}_{layer}_{iso}_1_boff_filtered.root"
-
-                    p1, p2, p3, p4 = get_parameters(self.compoment, layer, iso, file_path)
-
-                    normalization_factor = (
-                        p1 * self.SecPerDay *
-                        (1.0 / (p2 * self.data_counts[layer][iso])) *
-                        self.Bin * (1.0 / self.detMass)
-                    )
-                    norm, norm_err = normalization_factor * p3, normalization_factor * p4
-
-                    self.counts[layer][iso], self.counts_err[layer][iso], self.energy[layer][iso] = \
-                        compute_normalized_counts(X, Y, norm, norm_err)
+        # beamOn and masses of every task file, read in one pass and cached by path and mtime
+        # (already known when the files were read through read_files)
+        if self.run_meta is None and self.stage == "arrow":
+            self.run_meta = self.index.run_metadata(self.index.select(self.compoment, bias=self.bias))
+        elif self.run_meta is None:
+            self.run_meta = RunMetadata(self.folder_path).collect(
+                self.index.select(self.compoment, bias=self.bias, stage=self.stage), workers=self.workers)
+
+        table = norm_table.loc[self.compoment]
+        isotopes = layer_isotopes(norm_table, self.compoment)
+        energy = (self.edges[:-1] + self.edges[1:]) / 2.0
+        # dense (layer, isotope, bin) spectra, self.counts & co. are dict views of it
+        self.spectra = SpectrumTensor(list(isotopes), isotopes, energy)
+
+        # per (layer, isotope) inputs: only the mass (internals) and beamOn come from the files
+        exposure, beamon = table["exposure"].to_numpy(copy=True), np.zeros(len(table))
+        for k, (layer, iso) in enumerate(table.index):
+            if layer not in self.files or iso not in self.files[layer]:
+                continue
+            mass, beamon[k] = get_run_parameters(layer, iso, table["geo_layer"].iat[k], self.files[layer][iso])
+            if self.compoment == "internals":
+                exposure[k] = mass
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            factor = unit_factors(exposure, beamon, self.Bin, self.SecPerDay, self.detMass)
+        norm = factor * table["rate"].to_numpy()[:, None]
+        norm_err = factor * table["rate_err"].to_numpy()[:, None]
+        # spectra for a unit activity, kept for activity_scan
+        self.unit_spectra = SpectrumTensor(list(isotopes), isotopes, energy)
+        # prefix sums of the rates at the base binning, for rate()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            scale = exposure_scale(exposure, beamon, self.SecPerDay, self.detMass)
+        self.rate_index = RateIndex(list(isotopes), isotopes,
+                                    np.linspace(self.xLow, self.xHigh, self.baseBins + 1))
+
+        for k, (layer, iso) in enumerate(table.index):
+            # not simulated: no files, so nothing to normalize
+            if not beamon[k]:
+                continue
+            try:
+                X, Y, self.edges = self.get_hist(layer, iso)
+            except Exception as e:
+                print(f"No data for {layer} {iso}:", e)
+                continue
 
-                except Exception as e:
-                    print(f"No data for {layer} {iso}:", e)
-                    continue
+            stat_err = np.sqrt(self.get_sumw2(layer, iso))
+            self.unit_spectra.set(layer, iso, Y * factor[k], stat_err * factor[k])
+            if np.isnan(table["rate"].iat[k]) or np.isnan(table["rate_err"].iat[k]):
+                print(f"No data for {layer} {iso}: no activity/flux or sigma in the tables")
+                continue
+            # activity sigma and Monte Carlo statistics (sqrt of the sum of squared weights,
+            # sqrt(counts) unweighted) in quadrature, as in rate_index
+            counts_err = np.hypot(Y * norm_err[k], stat_err * norm[k])
+            self.spectra.set(layer, iso, Y * norm[k], counts_err)
+            base_counts, base_sumw2 = self.get_base_hist(layer, iso)
+            self.rate_index.set(layer, iso, base_counts,
+                                scale[k] * table["rate"].iat[k], scale[k] * table["rate_err"].iat[k], base_sumw2)
+
+        self.counts, self.counts_err, self.energy = self.spectra.as_dicts(with_totals=False)
+
+    def rate(self, e_lo, e_hi, layer=None, isotope=None):
+        """
+        Rate in counts/(kg.day) integrated over [e_lo, e_hi] keV (snapped to the
+        base bins, 1 keV), with its error. layer and isotope restrict the sum,
+        None means all; e_lo and e_hi can be arrays of windows.
+
+        How to use:
+        >>> sim.rate(2000, 2100)                  # whole setup in the ROI
+        >>> sim.rate(0, 100, layer="Cu", isotope="K40")
+        """
+        return self.rate_index.rate(e_lo, e_hi, layer, isotope)
+
+    def activity_scan(self):
+        """
+        ActivityScan on the raw histograms of this dataset, to get the spectra
+        and rates of other activity tables without rereading anything.
+        """
+        return ActivityScan(self.unit_spectra, self.compoment)
 
     def get_totals(self):
-        self.counts['total'] = 0
-        self.counts_err['total'] = 0
-        for layer in self.counts:
-            if layer == 'total':
-                continue
-            self.counts[layer]['total'] = np.sum([v for k, v in self.counts[layer].items() if k != 'total'], axis=0)
-            self.counts_err[layer]['total'] = np.sqrt(np.sum([v**2 for k, v in self.counts_err[layer].items() if k != 'total'], axis=0))
-            self.counts['total'] += self.counts[layer]['total']
-            self.counts_err['total'] = np.sqrt(self.counts_err['total']**2 + self.counts_err[layer]['total']**2)
+        # per-layer and overall sums over the spectrum tensor, errors in quadrature
+        self.counts, self.counts_err, self.energy = self.spectra.as_dicts()
     
     def get_spectrum(self):
         def plot_individual_spectrum(energy, counts, counts_err, label, color, ax):
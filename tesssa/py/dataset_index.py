@@ -0,0 +1,89 @@
+import os
+import re
+import pandas as pd
+
+COLUMNS = ["component", "layer", "isotope", "task", "bias", "stage", "path", "size", "mtime"]
+
+# Naming schemes of the simulation outputs (see SimRunner/run_in_container.sh):
+#   internals : {layer}_{isotope}_{task}[_b{bias}][_filtered|_proc].root
+#   rock      : Rock_{layer}_{isotope}_{task}[_b{bias}][_filtered|_proc].root
+#   concrete  : Concrete_{layer}_{isotope}_{task}[_b{bias}][_filtered|_proc].root
+#   neutrons  : Rock_Neutrons_{task}[_b{bias}][_filtered|_proc].root
+FILE_PATTERN = re.compile(
+    r"^(?:(?P<prefix>Rock|Concrete)_)?(?P<layer>[^_]+)(?:_(?P<isotope>[^_]+))?_(?P<task>\d+)"
+    r"(?:_(?P<bias>b(?:on|off)))?(?:_(?P<stage>filtered|proc))?\.root$"
+)
+
+
+def parse_file_name(file_name):
+    """
+    Split a simulation file name into its fields.
+
+    Returns a dict with component, layer, isotope, task, bias and stage
+    ("raw", "filtered" or "proc"), or None if the name does not follow any scheme.
+    """
+    m = FILE_PATTERN.match(file_name)
+    if m is None:
+        return None
+    prefix = m["prefix"]
+    return {
+        "component": prefix.lower() if prefix else "internals",
+        "layer": m["layer"],
+        # rock neutrons have no isotope, they are stored as "Tot" in rock_data.csv
+        "isotope": m["isotope"] or "Tot",
+        "task": int(m["task"]),
+        "bias": m["bias"],
+        "stage": m["stage"] or "raw",
+    }
+
+
+class DatasetIndex:
+    """
+    Table of the simulation files of a folder, built from a single directory scan.
+
+    Columns: component, layer, isotope, task, bias, stage, path, size, mtime (ns).
+    Nothing is written to the data folder: a scan with one stat per file is
+    as cheap as reading a saved index. refresh() scans again: new files are
+    parsed, removed files are dropped, and known files keep their row only if
+    their size and mtime did not change, so files overwritten in place are
+    seen as modified (refresh(full=True) parses every name again).
+
+    How to use:
+    >>> index = DatasetIndex("path/to/filtered")
+    >>> index.select(component="internals", layer="Cu", isotope="K40", bias="boff", stage="filtered")
+    """
+
+    def __init__(self, folder_path):
+        self.folder_path = folder_path
+        self.table = pd.DataFrame(columns=COLUMNS)
+        self.refresh()
+
+    def refresh(self, full=False):
+        """Bring the table up to date with a single scan of the folder."""
+        known = {} if full else {row.path: row for row in self.table.itertuples(index=False)}
+        rows = []
+        with os.scandir(self.folder_path) as it:
+            for entry in it:
+                fields = parse_file_name(entry.name)
+                if fields is None or not entry.is_file():
+                    continue
+                st = entry.stat()
+                row = known.get(entry.path)
+                if row is not None and row.size == st.st_size and row.mtime == st.st_mtime_ns:
+                    rows.append(row._asdict())
+                    continue
+                rows.append({**fields, "path": entry.path, "size": st.st_size, "mtime": st.st_mtime_ns})
+
+        self.table = (pd.DataFrame(rows, columns=COLUMNS)
+                      .sort_values(["component", "layer", "isotope", "task"], kind="stable")
+                      .reset_index(drop=True))
+        return self.table
+
+    def select(self, component=None, layer=None, isotope=None, bias=None, stage=None):
+        """Return the rows matching every given field, sorted by task id."""
+        mask = pd.Series(True, index=self.table.index)
+        for col, val in (("component", component), ("layer", layer), ("isotope", isotope),
+                         ("bias", bias), ("stage", stage)):
+            if val is not None:
+                mask &= self.table[col] == val
+        return self.table[mask].sort_values("task", kind="stable")
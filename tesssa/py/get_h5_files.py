@@ -1,32 +1,91 @@
 import h5py
-import pandas as pd
 import numpy as np
-from importlib_resources import files
+from tesssa.histogram import StreamHist
 
-def load_h5_file(h5_file_path):
+STEP_ROWS = 1 << 20
+
+
+def dataset_view(ds):
+    """
+    Return a memory-mapped array of a contiguous, uncompressed dataset, or the
+    h5py dataset itself (read on slicing) for chunked or compressed ones.
+    """
+    offset = ds.id.get_offset() if ds.chunks is None and ds.compression is None else None
+    if offset is None or ds.dtype.kind not in "iuf":
+        return ds
+    return np.memmap(ds.file.filename, dtype=ds.dtype, mode="r", offset=offset, shape=ds.shape)
+
+
+def iter_rows(ds, step=STEP_ROWS):
+    """Yield the rows of a dataset in blocks of about step rows (whole HDF5 chunks)."""
+    chunks = getattr(ds, "chunks", None)     # None for a memory-mapped array
+    if chunks is not None:
+        step = max(step // chunks[0], 1) * chunks[0]
+    for start in range(0, ds.shape[0], step):
+        yield ds[start:start + step]
+
+
+def hist_dataset(ds, bins, xLow, xHigh, step=STEP_ROWS):
+    """Histogram an edep dataset block by block (first column of a 2D dataset)."""
+    h = StreamHist(bins, xLow, xHigh)
+    for block in iter_rows(ds, step):
+        h.fill(block[:, 0] if block.ndim == 2 else block)
+    return h
+
+
+def count_files(group):
     """
-    Reads an HDF5 (.h5) file and loads its datasets into a nested dictionary.
+    Number of source files of a <layer>/<isotope> group: the n_files attribute
+    written by RootToH5PY, which counts every converted file with or without
+    hits as load_raw_data does. Older files without it fall back to the
+    distinct values of their "file" dataset, which misses files without hits.
+    """
+    if "n_files" in group.attrs:
+        return int(group.attrs["n_files"])
+    if "file" not in group:
+        return 0
+    found = set()
+    for block in iter_rows(group["file"]):
+        found.update(np.unique(block).tolist())
+    return len(found)
+
+
+class H5Data:
+    """
+    Lazy view of an HDF5 (.h5) file written by RootToH5PY, without reading
+    its datasets.
 
-    Args:
-        h5_file_path (str): Path to the .h5 file.
+    data[layer][isotope] is {dataset name: view} (see dataset_view) and
+    meta[layer][isotope] is {"n_files": (see count_files), "attrs": group
+    attributes}. The views read from the file, so it stays open until close()
+    (or the end of the with block).
 
-    Returns:
-        dict: A nested dictionary where keys are layers, isotopes, and values are Pandas DataFrames.
+    How to use:
+    >>> with load_h5_file("path/to/internals.h5") as h5:
+    ...     h = hist_dataset(h5.data["Cu"]["K40"]["edep"], 20, 0, 5000)
+    ...     n_files = h5.meta["Cu"]["K40"]["n_files"]
     """
-    data_dict = {}
-
-    with h5py.File(h5_file_path, "r") as hdf:
-        for layer in hdf.keys():  
-            data_dict[layer] = {}
-            
-            for isotope in hdf[layer].keys(): 
-                
-                data_dict[layer][isotope] = {}
-                
-                for key in hdf[layer][isotope].keys():
-                    if key =="edep":
-                        data_dict[layer][isotope][key] = pd.DataFrame(hdf[layer][isotope][key][:][:,0])
-                    else:
-                        data_dict[layer][isotope][key] = hdf[layer][isotope][key][:]
-                    
-    return data_dict
+
+    def __init__(self, h5_file_path):
+        self.file = h5py.File(h5_file_path, "r")
+        self.data, self.meta = {}, {}
+        for layer in self.file.keys():
+            self.data[layer], self.meta[layer] = {}, {}
+            for isotope in self.file[layer].keys():
+                group = self.file[layer][isotope]
+                self.data[layer][isotope] = {key: dataset_view(group[key]) for key in group.keys()}
+                self.meta[layer][isotope] = {"n_files": count_files(group), "attrs": dict(group.attrs)}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.file.close()
+
+
+def load_h5_file(h5_file_path):
+    """Open an HDF5 (.h5) file as an H5Data, to close once its datasets are read."""
+    return H5Data(h5_file_path)
@@ -0,0 +1,94 @@
+import numpy as np
+
+
+def make_edges(binning, bins, xLow, xHigh, min_low=None):
+    """
+    Bin edges for a binning given as "linear", "log" or an array of edges.
+
+    A log binning cannot start at 0: if xLow <= 0 it starts at min_low
+    (e.g. the width of the base bins) instead.
+    """
+    if isinstance(binning, str):
+        if binning == "linear":
+            return np.linspace(xLow, xHigh, bins + 1)
+        if binning == "log":
+            low = xLow if xLow > 0 else min_low
+            if low is None or low <= 0:
+                raise ValueError("A log binning needs a strictly positive lower edge.")
+            return np.geomspace(low, xHigh, bins + 1)
+        raise ValueError(f"Unknown binning: {binning}")
+
+    edges = np.asarray(binning, dtype=np.float64)
+    if edges.ndim != 1 or len(edges) < 2 or np.any(np.diff(edges) <= 0):
+        raise ValueError("Bin edges must be a 1D increasing array with at least 2 values.")
+    return edges
+
+
+class StreamHist:
+    """
+    Running histogram with fixed binning, filled chunk by chunk.
+
+    Memory stays bounded by the number of bins whatever the number of values
+    filled, so it can replace the accumulation of every edep value in a list.
+
+    How to use:
+    >>> h = StreamHist(20, 0, 5000)
+    >>> h.fill(edep_file_1)
+    >>> h.fill(edep_file_2)
+    >>> centers, counts, edges = h.centers, h.counts, h.edges
+    """
+
+    def __init__(self, bins, xLow, xHigh):
+        self.bins = bins
+        self.xLow = xLow
+        self.xHigh = xHigh
+        self.edges = np.linspace(xLow, xHigh, bins + 1)
+        self.counts = np.zeros(bins, dtype=np.int64)  # number of entries per bin
+        self.sumw = np.zeros(bins, dtype=np.float64)  # sum of weights per bin
+        self.entries = 0                              # number of values filled (in or out of range)
+
+    @property
+    def centers(self):
+        return (self.edges[:-1] + self.edges[1:]) / 2.0
+
+    def fill(self, X, weights=None):
+        """Bin a chunk of values and add it to the running arrays."""
+        X = np.asarray(X)
+        if X.size == 0:
+            return
+        counts, _ = np.histogram(X, self.bins, [self.xLow, self.xHigh])
+        if weights is None:
+            sumw = counts
+        else:
+            sumw, _ = np.histogram(X, self.bins, [self.xLow, self.xHigh], weights=weights)
+        self.counts += counts
+        self.sumw += sumw
+        self.entries += X.size
+
+    def merge(self, other):
+        """Add the content of another StreamHist with the same binning."""
+        if not np.array_equal(self.edges, other.edges):
+            raise ValueError("Cannot merge histograms with different binning.")
+        self.counts += other.counts
+        self.sumw += other.sumw
+        self.entries += other.entries
+        return self
+
+    def rebin(self, edges):
+        """
+        Sum the bins into the bins defined by edges, without rereading any data.
+
+        Each bin is split between the new bins it overlaps, in proportion to the
+        overlap (values taken as uniform within a bin), so new bins finer than
+        these ones (log binning at low energy) get their share instead of
+        alternating between empty and doubled bins. The result is exact when the
+        new edges fall on edges of this histogram. Parts of bins outside the new
+        edges are dropped. Returns (counts, sumw), counts as floats.
+        """
+        edges = np.asarray(edges, dtype=np.float64)
+        # cumulative content at the new edges, linear within each bin
+        def split(values):
+            cum = np.concatenate([[0.0], np.cumsum(values, dtype=np.float64)])
+            return np.diff(np.interp(edges, self.edges, cum))
+
+        return split(self.counts), split(self.sumw)
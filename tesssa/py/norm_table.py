@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+
+KEYS = ["component", "layer", "isotope"]
+COLUMNS = ["exposure", "count", "rate", "rate_err"]
+
+
+def build_norm_table(materials, rock, geo="octa"):
+    """
+    Compile materials_data_2.csv and rock_data.csv into one table indexed by
+    (component, layer, isotope), with the columns:
+
+    - exposure : mass of the geometry geo (Mass_<geo>, internals) or surface in cm2 (rock, concrete)
+    - count    : number of primaries of one file
+    - rate     : activity in Bq/kg (internals) or flux (rock, concrete)
+    - rate_err : sigma of the rate
+
+    Only the first row of a duplicated key is kept, so lookups afterwards are
+    plain index accesses.
+
+    How to use:
+    >>> table = build_norm_table(materials, rock, "cube")
+    >>> table.loc[("internals", "Cu", "K40")]
+    """
+    internals = pd.DataFrame({
+        "component": "internals",
+        "layer": materials["Material"],
+        "isotope": materials["Isotope"],
+        "exposure": pd.to_numeric(materials["Mass_" + str(geo)], errors="coerce"),
+        "count": pd.to_numeric(materials["Count"], errors="coerce"),
+        "rate": pd.to_numeric(materials["Activity"], errors="coerce"),
+        "rate_err": pd.to_numeric(materials["Sigma"], errors="coerce"),
+    })
+    outer = pd.DataFrame({
+        "component": rock["Material"].str.lower(),
+        "layer": rock["Particule"],
+        "isotope": rock["Isotope"],
+        "exposure": pd.to_numeric(rock["Surface"], errors="coerce"),
+        "count": pd.to_numeric(rock["Count"], errors="coerce"),
+        "rate": pd.to_numeric(rock["Flux"], errors="coerce"),
+        "rate_err": pd.to_numeric(rock["Sigma"], errors="coerce"),
+    })
+
+    table = pd.concat([internals, outer], ignore_index=True)
+    return table[~table.duplicated(KEYS)].set_index(KEYS)[COLUMNS]
+
+
+def layer_isotopes(table, component):
+    """Return {layer: [isotopes]} of a component, in the order of the CSV files."""
+    sub = table.loc[component].index
+    return {layer: sub[sub.get_level_values("layer") == layer].get_level_values("isotope").tolist()
+            for layer in sub.get_level_values("layer").unique()}
+
+
+def unit_factors(exposure, primaries, Bin, SecPerDay, detMass):
+    """
+    Normalization of the raw histograms of N (layer, isotope) for a unit
+    activity (or flux), shape (N, bins):
+
+        factor = exposure * SecPerDay / primaries * Bin / detMass
+
+    exposure and primaries (count per file times number of files) have one
+    value per (layer, isotope), Bin is the per-bin 1/width.
+    """
+    return (np.asarray(exposure, dtype=np.float64) * SecPerDay *
+            (1.0 / np.asarray(primaries, dtype=np.float64)))[:, None] * np.asarray(Bin)[None, :] * (1.0 / detMass)
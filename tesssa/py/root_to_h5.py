@@ -1,6 +1,7 @@
 import uproot as ROOT
 from importlib_resources import files
 import os
+import re
 import pandas as pd
 import h5py
 import glob
@@ -8,95 +9,204 @@ from tqdm import tqdm
 import numpy as np
 import warnings
 import tesssa.utils
+from tesssa.schema import BranchSchema
+from tesssa.dataset_index import parse_file_name
 warnings.simplefilter("ignore")
 
-h5_output = files('sim_data_example')
+# Types stored in the .h5 file (edep in keV fits a float32, IDs an int32). Other
+# branches ("file") keep their source type; string branches are stored as int32
+# codes, with the names in the "<branch>_names" attribute of the group.
+H5_DTYPES = {
+    "ID":           np.int32,
+    "eventID":      np.int32,
+    "clusterIndex": np.int32,
+    "timeStamp":    np.float64,
+    "edep":         np.float32,
+}
+CHUNK_ROWS = 1 << 16
+
+
+def read_beamon(root_file):
+    """Return the beamOn of the runMacro of an opened ROOT file, or None if it has none."""
+    try:
+        obj = root_file["runMacro"]
+    except Exception:
+        return None
+    if isinstance(obj, str):
+        lines = obj.splitlines()
+    else:
+        lines = [item.decode("utf-8", errors="ignore") if isinstance(item, bytes) else str(item)
+                 for item in obj.member("fLines")]
+    for line in lines:
+        m = re.match(r"\s*/run/beamOn\s+(\d+)", line)
+        if m:
+            return int(m.group(1))
+    return None
+
 
 class RootToH5PY:
-    
-    def __init__(self , output_file, shield, input_file = None):
+    """
+    Convert the *_proc.root files of a folder into one .h5 file with a
+    <layer>/<isotope> group per dataset.
+
+    Files are read in chunks and appended to resizable, chunked and gzip
+    compressed datasets (types of H5_DTYPES), so the memory used does not grow
+    with the dataset. Each group records in its attributes:
+        n_files      : number of source files converted
+        beamOn       : beamOn summed over these files (files without runMacro count 0)
+        entries      : rows of the datasets written by complete files
+        source_files : names of the converted files
+    With resume=True an existing output is completed: converted files are
+    skipped and the rows of a file interrupted halfway are dropped. An output
+    that cannot be completed (fixed-size datasets of older versions) is
+    rewritten from scratch.
+
+    How to use:
+    >>> RootToH5PY("internals.h5", "internals", input_file="path/to/proc")
+    """
+
+    def __init__(self , output_file, shield, input_file = None, resume=True, step_size="100 MB"):
         self.output_file = output_file
         self.shield = shield
+        self.resume = resume
+        self.step_size = step_size
         self.root_keys = ["file", "ID", "eventID", "clusterIndex", "timeStamp", "edep"]
+        self.schema = BranchSchema(self.root_keys)
         self.__message__(True)
         if input_file is None:
             self.get_output()
-        else: 
+        else:
             self.iin = input_file
             self.out = self.output_file
         self.get_files_h5()
         self.write_h5_file()
-                
+        self.__message__(False)
+
     def __message__(self, top):
         if top == True:
             print("Processing in progress! Be patient... :)")
         if top == False:
             print("Processing completed! :)")
-    
+
     def get_output(self):
-        self.folder_path = h5_output.joinpath(self.shield)   
+        # example data shipped as the sim_data_example package, only needed without input_file
+        self.folder_path = files('sim_data_example').joinpath(self.shield)
         self.iin = os.path.join(self.folder_path,"raw")
         self.out = os.path.join(self.folder_path, self.output_file)
 
-    def get_root_data(self, file_path):
-        try:
-            self.root_file = ROOT.open(file_path)
-            self.tree = self.root_file["events"] 
-            if not self.tree:
-                print(f"Warning: No tree found in {file_path}")
-                return [] 
-            
-            Params = self.tree.keys()
-            data = {
-                key: np.array(self.tree.arrays(Params[i])[Params[i]]).tolist()
-                for i, key in enumerate(self.root_keys)
-            }
-        except Exception as e:
-            print(f"Error reading {file_path}: {e}")
-        return data
-   
+    def get_root_data(self, root_file):
+        """Yield the branches of one opened file chunk by chunk, cast to the stored types."""
+        if self.schema.tree_name not in root_file:
+            return
+        branches = self.schema.branches
+        for arrays in root_file[self.schema.tree_name].iterate(list(branches.values()), library="np",
+                                                               step_size=self.step_size):
+            yield {key: np.asarray(arrays[branches[key]], dtype=H5_DTYPES.get(key, arrays[branches[key]].dtype))
+                   for key in self.root_keys}
+
+    def encode(self, group, key, values):
+        """int32 codes of string values, the names kept in the "<key>_names" attribute of the group."""
+        names = group.attrs.get(f"{key}_names", np.array([], dtype=object)).astype(str).tolist()
+        index = {name: code for code, name in enumerate(names)}
+        uniq, inverse = np.unique(values.astype(str), return_inverse=True)
+        codes = np.array([index.setdefault(v, len(index)) for v in uniq], dtype=np.int32)
+        group.attrs[f"{key}_names"] = np.array(list(index), dtype=h5py.string_dtype())
+        return codes[inverse.ravel()]
+
+    def dataset(self, group, key, dtype):
+        """Dataset of a branch in a group, created empty with the type of its first chunk."""
+        if key not in group:
+            group.create_dataset(key, shape=(0,), maxshape=(None,), dtype=dtype,
+                                 chunks=(CHUNK_ROWS,), compression="gzip", compression_opts=4, shuffle=True)
+        return group[key]
+
     def get_files_h5(self):
-        file_list = glob.glob(os.path.join(self.iin, "*_proc.root"))
-        self.grouped_data = {}
-
-        try:    
-            for file_path in tqdm(file_list):
-                file_name = os.path.basename(file_path)
-        
-                if self.shield == "internals":
-                    layer, isotope, _, _ = file_name.replace("._proc.root", "").split("_")
-                elif self.shield in ("rock", "concrete"):
-                    _, layer, isotope, _ = file_name.replace("_proc.root", "").split("_")
-
-                extracted_data = self.get_root_data(file_path)
-
-                # Initialize the nested dictionary
-                if layer not in self.grouped_data:
-                    self.grouped_data[layer] = {}
-                if isotope not in self.grouped_data[layer]:
-                    self.grouped_data[layer][isotope] = {}
-
-                for key, value in extracted_data.items():
-                    if key not in self.grouped_data[layer][isotope]:
-                        self.grouped_data[layer][isotope][key] = []
-                    
-                    self.grouped_data[layer][isotope][key].extend(value)
-            
-        except Exception as e:
-            print(f"Error processing files: {e}")
-        
-    def write_h5_file(self):
-        # Open or create an HDF5 file
-        with h5py.File(self.out, "w") as f:
-            for layer, isotopes in self.grouped_data.items():
-                layer_group = f.create_group(layer)
-                    
-                for isotope, data in isotopes.items():
-                    isotope_group = layer_group.create_group(isotope)
-                        
-                    for key, values in data.items():
-                        isotope_group.create_dataset(key, data=values)
-        
+        """Group the files of the input folder by (layer, isotope)."""
+        file_list = sorted(glob.glob(os.path.join(self.iin, "*_proc.root")))
+        self.grouped_files = {}
+        # branch names are resolved and checked once, before reading any data
+        self.schema.resolve(file_list)
+
+        for file_path in file_list:
+            fields = parse_file_name(os.path.basename(file_path))
+            if fields is None or fields["component"] != self.shield:
+                print(f"Skipping {file_path}: not a {self.shield} file")
+                continue
+            self.grouped_files.setdefault(fields["layer"], {}).setdefault(fields["isotope"], []).append(file_path)
+
+    def get_group(self, f, layer, isotope):
+        """Return the group of a (layer, isotope), created if needed (datasets are created by append_file)."""
+        group = f.require_group(f"{layer}/{isotope}")
+        for attr, default in (("n_files", 0), ("beamOn", 0), ("entries", 0)):
+            group.attrs.setdefault(attr, default)
+        group.attrs.setdefault("source_files", np.array([], dtype=h5py.string_dtype()))
+        # rows left by a file interrupted halfway
+        self.truncate(group)
+        return group
 
+    def truncate(self, group):
+        """Drop the rows after the entries of complete files."""
+        for key in self.root_keys:
+            if key in group:
+                group[key].resize((int(group.attrs["entries"]),))
 
+    def append_file(self, group, file_path):
+        """Append the rows of one file to a group, then record it in the attributes."""
+        n = int(group.attrs["entries"])
+        if self.schema.branches is None:
+            self.schema.resolve(file_path)
+        # the tree and the runMacro are read from a single open of the file
+        with ROOT.open(file_path) as root_file:
+            for chunk in self.get_root_data(root_file):
+                size = len(chunk["edep"])
+                for key, values in chunk.items():
+                    if values.dtype.kind in "OUS":
+                        values = self.encode(group, key, values)
+                    ds = self.dataset(group, key, values.dtype)
+                    ds.resize((n + size,))
+                    ds[n:] = values
+                n += size
+            beamon = read_beamon(root_file)
 
+        group.attrs["entries"] = n
+        group.attrs["n_files"] = int(group.attrs["n_files"]) + 1
+        group.attrs["beamOn"] = int(group.attrs["beamOn"]) + (beamon or 0)
+        group.attrs["source_files"] = np.append(group.attrs["source_files"].astype(object),
+                                                os.path.basename(file_path)).astype(h5py.string_dtype())
+        group.file.flush()
+
+    def can_resume(self):
+        """
+        Whether the output can be completed: missing, or written by this class
+        (resizable datasets in groups recording their complete files).
+        """
+        if not os.path.exists(self.out):
+            return True
+        datasets = []
+        try:
+            with h5py.File(self.out, "r") as f:
+                f.visititems(lambda name, obj: datasets.append(obj) if isinstance(obj, h5py.Dataset) else None)
+                return all(ds.chunks is not None and ds.maxshape[0] is None and "entries" in ds.parent.attrs
+                           for ds in datasets)
+        except OSError:
+            return False
+
+    def write_h5_file(self):
+        # Open the HDF5 file to complete, or create it
+        resume = self.resume and self.can_resume()
+        if self.resume and not resume:
+            print(f"{self.out} cannot be completed (fixed-size datasets): it is written again from scratch")
+        with h5py.File(self.out, "a" if resume else "w") as f:
+            for layer, isotopes in self.grouped_files.items():
+                for isotope, file_paths in isotopes.items():
+                    group = self.get_group(f, layer, isotope)
+                    done = set(group.attrs["source_files"].astype(str))
+                    for file_path in tqdm(file_paths, desc=f"{layer} {isotope}", unit="file"):
+                        if os.path.basename(file_path) in done:
+                            continue
+                        try:
+                            self.append_file(group, file_path)
+                        except Exception as e:
+                            # drop the rows already appended, the file is retried on the next run
+                            print(f"Error processing {file_path}: {e}")
+                            self.truncate(group)
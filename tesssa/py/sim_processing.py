@@ -1,24 +1,47 @@
-import uproot
 import numpy as np
 import matplotlib.pyplot as plt 
 import matplotlib.cm as cm
-import os
-import glob
-import pandas as pd
 from tqdm import tqdm
 import warnings
+from functools import partial
 from tesssa.utils import get_cached_data
 from tesssa import get_h5_files as ghd
+from tesssa.histogram import StreamHist, make_edges
+from tesssa.parallel import pool_map
+from tesssa.schema import BranchSchema
+from tesssa.dataset_index import DatasetIndex
+from tesssa.spectrum import SpectrumTensor
+from tesssa.norm_table import build_norm_table, layer_isotopes, unit_factors
 
 warnings.simplefilter("ignore")
 
 materials = get_cached_data("materials_data_2.csv")
 rock      = get_cached_data("rock_data.csv")
 
+
+def read_edep(file_path, schema=None):
+    """Return the edep array of the events tree of a processed file (empty if unreadable)."""
+    schema = schema or BranchSchema(["edep"])
+    arrays = schema.read(file_path)
+    if arrays is None:
+        return []
+    return arrays["edep"]
+
+
+def hist_file(file_path, bins, xLow, xHigh, schema=None):
+    """Histogram the edep of one file, run by the workers of load_raw_data."""
+    h = StreamHist(bins, xLow, xHigh)
+    h.fill(read_edep(file_path, schema))
+    return h
+
+
 class g4_sim_proc:
 
-    def __init__(self, compoment, folder_path, plots= True):
+    def __init__(self, compoment, folder_path, plots= True, stream=True, workers=1, stage="proc"):
         self.compoment = compoment
+        self.stage = stage      # read the "proc" ROOT files of folder_path, or the "h5" file it points to (RootToH5PY)
+        self.stream = stream    # bin each file when read instead of keeping every edep value
+        self.workers = workers  # number of processes reading files (None = all cores)
         #self.t = thickness
         #self.geometry = geo         
         self.folder_path = folder_path
@@ -33,20 +56,24 @@ class g4_sim_proc:
         self.xLow = 0
         self.xHigh = 5000
         #self.xHigh = 5000.001
-        self.Bins = 20 
-        self.BinSize = (self.xHigh - self.xLow) / self.Bins
-        self.Bin = float(1.0 / self.BinSize)
+        self.baseBins = 5000    # fine base binning (1 keV) the data is accumulated with
+        self.BaseBinSize = (self.xHigh - self.xLow) / self.baseBins
+        self.set_binning("linear", 20)
         
         # ======== variables ========
         self.data = {}
+        self.schema = None
+        self.hists = {}
         self.data_counts = {}
         self.counts = {}
         self.counts_err = {}
         self.energy = {}
         
         # ======== functions calling ========
-        self.load_raw_data()
-        #self.load_h5py_data()
+        if self.stage == "h5":
+            self.load_h5py_data()
+        else:
+            self.load_raw_data()
          
         self.normalize_data()
         self.get_totals()
@@ -55,147 +82,147 @@ class g4_sim_proc:
             self.get_spectrum_totals()
         self.print_simulation_summary()
     
-    def get_log_bins(self):
-        self.bins = np.geomspace(self.xLow, self.xHigh, self.Bins)  
-        
+    def set_binning(self, binning="linear", bins=None):
+        """
+        Set the binning of the spectra: "linear", "log" (bins between xLow and xHigh)
+        or an array of bin edges in keV. Bin is the per-bin 1/width used in the normalization.
+        """
+        self.Bins = bins or self.Bins
+        # log bins cannot start at xLow = 0, they start at the width of one base bin instead
+        self.edges = make_edges(binning, self.Bins, self.xLow, self.xHigh, min_low=self.BaseBinSize)
+        self.Bins = len(self.edges) - 1
+        self.BinSize = np.diff(self.edges)
+        self.Bin = 1.0 / self.BinSize
+
+    def rebin(self, binning="linear", bins=None):
+        """
+        Recompute the normalized spectra and totals with another binning, without
+        rereading the data: the streamed base histograms are summed into the new bins.
+
+        How to use:
+        >>> s.rebin("log", 50)
+        >>> s.rebin(np.arange(0, 201, 5))   # 5 keV bins on the low-energy region
+        """
+        self.set_binning(binning, bins)
+        self.normalize_data()
+        self.get_totals()
+
     def get_root_tree(self, file_path):
-        try:
-            root_file = uproot.open(file_path)
-            tree = root_file["events"]
-            Params = tree.keys()
-            
-            if not tree:
-                #print(f"Warning: No tree found in {file_path}")
-                return []
-            edep = np.array(tree.arrays(Params[5])[Params[5]])
-            return edep
-        
-        except Exception as e:
-            #print(f"Error reading {file_path}: {e}")
-            return []
+        return read_edep(file_path, self.schema)
     
     def hist_it(self, X):
-        #logbins=np.geomspace(self.xLow, self.xHigh, self.Bins)
-        counts, edges = np.histogram(X, self.Bins,[self.xLow,self.xHigh]) #, bins = logbins)
+        counts, edges = np.histogram(X, self.edges)
         centers = (edges[:-1] + edges[1:]) / 2.0
         return centers, counts, edges
+
+    def get_hist(self, layer, iso):
+        """Return centers, counts and edges for a (layer, isotope), streamed or not."""
+        if self.stream:
+            counts = self.hists[layer][iso].rebin(self.edges)[0]
+            return (self.edges[:-1] + self.edges[1:]) / 2.0, counts, self.edges
+        return self.hist_it(self.data[layer][iso])
     
     def load_raw_data(self):
 
-        def get_layers_and_isotopes(component):
-            if component == "internals":
-                layers = materials["Material"].unique().tolist()
-                get_isotopes = lambda l: materials[materials["Material"] == l]["Isotope"].unique().tolist()
-            else:
-                material_type = "Rock" if component == "rock" else "Concrete"
-                layers = rock[rock["Material"] == material_type]["Particule"].unique().tolist()
-                get_isotopes = lambda l: rock[rock["Particule"] == l]["Isotope"].unique().tolist()
-            return layers, get_isotopes
-
-        def build_filepath(component, layer, iso, i):
-            if component == "internals":
-                #return f"{self.folder_path}/{layer}_{iso}_{i}_{t}_proc.root"
-                return f"{self.folder_path}/{layer}_{iso}_{i}_proc.root"
-
-            prefix = "Rock" if component == "rock" else "Concrete"
-            #return f"{self.folder_path}/{prefix}_{layer}_{iso}_{i}_{t}_proc.root"
-            return f"{self.folder_path}/{prefix}_{layer}_{iso}_{i}_proc.root"
-
-        layers, get_isotopes = get_layers_and_isotopes(self.compoment)
+        # {layer: [isotopes]} of the component, as normalized by normalize_data
+        layer_isos = layer_isotopes(build_norm_table(materials, rock), self.compoment)
+        layers = list(layer_isos)
         if self.compoment != "internals":
             self.particule = layers
 
-        total_files = sum(len(glob.glob(f"{self.folder_path}/{layer}*.root")) for layer in layers)
-
-        with tqdm(total=total_files, desc="Processing Files", unit="file") as pbar:
-            for layer in layers:
-                isotopes = get_isotopes(layer)
-                self.data[layer] = {iso: [] for iso in isotopes}
-                self.data_counts[layer] = {iso: 0 for iso in isotopes}
-                for iso in isotopes:
-                    for i in range(300):
-                        #file_path = build_filepath(self.compoment, layer, iso, i, self.t)
-                        file_path = build_filepath(self.compoment, layer, iso, i)
-
-                        if not os.path.exists(file_path):
-                            continue
-                        data = self.get_root_tree(file_path)
-                        if data is not None and len(data) > 0:
-                            self.data[layer][iso].extend(data)
-                            self.data_counts[layer][iso] += 1
-                        pbar.update(1)
+        # one scan of the folder instead of probing every possible task id
+        self.index = DatasetIndex(self.folder_path)
+
+        jobs = []
+        for layer in layers:
+            isotopes = layer_isos[layer]
+            self.data[layer] = {iso: [] for iso in isotopes}
+            self.hists[layer] = {iso: StreamHist(self.baseBins, self.xLow, self.xHigh) for iso in isotopes}
+            self.data_counts[layer] = {}
+            for iso in isotopes:
+                files = self.index.select(self.compoment, layer, iso, stage="proc")
+                # every task file counts, with or without hits: each one simulated its beamOn
+                self.data_counts[layer][iso] = len(files)
+                jobs.extend((layer, iso, file_path) for file_path in files["path"])
+
+        file_paths = [file_path for _, _, file_path in jobs]
+        # branch names are resolved and checked once for the whole dataset
+        self.schema = BranchSchema(["edep"]).resolve(file_paths)
+        if self.stream:
+            # partial histograms come back in the order of jobs, so the merge is deterministic
+            results = pool_map(partial(hist_file, bins=self.baseBins, xLow=self.xLow, xHigh=self.xHigh, schema=self.schema),
+                               file_paths, workers=self.workers)
+        else:
+            results = map(self.get_root_tree, file_paths)
+
+        with tqdm(total=len(jobs), desc="Processing Files", unit="file") as pbar:
+            for (layer, iso, _), result in zip(jobs, results):
+                if self.stream:
+                    self.hists[layer][iso].merge(result)
+                elif result is not None:
+                    self.data[layer][iso].extend(result)
+                pbar.update(1)
 
         print("Data loading complete.", self.data_counts)
 
     def load_h5py_data(self):
-        self.h5_file = ghd.load_h5_file(self.folder_path)
-        for layer in self.h5_file.keys():
-            self.data[layer] = {}
-            self.data_counts[layer] = {}
-            for iso in self.h5_file[layer].keys():
-                self.data[layer][iso] = [self.h5_file[layer][iso]['edep']]
-                self.data_counts[layer][iso] = len(self.h5_file[layer][iso]['edep'])
+        # edep is histogrammed block by block from the file (read whole only when not streaming)
+        with ghd.load_h5_file(self.folder_path) as h5:
+            for layer in h5.data:
+                self.data[layer] = {}
+                self.hists[layer] = {}
+                self.data_counts[layer] = {}
+                for iso, datasets in h5.data[layer].items():
+                    if "edep" not in datasets:
+                        continue
+                    edep = datasets["edep"]
+                    if self.stream:
+                        self.hists[layer][iso] = ghd.hist_dataset(edep, self.baseBins, self.xLow, self.xHigh)
+                    else:
+                        self.data[layer][iso] = edep[:, 0] if edep.ndim == 2 else edep[:]
+                    # every source file, with or without hits, as counted by load_raw_data
+                    self.data_counts[layer][iso] = h5.meta[layer][iso]["n_files"]
+
+        print("Data loading complete.", self.data_counts)
                 
         
     def normalize_data(self):
         
         self.shielding = materials["Material"].unique().tolist()
         self.particle = rock["Particule"].unique().tolist()
-        
-        def compute_normalized_counts(X, Y, norm, norm_err):
-            return np.multiply(Y, norm), np.multiply(Y, norm_err), X
-
-        def get_parameters(component, layer, iso):
-            if component == "internals":
-                m = "Mass_octa"
-                df = materials[(materials["Material"] == layer) & (materials["Isotope"] == iso)]
-                return float(df[m]), float(df["Count"]), float(df["Activity"]), float(df["Sigma"])
-            else:
-                mat = "Rock" if component == "rock" else "Concrete"
-                df = rock[(rock["Material"] == mat) & (rock["Particule"] == layer) & (rock["Isotope"] == iso)]
-                return float(df["Surface"]), float(df["Count"]), float(df["Flux"]), float(df["Sigma"])
 
         if self.compoment not in ["internals", "rock", "concrete"]:
             print("Unknown component:", self.compoment)
             return
 
-        layers = self.shielding if self.compoment == "internals" else self.particle
+        # one row per (layer, isotope) of the component, normalized all at once
+        table = build_norm_table(materials, rock)
+        isotopes = layer_isotopes(table, self.compoment)
+        table = table.loc[self.compoment]
+        energy = (self.edges[:-1] + self.edges[1:]) / 2.0
+        # dense (layer, isotope, bin) spectra, self.counts & co. are dict views of it
+        self.spectra = SpectrumTensor(list(isotopes), isotopes, energy)
+
+        n_files = np.array([self.data_counts.get(layer, {}).get(iso, 0) for layer, iso in table.index])
+        # (layer, isotope) without files give inf or NaN factors, skipped below
+        with np.errstate(divide="ignore", invalid="ignore"):
+            factor = unit_factors(table["exposure"], table["count"].to_numpy() * n_files,
+                                  self.Bin, self.SecPerDay, self.detMass)
+            norm = factor * table["rate"].to_numpy()[:, None]
+            norm_err = factor * table["rate_err"].to_numpy()[:, None]
+
+        for k, (layer, iso) in enumerate(table.index):
+            if not n_files[k]:
+                print(f"No data for {layer} {iso}")
+                continue
+            X, Y, self.edges = self.get_hist(layer, iso)
+            self.spectra.set(layer, iso, Y * norm[k], Y * norm_err[k])
 
-        for layer in layers:
-            self.counts[layer], self.counts_err[layer], self.energy[layer] = {}, {}, {}
-            isotopes = (
-                materials[materials["Material"] == layer]["Isotope"].tolist()
-                if self.compoment == "internals"
-                else rock[rock["Particule"] == layer]["Isotope"].tolist()
-            )
-            for iso in isotopes:
-                try:
-                    X, Y, self.edges = self.hist_it(self.data[layer][iso])
-                    p1, p2, p3, p4 = get_parameters(self.compoment, layer, iso)
-
-                    normalization_factor = (
-                        p1 * self.SecPerDay *
-                        (1.0 / (p2 * self.data_counts[layer][iso])) *
-                        self.Bin * (1.0 / self.detMass)
-                    )
-                    norm, norm_err = normalization_factor * p3, normalization_factor * p4
-                    #norm, norm_err = 1.0,1.0
-                    self.counts[layer][iso], self.counts_err[layer][iso], self.energy[layer][iso] = compute_normalized_counts(X, Y, norm, norm_err)
-                
-                except Exception as e:
-                    print(f"No data for {layer} {iso}:", e)
-                    continue
+        self.counts, self.counts_err, self.energy = self.spectra.as_dicts(with_totals=False)
 
     def get_totals(self):
-        self.counts['total'] = 0
-        self.counts_err['total'] = 0
-        for layer in self.counts:
-            if layer == 'total':
-                continue
-            self.counts[layer]['total'] = np.sum([v for k, v in self.counts[layer].items() if k != 'total'], axis=0)
-            self.counts_err[layer]['total'] = np.sqrt(np.sum([v**2 for k, v in self.counts_err[layer].items() if k != 'total'], axis=0))
-            self.counts['total'] += self.counts[layer]['total']
-            self.counts_err['total'] = np.sqrt(self.counts_err['total']**2 + self.counts_err[layer]['total']**2)
+        # per-layer and overall sums over the spectrum tensor, errors in quadrature
+        self.counts, self.counts_err, self.energy = self.spectra.as_dicts()
     
     def get_spectrum(self):
         def plot_individual_spectrum(energy, counts, counts_err, label, color, ax):
@@ -324,11 +351,32 @@ class g4_sim_proc:
         print(f"R = {np.sum(self.counts['total']):.2e} ± {np.sum(self.counts_err['total']):.2e} counts/keV.day.kg")  
 
 class g4_sim_proc_geo:
-
-    def __init__(self, geo, compoment, folder_path, plots= True):
+    """
+    Same as g4_sim_proc, with the masses of the internals taken from the
+    Mass_<geo> column of materials_data_2.csv.
+
+    geo is one geometry ("octa"), a list of geometries (["octa", "cube"]) or
+    "all" for every Mass_* column. The files are read and histogrammed once,
+    then the spectra are normalized for each geometry: counts_geo[geo] and
+    counts_err_geo[geo] hold the results of every geometry, self.counts & co.
+    the ones of the selected geometry (the first one, see select_geometry).
+
+    How to use:
+    >>> sim = g4_sim_proc_geo(["octa", "cube"], "internals", "path/to/proc", plots=False)
+    >>> sim.counts_geo["cube"]["total"]
+    >>> sim.select_geometry("cube").get_spectrum_totals()
+    """
+
+    def __init__(self, geo, compoment, folder_path, plots= True, stream=True, workers=1, stage="proc"):
         self.compoment = compoment
+        self.stage = stage      # read the "proc" ROOT files of folder_path, or the "h5" file it points to (RootToH5PY)
+        self.stream = stream    # bin each file when read instead of keeping every edep value
+        self.workers = workers  # number of processes reading files (None = all cores)
         #self.t = thickness
-        self.geometry = geo         
+        if isinstance(geo, str):
+            geo = [c[len("Mass_"):] for c in materials.columns if c.startswith("Mass_")] if geo == "all" else [geo]
+        self.geometries = list(geo)
+        self.geometry = self.geometries[0]
         self.folder_path = folder_path
         print(f"Processing files in {self.folder_path}")
         #To choose between the rock or the shielding 
@@ -341,169 +389,189 @@ class g4_sim_proc_geo:
         self.xLow = 0
         self.xHigh = 5000
         #self.xHigh = 5000.001
-        self.Bins = 20 
-        self.BinSize = (self.xHigh - self.xLow) / self.Bins
-        self.Bin = float(1.0 / self.BinSize)
+        self.baseBins = 5000    # fine base binning (1 keV) the data is accumulated with
+        self.BaseBinSize = (self.xHigh - self.xLow) / self.baseBins
+        self.set_binning("linear", 20)
         
         # ======== variables ========
         self.data = {}
+        self.schema = None
+        self.hists = {}
         self.data_counts = {}
         self.counts = {}
         self.counts_err = {}
         self.energy = {}
+        self.spectra_geo = {}
+        self.counts_geo = {}
+        self.counts_err_geo = {}
         
         # ======== functions calling ========
-        self.load_raw_data()
-        #self.load_h5py_data()
+        if self.stage == "h5":
+            self.load_h5py_data()
+        else:
+            self.load_raw_data()
          
         self.normalize_data()
         self.get_totals()
         if plots == True : 
-            self.get_spectrum()
-            self.get_spectrum_totals()
+            for geo in self.geometries:
+                self.select_geometry(geo)
+                self.get_spectrum()
+                self.get_spectrum_totals()
+            self.select_geometry(self.geometries[0])
         self.print_simulation_summary()
     
-    def get_log_bins(self):
-        self.bins = np.geomspace(self.xLow, self.xHigh, self.Bins)  
-        
+    def set_binning(self, binning="linear", bins=None):
+        """
+        Set the binning of the spectra: "linear", "log" (bins between xLow and xHigh)
+        or an array of bin edges in keV. Bin is the per-bin 1/width used in the normalization.
+        """
+        self.Bins = bins or self.Bins
+        # log bins cannot start at xLow = 0, they start at the width of one base bin instead
+        self.edges = make_edges(binning, self.Bins, self.xLow, self.xHigh, min_low=self.BaseBinSize)
+        self.Bins = len(self.edges) - 1
+        self.BinSize = np.diff(self.edges)
+        self.Bin = 1.0 / self.BinSize
+
+    def rebin(self, binning="linear", bins=None):
+        """
+        Recompute the normalized spectra and totals with another binning, without
+        rereading the data: the streamed base histograms are summed into the new bins.
+
+        How to use:
+        >>> s.rebin("log", 50)
+        >>> s.rebin(np.arange(0, 201, 5))   # 5 keV bins on the low-energy region
+        """
+        self.set_binning(binning, bins)
+        self.normalize_data()
+        self.get_totals()
+
     def get_root_tree(self, file_path):
-        try:
-            root_file = uproot.open(file_path)
-            tree = root_file["events"]
-            Params = tree.keys()
-            
-            if not tree:
-                #print(f"Warning: No tree found in {file_path}")
-                return []
-            edep = np.array(tree.arrays(Params[5])[Params[5]])
-            return edep
-        
-        except Exception as e:
-            #print(f"Error reading {file_path}: {e}")
-            return []
+        return read_edep(file_path, self.schema)
     
     def hist_it(self, X):
-        #logbins=np.geomspace(self.xLow, self.xHigh, self.Bins)
-        counts, edges = np.histogram(X, self.Bins,[self.xLow,self.xHigh]) #, bins = logbins)
+        counts, edges = np.histogram(X, self.edges)
         centers = (edges[:-1] + edges[1:]) / 2.0
         return centers, counts, edges
+
+    def get_hist(self, layer, iso):
+        """Return centers, counts and edges for a (layer, isotope), streamed or not."""
+        if self.stream:
+            counts = self.hists[layer][iso].rebin(self.edges)[0]
+            return (self.edges[:-1] + self.edges[1:]) / 2.0, counts, self.edges
+        return self.hist_it(self.data[layer][iso])
     
     def load_raw_data(self):
 
-        def get_layers_and_isotopes(component):
-            if component == "internals":
-                layers = materials["Material"].unique().tolist()
-                get_isotopes = lambda l: materials[materials["Material"] == l]["Isotope"].unique().tolist()
-            else:
-                material_type = "Rock" if component == "rock" else "Concrete"
-                layers = rock[rock["Material"] == material_type]["Particule"].unique().tolist()
-                get_isotopes = lambda l: rock[rock["Particule"] == l]["Isotope"].unique().tolist()
-            return layers, get_isotopes
-
-        def build_filepath(component, layer, iso, i):
-            if component == "internals":
-                #return f"{self.folder_path}/{layer}_{iso}_{i}_{t}_proc.root"
-                return f"{self.folder_path}/{layer}_{iso}_{i}_proc.root"
-
-            prefix = "Rock" if component == "rock" else "Concrete"
-            #return f"{self.folder_path}/{prefix}_{layer}_{iso}_{i}_{t}_proc.root"
-            return f"{self.folder_path}/{prefix}_{layer}_{iso}_{i}_proc.root"
-
-        layers, get_isotopes = get_layers_and_isotopes(self.compoment)
+        # {layer: [isotopes]} of the component, as normalized by normalize_data
+        layer_isos = layer_isotopes(build_norm_table(materials, rock, self.geometries[0]), self.compoment)
+        layers = list(layer_isos)
         if self.compoment != "internals":
             self.particule = layers
 
-        total_files = sum(len(glob.glob(f"{self.folder_path}/{layer}*.root")) for layer in layers)
-
-        with tqdm(total=total_files, desc="Processing Files", unit="file") as pbar:
-            for layer in layers:
-                isotopes = get_isotopes(layer)
-                self.data[layer] = {iso: [] for iso in isotopes}
-                self.data_counts[layer] = {iso: 0 for iso in isotopes}
-                for iso in isotopes:
-                    for i in range(300):
-                        #file_path = build_filepath(self.compoment, layer, iso, i, self.t)
-                        file_path = build_filepath(self.compoment, layer, iso, i)
-
-                        if not os.path.exists(file_path):
-                            continue
-                        data = self.get_root_tree(file_path)
-                        if data is not None and len(data) > 0:
-                            self.data[layer][iso].extend(data)
-                            self.data_counts[layer][iso] += 1
-                        pbar.update(1)
+        # one scan of the folder instead of probing every possible task id
+        self.index = DatasetIndex(self.folder_path)
+
+        jobs = []
+        for layer in layers:
+            isotopes = layer_isos[layer]
+            self.data[layer] = {iso: [] for iso in isotopes}
+            self.hists[layer] = {iso: StreamHist(self.baseBins, self.xLow, self.xHigh) for iso in isotopes}
+            self.data_counts[layer] = {}
+            for iso in isotopes:
+                files = self.index.select(self.compoment, layer, iso, stage="proc")
+                # every task file counts, with or without hits: each one simulated its beamOn
+                self.data_counts[layer][iso] = len(files)
+                jobs.extend((layer, iso, file_path) for file_path in files["path"])
+
+        file_paths = [file_path for _, _, file_path in jobs]
+        # branch names are resolved and checked once for the whole dataset
+        self.schema = BranchSchema(["edep"]).resolve(file_paths)
+        if self.stream:
+            # partial histograms come back in the order of jobs, so the merge is deterministic
+            results = pool_map(partial(hist_file, bins=self.baseBins, xLow=self.xLow, xHigh=self.xHigh, schema=self.schema),
+                               file_paths, workers=self.workers)
+        else:
+            results = map(self.get_root_tree, file_paths)
+
+        with tqdm(total=len(jobs), desc="Processing Files", unit="file") as pbar:
+            for (layer, iso, _), result in zip(jobs, results):
+                if self.stream:
+                    self.hists[layer][iso].merge(result)
+                elif result is not None:
+                    self.data[layer][iso].extend(result)
+                pbar.update(1)
 
         print("Data loading complete.", self.data_counts)
 
     def load_h5py_data(self):
-        self.h5_file = ghd.load_h5_file(self.folder_path)
-        for layer in self.h5_file.keys():
-            self.data[layer] = {}
-            self.data_counts[layer] = {}
-            for iso in self.h5_file[layer].keys():
-                self.data[layer][iso] = [self.h5_file[layer][iso]['edep']]
-                self.data_counts[layer][iso] = len(self.h5_file[layer][iso]['edep'])
+        # edep is histogrammed block by block from the file (read whole only when not streaming)
+        with ghd.load_h5_file(self.folder_path) as h5:
+            for layer in h5.data:
+                self.data[layer] = {}
+                self.hists[layer] = {}
+                self.data_counts[layer] = {}
+                for iso, datasets in h5.data[layer].items():
+                    if "edep" not in datasets:
+                        continue
+                    edep = datasets["edep"]
+                    if self.stream:
+                        self.hists[layer][iso] = ghd.hist_dataset(edep, self.baseBins, self.xLow, self.xHigh)
+                    else:
+                        self.data[layer][iso] = edep[:, 0] if edep.ndim == 2 else edep[:]
+                    # every source file, with or without hits, as counted by load_raw_data
+                    self.data_counts[layer][iso] = h5.meta[layer][iso]["n_files"]
+
+        print("Data loading complete.", self.data_counts)
                 
         
     def normalize_data(self):
         
         self.shielding = materials["Material"].unique().tolist()
         self.particle = rock["Particule"].unique().tolist()
-        
-        def compute_normalized_counts(X, Y, norm, norm_err):
-            return np.multiply(Y, norm), np.multiply(Y, norm_err), X
-
-        def get_parameters(component, layer, iso):
-            if component == "internals":
-                m = "Mass_" + str(self.geometry)
-                df = materials[(materials["Material"] == layer) & (materials["Isotope"] == iso)]
-                return float(df[m]), float(df["Count"]), float(df["Activity"]), float(df["Sigma"])
-            else:
-                mat = "Rock" if component == "rock" else "Concrete"
-                df = rock[(rock["Material"] == mat) & (rock["Particule"] == layer) & (rock["Isotope"] == iso)]
-                return float(df["Surface"]), float(df["Count"]), float(df["Flux"]), float(df["Sigma"])
 
         if self.compoment not in ["internals", "rock", "concrete"]:
             print("Unknown component:", self.compoment)
             return
 
-        layers = self.shielding if self.compoment == "internals" else self.particle
-
-        for layer in layers:
-            self.counts[layer], self.counts_err[layer], self.energy[layer] = {}, {}, {}
-            isotopes = (
-                materials[materials["Material"] == layer]["Isotope"].tolist()
-                if self.compoment == "internals"
-                else rock[rock["Particule"] == layer]["Isotope"].tolist()
-            )
-            for iso in isotopes:
-                try:
-                    X, Y, self.edges = self.hist_it(self.data[layer][iso])
-                    p1, p2, p3, p4 = get_parameters(self.compoment, layer, iso)
-
-                    normalization_factor = (
-                        p1 * self.SecPerDay *
-                        (1.0 / (p2 * self.data_counts[layer][iso])) *
-                        self.Bin * (1.0 / self.detMass)
-                    )
-                    norm, norm_err = normalization_factor * p3, normalization_factor * p4
-                    #norm, norm_err = 1.0,1.0
-                    self.counts[layer][iso], self.counts_err[layer][iso], self.energy[layer][iso] = compute_normalized_counts(X, Y, norm, norm_err)
-                
-                except Exception as e:
-                    print(f"No data for {layer} {iso}:", e)
+        isotopes = layer_isotopes(build_norm_table(materials, rock, self.geometries[0]), self.compoment)
+        energy = (self.edges[:-1] + self.edges[1:]) / 2.0
+        # dense (layer, isotope, bin) spectra per geometry, self.counts & co. are dict views of one of them
+        self.spectra_geo = {geo: SpectrumTensor(list(isotopes), isotopes, energy) for geo in self.geometries}
+
+        for geo in self.geometries:
+            # the histograms are shared, only the masses change with the geometry
+            table = build_norm_table(materials, rock, geo).loc[self.compoment]
+            n_files = np.array([self.data_counts.get(layer, {}).get(iso, 0) for layer, iso in table.index])
+            # (layer, isotope) without files give inf or NaN factors, skipped below
+            with np.errstate(divide="ignore", invalid="ignore"):
+                factor = unit_factors(table["exposure"], table["count"].to_numpy() * n_files,
+                                      self.Bin, self.SecPerDay, self.detMass)
+                norm = factor * table["rate"].to_numpy()[:, None]
+                norm_err = factor * table["rate_err"].to_numpy()[:, None]
+
+            for k, (layer, iso) in enumerate(table.index):
+                if not n_files[k]:
+                    print(f"No data for {layer} {iso}")
                     continue
+                X, Y, self.edges = self.get_hist(layer, iso)
+                self.spectra_geo[geo].set(layer, iso, Y * norm[k], Y * norm_err[k])
+
+        self.spectra = self.spectra_geo[self.geometry]
+        self.counts, self.counts_err, self.energy = self.spectra.as_dicts(with_totals=False)
 
     def get_totals(self):
-        self.counts['total'] = 0
-        self.counts_err['total'] = 0
-        for layer in self.counts:
-            if layer == 'total':
-                continue
-            self.counts[layer]['total'] = np.sum([v for k, v in self.counts[layer].items() if k != 'total'], axis=0)
-            self.counts_err[layer]['total'] = np.sqrt(np.sum([v**2 for k, v in self.counts_err[layer].items() if k != 'total'], axis=0))
-            self.counts['total'] += self.counts[layer]['total']
-            self.counts_err['total'] = np.sqrt(self.counts_err['total']**2 + self.counts_err[layer]['total']**2)
+        # per-layer and overall sums over the spectrum tensors, errors in quadrature
+        for geo, spectra in self.spectra_geo.items():
+            self.counts_geo[geo], self.counts_err_geo[geo], self.energy = spectra.as_dicts()
+        self.select_geometry(self.geometry)
+
+    def select_geometry(self, geo):
+        """Point self.counts, self.counts_err and the plots to the results of one geometry."""
+        self.geometry = geo
+        self.spectra = self.spectra_geo[geo]
+        self.counts, self.counts_err = self.counts_geo[geo], self.counts_err_geo[geo]
+        return self
     
     def get_spectrum(self):
         def plot_individual_spectrum(energy, counts, counts_err, label, color, ax):
@@ -618,18 +686,27 @@ class g4_sim_proc_geo:
             return
         
     def print_simulation_summary(self):
+        # one line per layer, with the geometries side by side
+        def rate(geo, layer=None):
+            counts, counts_err = self.counts_geo[geo], self.counts_err_geo[geo]
+            if layer is not None:
+                counts, counts_err = counts[layer], counts_err[layer]
+            label = f"{geo}: " if len(self.geometries) > 1 else ""
+            return f"{label}R = {np.sum(counts['total']):.2e} ± {np.sum(counts_err['total']):.2e}"
+
+        geometries = ", ".join(geo.capitalize() for geo in self.geometries)
         print("\nSimulation Summary")
         print("===========================================")
-        print(f"Shielding Type: {self.compoment.capitalize()} and Geometry: {self.geometry.capitalize()}\n")
+        print(f"Shielding Type: {self.compoment.capitalize()} and Geometry: {geometries}\n")
         print("Total counts per Layer of Shielding:")
         print("____________________________________\n")
         for layer in self.counts:
             if layer == 'total':
                 continue
-            print(f"{layer}: R = {np.sum(self.counts[layer]['total']):.2e} ± {np.sum(self.counts_err[layer]['total']):.2e} counts/keV.day.kg")
+            print(f"{layer}: " + " | ".join(rate(geo, layer) for geo in self.geometries) + " counts/keV.day.kg")
         print("\nTotal Counts:")
         print("_______________\n")
-        print(f"R = {np.sum(self.counts['total']):.2e} ± {np.sum(self.counts_err['total']):.2e} counts/keV.day.kg")  
+        print(" | ".join(rate(geo) for geo in self.geometries) + " counts/keV.day.kg")  
 
         
               
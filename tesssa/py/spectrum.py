@@ -0,0 +1,73 @@
+import numpy as np
+
+
+class SpectrumTensor:
+    """
+    Normalized spectra of every (layer, isotope) stored in one dense array of
+    shape (layer, isotope, bin), with the matching errors.
+
+    Isotopes are the union over all layers; filled[l, i] tells which (layer,
+    isotope) actually have a spectrum, the others stay at 0. Totals are single
+    reductions over the isotope and layer axes, errors are added in quadrature.
+
+    How to use:
+    >>> st = SpectrumTensor(["Cu", "Pb"], {"Cu": ["K40"], "Pb": ["K40", "Pb210"]}, energy)
+    >>> st.set("Cu", "K40", counts, counts_err)
+    >>> total, total_err = st.totals()
+    >>> st.counts[st.layer_index["Cu"], st.iso_index["K40"]]
+    """
+
+    def __init__(self, layers, layer_isotopes, energy):
+        self.layers = list(layers)
+        self.layer_isotopes = {layer: list(dict.fromkeys(layer_isotopes.get(layer, []))) for layer in self.layers}
+        self.isotopes = list(dict.fromkeys(iso for layer in self.layers for iso in self.layer_isotopes[layer]))
+        self.layer_index = {layer: i for i, layer in enumerate(self.layers)}
+        self.iso_index = {iso: i for i, iso in enumerate(self.isotopes)}
+        self.energy = np.asarray(energy, dtype=np.float64)
+
+        shape = (len(self.layers), len(self.isotopes), len(self.energy))
+        self.counts = np.zeros(shape, dtype=np.float64)
+        self.counts_err = np.zeros(shape, dtype=np.float64)
+        self.filled = np.zeros(shape[:2], dtype=bool)
+
+    def set(self, layer, iso, counts, counts_err=None):
+        """Store the normalized spectrum of one (layer, isotope) (errors left at 0 if not given)."""
+        l, i = self.layer_index[layer], self.iso_index[iso]
+        self.counts[l, i] = counts
+        if counts_err is not None:
+            self.counts_err[l, i] = counts_err
+        self.filled[l, i] = True
+
+    def layer_totals(self):
+        """Sum over isotopes: (counts, counts_err) of shape (layer, bin)."""
+        return self.counts.sum(axis=1), np.sqrt(np.square(self.counts_err).sum(axis=1))
+
+    def totals(self):
+        """Sum over layers and isotopes: (counts, counts_err) of shape (bin,)."""
+        return self.counts.sum(axis=(0, 1)), np.sqrt(np.square(self.counts_err).sum(axis=(0, 1)))
+
+    def as_dicts(self, with_totals=True):
+        """
+        Nested dicts {layer: {iso: spectrum}} of counts, counts_err and energy,
+        as used by the plotting code and the notebooks. The spectra are views of
+        the tensor, nothing is copied. With totals, each layer gets a 'total'
+        entry and the top level a 'total' spectrum.
+        """
+        counts, counts_err, energy = {}, {}, {}
+        for layer in self.layers:
+            l = self.layer_index[layer]
+            counts[layer], counts_err[layer], energy[layer] = {}, {}, {}
+            for iso in self.layer_isotopes[layer]:
+                i = self.iso_index[iso]
+                if self.filled[l, i]:
+                    counts[layer][iso] = self.counts[l, i]
+                    counts_err[layer][iso] = self.counts_err[l, i]
+                    energy[layer][iso] = self.energy
+
+        if with_totals:
+            layer_counts, layer_err = self.layer_totals()
+            for layer, l in self.layer_index.items():
+                counts[layer]['total'] = layer_counts[l]
+                counts_err[layer]['total'] = layer_err[l]
+            counts['total'], counts_err['total'] = self.totals()
+        return counts, counts_err, energy
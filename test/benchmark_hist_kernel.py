@@ -0,0 +1,68 @@
+"""
+Benchmark of the multi-key histogram kernel (tesssapy.hist_kernel) against
+np.histogram called once per key.
+
+How to use:
+>>> python test/benchmark_hist_kernel.py --entries 10000000 --keys 16 --bins 5000
+"""
+import time
+import argparse
+import numpy as np
+from tesssapy.hist_kernel import fill_uniform, fill_numba
+
+
+def timed(func, repeat):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def per_key_histogram(codes, X, weights, nkeys, bins, xLow, xHigh):
+    # what hist_it does: one np.histogram (and one for the weights squared) per key
+    counts = np.zeros((nkeys, bins), dtype=np.int64)
+    sumw, sumw2 = np.zeros((nkeys, bins)), np.zeros((nkeys, bins))
+    for k in range(nkeys):
+        sel = codes == k
+        counts[k] = np.histogram(X[sel], bins, [xLow, xHigh])[0]
+        sumw[k] = np.histogram(X[sel], bins, [xLow, xHigh], weights=weights[sel])[0]
+        sumw2[k] = np.histogram(X[sel], bins, [xLow, xHigh], weights=weights[sel] ** 2)[0]
+    return counts, sumw, sumw2
+
+
+def kernel(codes, X, weights, nkeys, bins, xLow, xHigh, engine):
+    counts = np.zeros((nkeys, bins), dtype=np.int64)
+    sumw, sumw2 = np.zeros((nkeys, bins)), np.zeros((nkeys, bins))
+    fill_uniform(codes, X, weights, np.linspace(xLow, xHigh, bins + 1), counts, sumw, sumw2, engine=engine)
+    return counts, sumw, sumw2
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Multi-key histogram kernel benchmark.")
+    parser.add_argument("--entries", type=int, default=10_000_000)
+    parser.add_argument("--keys", type=int, default=16)
+    parser.add_argument("--bins", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    X = rng.exponential(800.0, args.entries)          # edep-like spectrum in keV
+    codes = rng.integers(0, args.keys, args.entries)  # layer/isotope/volume of each hit
+    weights = rng.uniform(0.5, 1.5, args.entries)
+    binning = (args.keys, args.bins, 0, 5000)
+
+    t_ref, ref = timed(lambda: per_key_histogram(codes, X, weights, *binning), args.repeat)
+    print(f"{args.entries} entries, {args.keys} keys, {args.bins} bins")
+    print(f"  np.histogram per key : {t_ref:8.3f} s")
+
+    engines = ["numpy"] + (["numba"] if fill_numba is not None else [])
+    if fill_numba is not None:
+        kernel(codes[:10], X[:10], weights[:10], *binning, engine="numba")   # compile outside the timing
+    else:
+        print("  numba not installed, only the NumPy kernel is timed")
+    for engine in engines:
+        t, result = timed(lambda: kernel(codes, X, weights, *binning, engine=engine), args.repeat)
+        same = np.array_equal(result[0], ref[0]) and np.allclose(result[1], ref[1]) and np.allclose(result[2], ref[2])
+        print(f"  fill_uniform {engine:<8}: {t:8.3f} s   x{t_ref / t:5.1f}   same result: {same}")
@@ -0,0 +1,59 @@
+"""
+Shared setup of the tests.
+
+The checkout is tested without installing it: pyproject.toml puts the root
+folder and processing/ on the path (tesssapy, and both cached_data folders
+merged), and the legacy copy tesssa/py is registered here as the package
+tesssa. The fixtures write the input files of the tests.
+
+How to use:
+>>> python -m pytest
+"""
+import importlib.util
+import os
+import sys
+import numpy as np
+import pytest
+import uproot
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TESSSA = os.path.join(ROOT, "tesssa", "py")
+
+if "tesssa" not in sys.modules:
+    spec = importlib.util.spec_from_file_location("tesssa", os.path.join(TESSSA, "__init__.py"),
+                                                  submodule_search_locations=[TESSSA])
+    sys.modules["tesssa"] = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(sys.modules["tesssa"])
+
+
+def events_file(path, arrays, tree_name="events", **objects):
+    """
+    Write arrays (branch -> NumPy array) as the tree of a ROOT file, string
+    arrays as string branches, and objects (runMacro="/run/beamOn 1000", ...)
+    as TObjStrings. Empty arrays give a tree without entries.
+    """
+    types = {col: "string" if a.dtype.kind in "US" else a.dtype for col, a in arrays.items()}
+    with uproot.recreate(str(path)) as f:
+        f.mktree(tree_name, types)
+        if any(len(a) for a in arrays.values()):
+            f[tree_name].extend(arrays)
+        for key, text in objects.items():
+            f[key] = text
+    return arrays
+
+
+def stamped_file(path, data, mtime_ns):
+    """Write bytes to path with a given modification time."""
+    with open(path, "wb") as f:
+        f.write(data)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+@pytest.fixture
+def write_events():
+    return events_file
+
+
+@pytest.fixture
+def write_stamped():
+    return stamped_file
@@ -0,0 +1,86 @@
+"""
+The Arrow store keeps the weight branch of biased runs: weighted energies read
+from the store equal the ones read from the filtered ROOT file. The energy
+range and fiducial cuts are pushed down to the store reader.
+
+How to use:
+>>> python -m pytest test/test_arrow_store.py
+"""
+import numpy as np
+import pytest
+
+pytest.importorskip("pyarrow")
+from tesssapy.arrow_store import ArrowSchema, ArrowStore, export_file, read_store_metadata, store_filter
+from tesssapy.dataset_index import DatasetIndex
+from tesssapy.events import EVENT_KEYS
+from tesssapy.fiducial import Box, Cylinder
+from tesssapy.schema import BranchSchema
+from tesssapy.sim_processing import g4_sim_proc, read_energy_weights
+
+
+def filtered_arrays(weighted, edep_scale=500.0):
+    rng = np.random.default_rng(3)
+    event = np.repeat(np.arange(200), 3)
+    arrays = {
+        "eventID": event.astype(np.int32),
+        "clusterIndex": np.tile(np.arange(3, dtype=np.int32), 200),
+        "timeStamp": rng.uniform(0, 1e3, len(event)),
+        "rx": rng.normal(size=len(event)), "ry": rng.normal(size=len(event)), "rz": rng.normal(size=len(event)),
+        "edep": rng.exponential(edep_scale, len(event)),
+    }
+    if weighted:
+        arrays["weight"] = rng.uniform(0.1, 3.0, 200)[event]   # one weight per event
+    return arrays
+
+
+@pytest.fixture
+def write_filtered(write_events):
+    def write(path, weighted, edep_scale=500.0):
+        write_events(path, filtered_arrays(weighted, edep_scale), runMacro="/run/beamOn 5000")
+    return write
+
+
+@pytest.mark.parametrize("level", ["hit", "event"])
+def test_weighted_energies_from_the_store(tmp_path, write_filtered, level):
+    root_path = str(tmp_path / "Cu_K40_0_bon_filtered.root")
+    write_filtered(root_path, weighted=True)
+    store_path = str(tmp_path / "part.arrow")
+    export_file(root_path, store_path)
+
+    columns = EVENT_KEYS[level] + ["weight", "edep"]
+    ref = read_energy_weights(root_path, BranchSchema(columns).resolve(root_path), level, weight="weight")
+    got = read_energy_weights(store_path, ArrowSchema(columns).resolve(store_path), level, weight="weight")
+    assert np.array_equal(ref[0], got[0]) and np.array_equal(ref[1], got[1])
+    assert read_store_metadata(store_path)["beamon"] == 5000
+
+
+def test_unweighted_files_have_no_weight_column(tmp_path, write_filtered):
+    root_path = str(tmp_path / "Cu_K40_0_boff_filtered.root")
+    write_filtered(root_path, weighted=False)
+    store_path = str(tmp_path / "part.arrow")
+    export_file(root_path, store_path)
+    with pytest.raises(KeyError):
+        ArrowSchema(["weight", "edep"]).resolve(store_path)
+
+
+@pytest.mark.parametrize("fiducial", [Box((-1, -1, -1), (1, 1, 1), margin=0.1), Cylinder(1.2, -1, 1)])
+@pytest.mark.parametrize("level", ["hit", "event"])
+def test_cuts_pushed_down_to_the_store(tmp_path, write_filtered, fiducial, level):
+    filtered = tmp_path / "filtered"
+    filtered.mkdir()
+    # a fifth of the hits above xHigh = 5000 keV
+    write_filtered(str(filtered / "Cu_K40_0_boff_filtered.root"), weighted=False, edep_scale=3000.0)
+    store = ArrowStore(str(tmp_path / "store"))
+    store.export(DatasetIndex(str(filtered)).select(stage="filtered"))
+    store_path = store.table["path"].iat[0]
+
+    columns = ["rx", "ry", "rz", "edep"]
+    all_rows = len(ArrowSchema(columns).read(store_path)["edep"])
+    kept_rows = len(ArrowSchema(columns, filter=store_filter([fiducial], level, 0, 5000)).read(store_path)["edep"])
+    assert kept_rows < all_rows
+
+    ref = g4_sim_proc("internals", str(filtered), plots=False, cache=False, level=level, fiducial=fiducial)
+    got = g4_sim_proc("internals", store.root, plots=False, cache=False, level=level, fiducial=fiducial, stage="arrow")
+    assert got.schema.filter is not None
+    assert ref.hists["Cu"]["K40"].counts.sum() > 0
+    assert np.array_equal(got.hists["Cu"]["K40"].counts, ref.hists["Cu"]["K40"].counts)
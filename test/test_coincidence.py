@@ -0,0 +1,41 @@
+"""
+A BiPo214 prompt beta and its delayed alpha are tagged and histogrammed with
+the default energy range, though the alpha lies above xHigh.
+
+How to use:
+>>> python -m pytest test/test_coincidence.py
+"""
+import numpy as np
+from tesssapy.coincidence import CoincidenceAnalysis, DECAY_CHAINS
+
+
+def pair_arrays(n_pairs=50, n_singles=50):
+    # events 0..n_pairs-1: a beta at t = 0 and an alpha 100 us later; the others a single beta
+    rng = np.random.default_rng(3)
+    event = np.concatenate([np.repeat(np.arange(n_pairs), 2), np.arange(n_pairs, n_pairs + n_singles)])
+    t = np.concatenate([np.tile([0.0, 1.0e5], n_pairs), np.zeros(n_singles)])
+    edep = np.concatenate([np.column_stack([rng.uniform(500, 3000, n_pairs), rng.uniform(7200, 7800, n_pairs)]).ravel(),
+                           rng.uniform(500, 3000, n_singles)])
+    return {"eventID": event.astype(np.int32), "timeStamp": t, "edep": edep}
+
+
+def test_delayed_alpha_in_range(tmp_path, write_events):
+    path = str(tmp_path / "SSi_Bi214_0_boff_filtered.root")
+    arrays = write_events(path, pair_arrays())
+    ana = CoincidenceAnalysis(window=1.0e3, chains=["BiPo214"])
+    assert ana.xLow == 0 and ana.xHigh >= DECAY_CHAINS["BiPo214"]["delayed"][1]
+    assert np.isclose((ana.xHigh - ana.xLow) / ana.bins, 1.0)
+
+    hists = ana.run([path])
+    alpha = arrays["edep"] > 5000
+    assert hists["all"].counts.sum() == len(arrays["edep"])
+    assert hists["BiPo214"].counts.sum() == 100
+    assert hists["coincident"].counts.sum() == 100
+    assert hists["anticoincident"].counts.sum() == 50
+    # every alpha is in the chain histogram
+    assert np.array_equal(hists["BiPo214"].counts[7000:8000], np.histogram(arrays["edep"][alpha], bins=1000, range=(7000, 8000))[0])
+
+
+def test_no_chain_keeps_range():
+    ana = CoincidenceAnalysis(bins=100, xLow=0, xHigh=5000)
+    assert (ana.bins, ana.xLow, ana.xHigh) == (100, 0, 5000)
@@ -0,0 +1,67 @@
+"""
+Compacted shards keep the events of every task apart: each task numbers its
+events from 0, so event and cluster spectra must not change with compaction.
+
+How to use:
+>>> python -m pytest test/test_compaction.py
+"""
+import numpy as np
+import pytest
+import uproot
+from tesssapy.compaction import Compactor, read_manifest
+from tesssapy.dataset_index import DatasetIndex
+from tesssapy.events import TASK_KEY
+from tesssapy.sim_processing import read_energy_weights
+
+
+def task_arrays(task, n_events=100):
+    rng = np.random.default_rng(task)
+    event = np.repeat(np.arange(n_events), 4)
+    return {
+        "eventID": event.astype(np.int32),
+        "clusterIndex": np.tile(np.arange(2, dtype=np.int32), 2 * n_events),
+        "timeStamp": rng.uniform(0, 1e3, len(event)),
+        "edep": rng.exponential(500.0, len(event)),
+    }
+
+
+def energies(paths, level):
+    return np.sort(np.concatenate([read_energy_weights(path, level=level)[0] for path in paths]))
+
+
+@pytest.fixture
+def folders(tmp_path, write_events):
+    filtered = tmp_path / "filtered"
+    filtered.mkdir()
+    for task in range(3):
+        write_events(filtered / f"Cu_K40_{task}_boff_filtered.root", task_arrays(task),
+                     runMacro=f"/run/beamOn {1000 + task}")
+    return filtered, tmp_path / "compacted"
+
+
+@pytest.mark.parametrize("level", ["hit", "event", "cluster"])
+def test_spectra_unchanged_by_compaction(folders, level):
+    filtered, compacted = folders
+    files = DatasetIndex(str(filtered)).select(stage="filtered")
+    (shard, kept), = Compactor(str(compacted), "1 GB").run(files)
+    assert kept == 1200
+    ref = energies(files["path"], level)
+    got = energies([shard], level)
+    assert len(got) == len(ref) and np.allclose(got, ref)
+
+
+def test_shards_compacted_again(folders):
+    filtered, compacted = folders
+    files = DatasetIndex(str(filtered)).select(stage="filtered")
+    # one shard per task, then the shards merged into one
+    shards = Compactor(str(compacted / "small"), 1).run(files)
+    (shard, _), = Compactor(str(compacted / "large"), "1 GB").run(
+        DatasetIndex(str(compacted / "small")).select(stage="filtered"))
+    assert len(shards) == 3
+    manifest = read_manifest(shard)
+    assert manifest["task"].tolist() == [0, 1, 2]
+    assert manifest["beamon"].tolist() == [1000, 1001, 1002]
+    assert manifest["entry_start"].tolist() == [0, 400, 800]
+    with uproot.open(shard) as f:
+        assert np.array_equal(np.unique(f["events"][TASK_KEY].array(library="np")), [0, 1, 2])
+    assert np.allclose(energies([shard], "event"), energies(files["path"], "event"))
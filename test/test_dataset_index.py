@@ -0,0 +1,38 @@
+"""
+DatasetIndex refresh on files added, removed or overwritten in place, without
+writing anything next to the data.
+
+How to use:
+>>> python -m pytest test/test_dataset_index.py
+"""
+import os
+from tesssapy.dataset_index import DatasetIndex
+
+
+def test_overwritten_file_is_stat_again(tmp_path, write_stamped):
+    path = str(tmp_path / "Cu_K40_0_boff_filtered.root")
+    write_stamped(path, b"x" * 10, 1_000_000_000)
+    index = DatasetIndex(str(tmp_path))
+    assert index.table["size"].tolist() == [10]
+
+    # same folder content, the folder mtime does not change
+    folder_mtime = os.stat(tmp_path).st_mtime_ns
+    write_stamped(path, b"x" * 25, 2_000_000_000)
+    os.utime(tmp_path, ns=(folder_mtime, folder_mtime))
+
+    row = DatasetIndex(str(tmp_path)).select(layer="Cu", isotope="K40").iloc[0]
+    assert row["size"] == 25 and row["mtime"] == 2_000_000_000
+
+
+def test_new_and_removed_files(tmp_path, write_stamped):
+    write_stamped(str(tmp_path / "Cu_K40_0_boff_filtered.root"), b"x", 1_000_000_000)
+    index = DatasetIndex(str(tmp_path))
+    write_stamped(str(tmp_path / "Cu_K40_1_boff_filtered.root"), b"x", 1_000_000_000)
+    os.remove(tmp_path / "Cu_K40_0_boff_filtered.root")
+    assert index.refresh()["task"].tolist() == [1]
+
+
+def test_nothing_written_to_the_data_folder(tmp_path, write_stamped):
+    write_stamped(str(tmp_path / "Cu_K40_0_boff_filtered.root"), b"x", 1_000_000_000)
+    DatasetIndex(str(tmp_path)).refresh()
+    assert os.listdir(tmp_path) == ["Cu_K40_0_boff_filtered.root"]
@@ -0,0 +1,58 @@
+"""
+Hits summed per event or per cluster give the same energies whether the
+hits of an event are read in one chunk or split over several, sorted or not.
+
+How to use:
+>>> python -m pytest test/test_events.py
+"""
+import numpy as np
+import pytest
+from tesssapy.events import EVENT_KEYS, EventAggregator, read_events
+
+
+def hit_arrays(n_events=300):
+    rng = np.random.default_rng(6)
+    n_hits = rng.integers(1, 8, n_events)
+    event = np.repeat(np.arange(n_events), n_hits)
+    return {
+        "eventID": event.astype(np.int32),
+        "clusterIndex": rng.integers(0, 3, len(event)).astype(np.int32),
+        "edep": rng.exponential(100.0, len(event)),
+    }
+
+
+def expected(arrays, by):
+    keys = np.stack([arrays[col] for col in EVENT_KEYS[by]], axis=1)
+    groups, inverse = np.unique(keys, axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    return groups, np.bincount(inverse, weights=arrays["edep"]), np.bincount(inverse)
+
+
+@pytest.mark.parametrize("by", ["event", "cluster"])
+def test_events_split_over_chunks(tmp_path, write_events, by):
+    path = tmp_path / "Cu_K40_0_boff_filtered.root"
+    arrays = write_events(path, hit_arrays())
+    groups, energy, multiplicity = expected(arrays, by)
+    # 100 hits per chunk: most chunks end in the middle of an event
+    events = read_events(str(path), by, step_size=100)
+    assert np.allclose(events["energy"], energy)
+    assert np.array_equal(events["multiplicity"], multiplicity)
+    for k, col in enumerate(EVENT_KEYS[by]):
+        assert np.array_equal(events[col], groups[:, k])
+
+
+def test_unsorted_hits():
+    arrays = hit_arrays()
+    order = np.random.default_rng(7).permutation(len(arrays["edep"]))
+    agg = EventAggregator("event")
+    for rows in np.array_split(order, 4):
+        agg.fill({col: a[rows] for col, a in arrays.items()})
+    events = agg.result()
+    _, energy, multiplicity = expected(arrays, "event")
+    assert np.allclose(events["energy"], energy)
+    assert np.array_equal(events["multiplicity"], multiplicity)
+
+
+def test_hit_level_is_not_an_aggregation():
+    with pytest.raises(ValueError):
+        EventAggregator("hit")
@@ -0,0 +1,39 @@
+"""
+Fiducial cuts keep the hits at least margin inside the volume, and the spatial
+stage gives the spectrum of the kept hits with the occupancy of all of them.
+
+How to use:
+>>> python -m pytest test/test_fiducial.py
+"""
+import numpy as np
+from tesssapy.fiducial import Box, Cylinder, SpatialStage
+
+
+def positions(x, y, z):
+    return {"rx": np.asarray(x, float), "ry": np.asarray(y, float), "rz": np.asarray(z, float)}
+
+
+def test_box_margin():
+    cut = Box((-50, -50, -50), (50, 50, 50), margin=5)
+    arrays = positions([0, 44, 46, 0, 60], [0, 0, 0, -45, 0], [0, 0, 0, 0, 0])
+    assert cut.mask(arrays).tolist() == [True, True, False, True, False]
+
+
+def test_cylinder_margin():
+    cut = Cylinder(40, -60, 60, center=(10, 0), margin=5)
+    arrays = positions([10, 44, 46, 10, 10], [0, 0, 0, 34, 0], [0, 0, 0, 0, 56])
+    assert cut.mask(arrays).tolist() == [True, True, False, True, False]
+
+
+def test_spatial_stage(tmp_path, write_events):
+    rng = np.random.default_rng(9)
+    n = 5000
+    arrays = {**positions(*rng.uniform(-100, 100, (3, n))), "edep": rng.uniform(0, 5000, n)}
+    paths = [str(tmp_path / f"Cu_K40_{task}_boff_filtered.root") for task in range(2)]
+    for path, rows in zip(paths, np.array_split(np.arange(n), 2)):
+        write_events(path, {col: a[rows] for col, a in arrays.items()})
+    cut = Cylinder(60, -50, 50, margin=5)
+    h, occ = SpatialStage(cut, (10, 10, 10), ((-100, 100),) * 3, bins=50).run(paths)
+    keep = cut.mask(arrays)
+    assert np.array_equal(h.counts, np.histogram(arrays["edep"][keep], bins=50, range=(0, 5000))[0])
+    assert occ.counts.sum() == n and np.isclose(occ.sumw.sum(), arrays["edep"].sum())
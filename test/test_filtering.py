@@ -0,0 +1,69 @@
+"""
+The uproot filtering keeps every branch of the selected hits, the volume
+branch included, with string branches written as int32 codes and their names.
+Histogramming the raw files with the selection in memory (stage="raw") gives
+the spectra of the filtered files.
+
+How to use:
+>>> python -m pytest test/test_filtering.py
+"""
+import numpy as np
+import uproot
+from tesssapy.filtering import VDFilter
+from tesssapy.get_norm_param import read_macro_lines
+from tesssapy.sim_processing import g4_sim_proc
+
+VOLUMES = np.array(["virtualDetector", "ShieldA", "ShieldB"])
+
+
+def raw_arrays(n_hits=3000):
+    rng = np.random.default_rng(2)
+    return {
+        "eventID": np.repeat(np.arange(n_hits // 3), 3).astype(np.int32),
+        "edep": rng.exponential(500.0, n_hits),
+        "volume": VOLUMES[rng.integers(0, len(VOLUMES), n_hits)],
+    }
+
+
+def decoded(f, branch):
+    names = np.array(str(f[f"{branch}_names"]).split("\n"))
+    return names[f["events"][branch].array(library="np")]
+
+
+def test_volume_branch_kept(tmp_path, write_events):
+    raw = str(tmp_path / "Cu_K40_0.root")
+    arrays = write_events(raw, raw_arrays(), runMacro="/run/beamOn 1000")
+    keep = arrays["volume"] == "virtualDetector"
+    (path, kept), = VDFilter(str(tmp_path / "filtered")).filter_file(raw).values()
+    assert kept == keep.sum()
+    with uproot.open(path) as f:
+        assert sorted(f["events"].keys()) == ["edep", "eventID", "volume"]
+        assert f["events"]["volume"].array(library="np").dtype == np.int32
+        assert np.all(decoded(f, "volume") == "virtualDetector")
+        assert np.array_equal(f["events"]["edep"].array(library="np"), arrays["edep"][keep])
+        assert read_macro_lines(f, "runMacro") == ["/run/beamOn 1000"]
+
+
+def test_split_by_volume(tmp_path, write_events):
+    raw = str(tmp_path / "Cu_K40_0.root")
+    arrays = write_events(raw, raw_arrays(), runMacro="/run/beamOn 1000")
+    outputs = VDFilter(str(tmp_path / "filtered"), volume="all").filter_file(raw)
+    assert sorted(outputs) == sorted(VOLUMES)
+    for volume, (path, kept) in outputs.items():
+        assert kept == (arrays["volume"] == volume).sum()
+        with uproot.open(path) as f:
+            assert np.all(decoded(f, "volume") == volume)
+
+
+def test_raw_stage_matches_filtered_files(tmp_path, write_events):
+    raw, filtered = tmp_path / "raw", tmp_path / "filtered"
+    raw.mkdir()
+    paths = [str(raw / f"SSi_Co60_{task}_boff.root") for task in range(2)]
+    for path in paths:
+        write_events(path, raw_arrays(), runMacro="/run/beamOn 100000", geometryTable="SSiTarget 10.0 SSi")
+    VDFilter(str(filtered)).run(paths)
+    ref = g4_sim_proc("internals", str(filtered), plots=False, cache=False)
+    got = g4_sim_proc("internals", str(raw), plots=False, cache=False, stage="raw")
+    assert ref.counts["total"].sum() > 0
+    assert np.allclose(got.counts["total"], ref.counts["total"])
+    assert np.allclose(got.counts_err["total"], ref.counts_err["total"])
@@ -0,0 +1,26 @@
+"""
+g4_sim_proc_geo normalizes one load of the data for several geometries: each
+geometry gives the spectra of a run on that geometry alone, scaled by its
+masses.
+
+How to use:
+>>> python -m pytest test/test_geometries.py
+"""
+import numpy as np
+from tesssa.sim_processing import g4_sim_proc_geo, materials
+
+
+def test_one_load_for_several_geometries(tmp_path, write_events):
+    rng = np.random.default_rng(11)
+    for task in range(2):
+        write_events(tmp_path / f"Pb_U238_{task}_proc.root", {"edep": rng.exponential(800.0, 3000)})
+    both = g4_sim_proc_geo(["octa", "cube"], "internals", str(tmp_path), plots=False)
+    for geo in ["octa", "cube"]:
+        alone = g4_sim_proc_geo(geo, "internals", str(tmp_path), plots=False)
+        assert np.allclose(both.counts_geo[geo]["total"], alone.counts["total"])
+
+    row = materials[(materials["Material"] == "Pb") & (materials["Isotope"] == "U238")].iloc[0]
+    ratio = both.counts_geo["cube"]["Pb"]["U238"] / both.counts_geo["octa"]["Pb"]["U238"]
+    assert both.counts["total"].sum() > 0
+    assert np.allclose(ratio[np.isfinite(ratio)], row["Mass_cube"] / row["Mass_octa"])
+    assert both.select_geometry("cube").counts is both.counts_geo["cube"]
@@ -0,0 +1,74 @@
+"""
+g4_sim_proc(stage="h5") on the HDF5 file RootToH5PY writes gives the spectra
+and the file counts of the *_proc.root files it was made from (files without
+hits included), and load_h5_file closes its file.
+
+How to use:
+>>> python -m pytest test/test_h5_loading.py
+"""
+import h5py
+import numpy as np
+import pytest
+
+from tesssa import get_h5_files as ghd
+from tesssa import root_to_h5 as rth
+from tesssa import sim_processing as tsp
+
+
+@pytest.fixture
+def dataset(tmp_path, write_events):
+    """Three SSi Co60 proc files, the last one without hits, and the .h5 file RootToH5PY writes from them."""
+    rng = np.random.default_rng(2)
+    proc = tmp_path / "proc"
+    proc.mkdir()
+    for task, n in enumerate([1000, 1001, 0]):
+        arrays = {
+            "file": np.full(n, task, dtype=np.int32),
+            "ID": np.arange(n, dtype=np.int32),
+            "eventID": np.arange(n, dtype=np.int32),
+            "clusterIndex": np.zeros(n, dtype=np.int32),
+            "timeStamp": rng.uniform(0, 1e3, n),
+            "edep": rng.uniform(0, 5000, n),
+        }
+        write_events(proc / f"SSi_Co60_{task}_proc.root", arrays, runMacro="/run/beamOn 1000")
+
+    h5_path = str(tmp_path / "internals.h5")
+    rth.RootToH5PY(h5_path, "internals", input_file=str(proc))
+    return str(proc), h5_path
+
+
+def test_h5_stage_matches_root_files(dataset):
+    proc, h5_path = dataset
+    for stream in (True, False):
+        ref = tsp.g4_sim_proc("internals", proc, plots=False, stream=stream)
+        h5 = tsp.g4_sim_proc("internals", h5_path, plots=False, stream=stream, stage="h5")
+        # the file without hits counts in both: it simulated its beamOn too
+        assert h5.data_counts["SSi"]["Co60"] == ref.data_counts["SSi"]["Co60"] == 3
+        assert np.array_equal(h5.get_hist("SSi", "Co60")[1], ref.get_hist("SSi", "Co60")[1])
+        assert ref.counts["total"].sum() > 0 and np.array_equal(h5.counts["total"], ref.counts["total"])
+
+
+def test_load_h5_file_keeps_metadata_apart(dataset):
+    _, h5_path = dataset
+    with ghd.load_h5_file(h5_path) as h5:
+        # datasets only, the attributes are in meta
+        assert sorted(h5.data["SSi"]["Co60"]) == sorted(["file", "ID", "eventID", "clusterIndex", "timeStamp", "edep"])
+        assert h5.meta["SSi"]["Co60"]["n_files"] == 3
+        assert h5.meta["SSi"]["Co60"]["attrs"]["beamOn"] == 3000
+        total = ghd.hist_dataset(h5.data["SSi"]["Co60"]["edep"], 20, 0, 5000).counts.sum()
+    assert total == 2001
+    assert not h5.file.id.valid
+
+
+def test_fixed_size_output_is_written_again(dataset, tmp_path):
+    proc, h5_path = dataset
+    # output of an older version: contiguous datasets, not resizable
+    old_path = str(tmp_path / "old.h5")
+    with h5py.File(old_path, "w") as f:
+        f.create_dataset("SSi/Co60/edep", data=np.zeros(10))
+    rth.RootToH5PY(old_path, "internals", input_file=proc)
+    # a second run completes nothing and does not duplicate rows
+    rth.RootToH5PY(old_path, "internals", input_file=proc)
+    with h5py.File(old_path, "r") as old, h5py.File(h5_path, "r") as new:
+        assert old["SSi/Co60"].attrs["n_files"] == 3
+        assert np.array_equal(old["SSi/Co60/edep"][:], new["SSi/Co60/edep"][:])
@@ -0,0 +1,76 @@
+"""
+HistCache hits for unchanged files and misses for files overwritten in place;
+entries of removed files and the oldest ones above the cap are dropped.
+
+How to use:
+>>> python -m pytest test/test_hist_cache.py
+"""
+import os
+import numpy as np
+from tesssapy.dataset_index import DatasetIndex
+from tesssapy.hist_cache import HistCache
+from tesssapy.histogram import StreamHist
+
+META = {"beamon": 1000, "masses": {"Cu": 13.0}}
+
+
+def cached_hist(folder, **kw):
+    row = next(DatasetIndex(folder).select(layer="Cu", isotope="K40").itertuples(index=False))
+    with HistCache(folder, {"edep": "edep"}, 10, 0, 100, **kw) as cache:
+        return row, cache.get(row)
+
+
+def test_overwritten_file_misses_the_cache(tmp_path, write_stamped):
+    folder = str(tmp_path)
+    path = os.path.join(folder, "Cu_K40_0_boff_filtered.root")
+    write_stamped(path, b"first run", 1_000_000_000)
+
+    row, cached = cached_hist(folder)
+    assert cached is None
+    h = StreamHist(10, 0, 100)
+    h.fill([1.0, 2.0, 55.0])
+    with HistCache(folder, {"edep": "edep"}, 10, 0, 100) as cache:
+        cache.put(row, h, META)
+
+    _, cached = cached_hist(folder)
+    assert cached is not None and np.array_equal(cached[0].counts, h.counts)
+    assert cached[1] == META
+
+    # task file regenerated in place: the next run reads it again
+    write_stamped(path, b"second run, more hits", 2_000_000_000)
+    _, cached = cached_hist(folder)
+    assert cached is None
+
+    # even from a row with the old size and mtime (index not refreshed)
+    with HistCache(folder, {"edep": "edep"}, 10, 0, 100) as cache:
+        assert cache.get(row) is None
+
+
+def test_config_is_part_of_the_key(tmp_path, write_stamped):
+    folder = str(tmp_path)
+    write_stamped(os.path.join(folder, "Cu_K40_0_boff_filtered.root"), b"data", 1_000_000_000)
+    row, _ = cached_hist(folder)
+    with HistCache(folder, {"edep": "edep"}, 10, 0, 100) as cache:
+        cache.put(row, StreamHist(10, 0, 100), META)
+    assert cached_hist(folder)[1] is not None
+    assert cached_hist(folder, weight="weight")[1] is None
+
+
+def test_removed_files_and_oldest_entries_dropped(tmp_path, write_stamped):
+    folder = str(tmp_path)
+    for task in range(4):
+        write_stamped(os.path.join(folder, f"Cu_K40_{task}_boff_filtered.root"), b"data", 1_000_000_000)
+    rows = list(DatasetIndex(folder).select(stage="filtered").itertuples(index=False))
+    with HistCache(folder, {"edep": "edep"}, 10, 0, 100) as cache:
+        for row in rows:
+            cache.put(row, StreamHist(10, 0, 100), META)
+
+    os.remove(rows[0].path)
+    with HistCache(folder, {"edep": "edep"}, 10, 0, 100, max_entries=2) as cache:
+        # task 0 removed, task 1 the oldest of the 3 left
+        assert cache.prune() == 2
+        assert [cache.get(row) is not None for row in rows[1:]] == [False, True, True]
+
+    with HistCache(folder, {"edep": "edep"}, 10, 0, 100) as cache:
+        cache.clear()
+        assert all(cache.get(row) is None for row in rows)
@@ -0,0 +1,61 @@
+"""
+The multi-key uniform-bin kernel bins like np.histogram (upper edge included,
+values outside dropped), with NumPy, the plain loop and numba alike.
+
+How to use:
+>>> python -m pytest test/test_hist_kernel.py
+"""
+import numpy as np
+import pytest
+from tesssapy.hist_kernel import _fill_loop, fill_uniform, uniform_bins
+from tesssapy.histogram import MultiHist, StreamHist
+
+EDGES = np.linspace(0, 5000, 101)
+
+
+def sample():
+    rng = np.random.default_rng(8)
+    X = np.concatenate([rng.uniform(-100, 5100, 20_000), EDGES])    # every edge, both ends included
+    return rng.integers(0, 3, len(X)), X, rng.uniform(0.5, 2.0, len(X))
+
+
+def reference(codes, X, weights):
+    counts = np.stack([np.histogram(X[codes == k], EDGES)[0] for k in range(3)])
+    sumw = np.stack([np.histogram(X[codes == k], EDGES, weights=weights[codes == k])[0] for k in range(3)])
+    return counts, sumw
+
+
+def test_uniform_bins_as_histogram():
+    _, X, _ = sample()
+    idx = uniform_bins(X, EDGES)
+    inside = (X >= EDGES[0]) & (X <= EDGES[-1])
+    assert np.all(idx[~inside] == -1)
+    assert np.array_equal(np.bincount(idx[inside], minlength=100), np.histogram(X, EDGES)[0])
+
+
+@pytest.mark.parametrize("engine", ["numpy", "loop", "numba"])
+def test_engines_agree(engine):
+    codes, X, weights = sample()
+    counts, sumw, sumw2 = np.zeros((3, 100), np.int64), np.zeros((3, 100)), np.zeros((3, 100))
+    if engine == "loop":
+        _fill_loop(codes, X, weights, EDGES, counts, sumw, sumw2)
+    else:
+        if engine == "numba":
+            pytest.importorskip("numba")
+        fill_uniform(codes, X, weights, EDGES, counts, sumw, sumw2, engine=engine)
+    ref_counts, ref_sumw = reference(codes, X, weights)
+    assert np.array_equal(counts, ref_counts)
+    assert np.allclose(sumw, ref_sumw)
+    assert np.allclose(sumw2, reference(codes, X, weights ** 2)[1])
+
+
+def test_multi_hist_matches_stream_hists():
+    codes, X, weights = sample()
+    volumes = np.array(["virtualDetector", "ShieldA", "ShieldB"])[codes]
+    mh = MultiHist(100, 0, 5000, engine="numpy")
+    mh.fill(volumes, X, weights)
+    for volume in ["virtualDetector", "ShieldA", "ShieldB"]:
+        h = StreamHist(100, 0, 5000)
+        h.fill(X[volumes == volume], weights[volumes == volume])
+        assert np.array_equal(mh.hist(volume).counts, h.counts)
+        assert np.allclose(mh.hist(volume).sumw2, h.sumw2)
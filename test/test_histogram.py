@@ -0,0 +1,61 @@
+"""
+StreamHist rebinning: exact on aligned edges, proportional split on finer bins,
+and the rebin of g4_sim_proc in the tesssa copy.
+
+How to use:
+>>> python -m pytest test/test_histogram.py
+"""
+import numpy as np
+from tesssapy.histogram import StreamHist, make_edges
+from tesssa import sim_processing as tsp
+
+
+def filled(values, weights=None):
+    h = StreamHist(5000, 0, 5000)
+    h.fill(values, weights)
+    return h
+
+
+def test_rebin_on_aligned_edges_is_exact():
+    rng = np.random.default_rng(1)
+    values = rng.uniform(0, 5000, 100_000)
+    weights = rng.uniform(0.5, 2.0, len(values))
+    h = filled(values, weights)
+    edges = np.linspace(0, 5000, 21)
+    counts, sumw, sumw2 = h.rebin(edges)
+    assert np.array_equal(counts, np.histogram(values, edges)[0])
+    assert np.allclose(sumw, np.histogram(values, edges, weights=weights)[0])
+    assert np.allclose(sumw2, np.histogram(values, edges, weights=weights**2)[0])
+
+
+def test_log_bins_finer_than_base_bins():
+    # flat spectrum: log bins below the 1 keV base width must follow the bin width, not alternate with empty bins
+    values = np.arange(0.0005, 5000, 0.001)
+    h = filled(values)
+    edges = make_edges("log", 60, 0, 5000, min_low=1.0)
+    assert np.any(np.diff(edges) < 1.0)
+
+    counts = h.rebin(edges)[0]
+    density = counts / np.diff(edges)
+    assert np.all(counts > 0)
+    assert np.allclose(density, 1000.0, rtol=1e-6)
+    assert np.isclose(counts.sum(), np.sum((values >= edges[0]) & (values <= edges[-1])), rtol=1e-6)
+
+
+def test_tesssa_copy_rebins_its_base_histograms(tmp_path, write_events):
+    rng = np.random.default_rng(4)
+    for task in range(2):
+        write_events(tmp_path / f"SSi_Co60_{task}_proc.root", {"edep": rng.uniform(0, 5000, 50_000)})
+
+    edges = np.arange(0, 5001, 50)
+    streamed = tsp.g4_sim_proc("internals", str(tmp_path), plots=False)
+    assert len(streamed.counts["total"]) == 20
+    streamed.rebin(edges)
+    full = tsp.g4_sim_proc("internals", str(tmp_path), plots=False, stream=False)
+    full.rebin(edges)
+    assert len(streamed.counts["total"]) == 100
+    assert streamed.counts["total"].sum() > 0
+    assert np.allclose(streamed.counts["total"], full.counts["total"])
+
+    streamed.rebin("log", 40)
+    assert len(streamed.counts["total"]) == 40 and np.all(streamed.counts["SSi"]["Co60"] > 0)
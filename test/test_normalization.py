@@ -0,0 +1,79 @@
+"""
+Normalized spectra of g4_sim_proc: streamed and full reads agree, totals are
+reductions of the spectrum tensor, the activity scan reproduces and scales
+them, and window rates are sums of the spectra. The normalization table
+aliases the layer names and keeps the first of duplicated rows.
+
+How to use:
+>>> python -m pytest test/test_normalization.py
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from tesssapy.norm_table import build_norm_table, layer_isotopes
+from tesssapy.sim_processing import g4_sim_proc, materials
+
+RUNS = [("SSi", "Co60", 0), ("SSi", "Co60", 1), ("SSi", "Bi214", 0), ("Pb", "U238", 0)]
+
+
+@pytest.fixture
+def folder(tmp_path, write_events):
+    rng = np.random.default_rng(10)
+    for layer, iso, task in RUNS:
+        write_events(tmp_path / f"{layer}_{iso}_{task}_boff_filtered.root",
+                     {"edep": rng.exponential(800.0, 3000)}, runMacro="/run/beamOn 100000",
+                     geometryTable="SSiTarget 10.0 SSi\nPbShield 20.0 Pb")
+    return str(tmp_path)
+
+
+def test_streamed_and_full_reads_agree(folder):
+    streamed = g4_sim_proc("internals", folder, plots=False, cache=False)
+    full = g4_sim_proc("internals", folder, plots=False, cache=False, stream=False)
+    assert streamed.counts["total"].sum() > 0
+    assert np.allclose(streamed.counts["total"], full.counts["total"])
+    assert np.allclose(streamed.counts_err["total"], full.counts_err["total"])
+
+
+def test_totals_from_the_tensor(folder):
+    sim = g4_sim_proc("internals", folder, plots=False, cache=False)
+    counts, err = sim.counts, sim.counts_err
+    assert np.allclose(counts["SSi"]["total"], counts["SSi"]["Co60"] + counts["SSi"]["Bi214"])
+    assert np.allclose(err["SSi"]["total"], np.hypot(err["SSi"]["Co60"], err["SSi"]["Bi214"]))
+    assert np.allclose(counts["total"], counts["SSi"]["total"] + counts["Pb"]["total"])
+    # layers and isotopes without files stay out of the dicts
+    assert "Cs137" not in counts["SSi"] and counts["Cu"]["total"].sum() == 0
+
+
+def test_activity_scan_scales_the_spectra(folder):
+    sim = g4_sim_proc("internals", folder, plots=False, cache=False)
+    scan = sim.activity_scan()
+    doubled = materials.assign(Activity=2 * materials["Activity"])
+    only_co60 = materials[materials["Isotope"] == "Co60"]
+    res = scan.evaluate(np.concatenate([scan.matrix(t)[0] for t in (materials, doubled, only_co60)]))
+    assert np.allclose(res["counts"][0], sim.counts["total"])
+    assert np.allclose(res["counts"][1], 2 * sim.counts["total"])
+    assert np.allclose(res["counts"][2], sim.counts["SSi"]["Co60"])
+
+
+def test_window_rates(folder):
+    sim = g4_sim_proc("internals", folder, plots=False, cache=False)
+    width = sim.edges[1] - sim.edges[0]
+    rate, _ = sim.rate(sim.xLow, sim.xHigh)
+    assert np.isclose(rate, sim.counts["total"].sum() * width)
+    # windows on the spectrum bins, all at once
+    rates, errs = sim.rate(sim.edges[:-1], sim.edges[1:], layer="SSi")
+    assert rates.shape == (len(sim.edges) - 1,)
+    assert np.allclose(rates, sim.counts["SSi"]["total"] * width)
+    assert np.allclose(errs, sim.counts_err["SSi"]["total"] * width)
+
+
+def test_norm_table_aliases_and_duplicates():
+    materials = pd.DataFrame({"Material": ["PureCu ", "PureCu", "SSi"], "Isotope": ["K40", "K40", "Co60"],
+                              "Activity": [1.0, 2.0, 3.0], "Sigma": [0.1, 0.2, 0.3]})
+    rock = pd.DataFrame({"Material": ["Rock"], "Particule": ["Gammas"], "Isotope": ["K40"],
+                         "Surface": [100.0], "Flux": [5.0], "Sigma": [0.5]})
+    table = build_norm_table(materials, rock)
+    row = table.loc[("internals", "PCu", "K40")]
+    assert row["rate"] == 1.0 and row["geo_layer"] == "PureCu" and np.isnan(row["exposure"])
+    assert table.loc[("rock", "Gammas", "K40")]["exposure"] == 100.0
+    assert layer_isotopes(table, "internals") == {"PCu": ["K40"], "SSi": ["Co60"]}
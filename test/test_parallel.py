@@ -0,0 +1,52 @@
+"""
+pool_map keeps the order of the items and falls back to a serial map when the
+pool cannot run them: func or an item that cannot be pickled, a worker killed.
+Errors of func itself are raised.
+
+How to use:
+>>> python -m pytest test/test_parallel.py
+"""
+import multiprocessing
+import os
+import pytest
+from tesssapy.parallel import pool_map
+
+
+def square(x):
+    return x * x
+
+
+def crash_in_worker(x):
+    # kills its worker process, runs normally in the main process
+    if x == 5 and multiprocessing.parent_process() is not None:
+        os._exit(1)
+    return x * x
+
+
+def fail(x):
+    if x == 3:
+        raise ValueError("bad item")
+    return x
+
+
+def test_results_in_order():
+    assert list(pool_map(square, range(20), workers=3)) == [x * x for x in range(20)]
+
+
+def test_unpicklable_func_runs_serially():
+    assert list(pool_map(lambda x: x + 1, range(5), workers=2)) == [1, 2, 3, 4, 5]
+
+
+def test_unpicklable_item_runs_serially():
+    items = [1, 2, lambda: 3, 4]
+    results = list(pool_map(callable, items, workers=2, chunksize=1))
+    assert results == [False, False, True, False]
+
+
+def test_broken_pool_runs_serially():
+    assert list(pool_map(crash_in_worker, range(12), workers=2, chunksize=1)) == [x * x for x in range(12)]
+
+
+def test_func_errors_are_raised():
+    with pytest.raises(ValueError, match="bad item"):
+        list(pool_map(fail, range(6), workers=2))
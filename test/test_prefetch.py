@@ -0,0 +1,59 @@
+"""
+prefetch keeps the order of the items and never holds more than its memory
+budget; items larger than the budget are left to the consumer.
+
+How to use:
+>>> python -m pytest test/test_prefetch.py
+"""
+import threading
+import time
+from tesssapy.prefetch import prefetch, prefetched_sources
+
+
+class Tracker:
+    """load function recording the bytes loaded and not consumed yet."""
+
+    def __init__(self, sizes):
+        self.sizes = sizes
+        self.held = self.peak = 0
+        self.lock = threading.Lock()
+
+    def load(self, item):
+        time.sleep(0.01)
+        with self.lock:
+            self.held += self.sizes[item]
+            self.peak = max(self.peak, self.held)
+        return item
+
+    def consume(self, item):
+        with self.lock:
+            self.held -= self.sizes[item]
+
+
+def test_budget_is_never_exceeded():
+    sizes = [40, 30, 50, 10, 60, 20, 30, 40]
+    tracker = Tracker(sizes)
+    out = []
+    for item, data in prefetch(range(len(sizes)), tracker.load, depth=4, memory=100, sizes=sizes, threads=4):
+        assert data == item
+        out.append(item)
+        tracker.consume(item)
+    assert out == list(range(len(sizes)))
+    assert tracker.peak <= 100
+
+
+def test_items_larger_than_the_budget_are_not_loaded():
+    sizes = [10, 500, 10]
+    tracker = Tracker(sizes)
+    got = list(prefetch(range(3), tracker.load, depth=2, memory=100, sizes=sizes))
+    assert got == [(0, 0), (1, None), (2, 2)]
+    assert tracker.peak <= 100
+
+
+def test_large_files_are_read_from_their_path(tmp_path):
+    small, large = tmp_path / "small.root", tmp_path / "large.root"
+    small.write_bytes(b"x" * 10)
+    large.write_bytes(b"x" * 1000)
+    sources = list(prefetched_sources([str(small), str(large)], memory=100, sizes=[10, 1000]))
+    assert sources[0].read() == b"x" * 10
+    assert sources[1] == str(large)
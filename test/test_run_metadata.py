@@ -0,0 +1,47 @@
+"""
+beamOn and masses are read from one open of each file, and RunMetadata only
+reopens the files changed since its last run.
+
+How to use:
+>>> python -m pytest test/test_run_metadata.py
+"""
+import numpy as np
+import tesssapy.get_norm_param as gnp
+from tesssapy.dataset_index import DatasetIndex
+from tesssapy.get_norm_param import RunMetadata, read_run_metadata
+
+GEOMETRY = "Target 10.0 Cu\nHolder 2.5 Cu\nShield 30 Pb"
+
+
+def write_run(write_events, path, beamon):
+    write_events(path, {"edep": np.ones(10)}, runMacro=f"/control/verbose 0\n/run/beamOn {beamon}",
+                 geometryTable=GEOMETRY)
+
+
+def test_read_run_metadata(tmp_path, write_events):
+    path = tmp_path / "Cu_K40_0_boff_filtered.root"
+    write_run(write_events, path, 1000)
+    assert read_run_metadata(str(path)) == {"beamon": 1000, "masses": {"Cu": 12.5, "Pb": 30.0}}
+    # no macros: nothing found, no error
+    write_events(path, {"edep": np.ones(10)})
+    assert read_run_metadata(str(path)) == {"beamon": None, "masses": {}}
+
+
+def test_only_changed_files_are_read_again(tmp_path, write_events, monkeypatch):
+    for task in range(3):
+        write_run(write_events, tmp_path / f"Cu_K40_{task}_boff_filtered.root", 1000)
+    opened = []
+
+    def counting(path):
+        opened.append(path)
+        return read_run_metadata(path)
+    monkeypatch.setattr(gnp, "read_run_metadata", counting)
+
+    def collect():
+        return RunMetadata(str(tmp_path)).collect(DatasetIndex(str(tmp_path)).select(stage="filtered"))
+
+    assert sum(m["beamon"] for m in collect().values()) == 3000
+    assert len(opened) == 3
+    write_run(write_events, tmp_path / "Cu_K40_1_boff_filtered.root", 25000)
+    assert sum(m["beamon"] for m in collect().values()) == 27000
+    assert opened[3:] == [str(tmp_path / "Cu_K40_1_boff_filtered.root")]
@@ -0,0 +1,41 @@
+"""
+BranchSchema reads columns by name through their aliases, raises on a missing
+column and reads optional columns only when the dataset has them.
+
+How to use:
+>>> python -m pytest test/test_schema.py
+"""
+import numpy as np
+import pytest
+from tesssapy.schema import BranchSchema
+
+
+@pytest.fixture
+def path(tmp_path, write_events):
+    # timeStamp written under its alias t, and the columns in another order than the reads
+    path = str(tmp_path / "Cu_K40_0_boff_filtered.root")
+    write_events(path, {"edep": np.arange(5.0), "t": np.arange(5.0) * 10, "eventID": np.arange(5, dtype=np.int32)})
+    return path
+
+
+def test_columns_by_name(path):
+    schema = BranchSchema(["eventID", "timeStamp", "edep"]).resolve(path)
+    assert schema.branches == {"eventID": "eventID", "timeStamp": "t", "edep": "edep"}
+    arrays = schema.read(path)
+    assert np.array_equal(arrays["timeStamp"], np.arange(5.0) * 10)
+    chunks = list(schema.iterate(path, step_size=2))
+    assert len(chunks) == 3 and np.array_equal(np.concatenate([c["edep"] for c in chunks]), arrays["edep"])
+
+
+def test_missing_and_optional_columns(path):
+    with pytest.raises(KeyError, match="clusterIndex"):
+        BranchSchema(["clusterIndex", "edep"]).resolve(path)
+    schema = BranchSchema(["edep"], optional=["taskIndex", "eventID"]).resolve(path)
+    assert sorted(schema.read(path)) == ["edep", "eventID"]
+
+
+def test_unreadable_files(tmp_path, path):
+    missing = str(tmp_path / "missing.root")
+    schema = BranchSchema(["edep"]).resolve([missing, path])
+    assert schema.branches == {"edep": "edep"}
+    assert schema.read(missing) is None and list(schema.iterate(missing)) == []
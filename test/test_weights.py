@@ -0,0 +1,65 @@
+"""
+Biased runs are histogrammed with their weight branch by default, and every
+spectrum, rate and activity scan error adds the activity sigma and the Monte
+Carlo statistics.
+
+How to use:
+>>> python -m pytest test/test_weights.py
+"""
+import numpy as np
+import pytest
+from tesssapy.sim_processing import g4_sim_proc, materials, norm_table
+
+
+def run_arrays(weighted):
+    rng = np.random.default_rng(5)
+    event = np.repeat(np.arange(2000), 2)
+    arrays = {"eventID": event.astype(np.int32), "edep": rng.uniform(0, 5000, len(event))}
+    if weighted:
+        arrays["weight"] = rng.uniform(0.01, 0.2, 2000)[event]
+    return arrays
+
+
+@pytest.fixture
+def write_run(write_events):
+    def write(path, weighted):
+        return write_events(path, run_arrays(weighted), runMacro="/run/beamOn 100000",
+                            geometryTable="SSiTarget 10.0 SSi")
+    return write
+
+
+def test_biased_runs_are_weighted_by_default(tmp_path, write_run):
+    arrays = write_run(str(tmp_path / "SSi_Co60_0_bon_filtered.root"), weighted=True)
+    sim = g4_sim_proc("internals", str(tmp_path), bias="bon", plots=False, cache=False)
+    assert sim.weight == "weight"
+    assert np.isclose(sim.hists["SSi"]["Co60"].sumw.sum(), arrays["weight"].sum())
+    assert np.isclose(sim.get_hist("SSi", "Co60")[1].sum(), arrays["weight"].sum())
+
+    unweighted = g4_sim_proc("internals", str(tmp_path), bias="bon", plots=False, cache=False, weight=False)
+    assert unweighted.weight is None
+    assert unweighted.get_hist("SSi", "Co60")[1].sum() == len(arrays["edep"])
+
+
+def test_biased_run_without_weight_branch_raises(tmp_path, write_run):
+    write_run(str(tmp_path / "SSi_Co60_0_bon_filtered.root"), weighted=False)
+    with pytest.raises(KeyError, match="weight"):
+        g4_sim_proc("internals", str(tmp_path), bias="bon", plots=False, cache=False)
+
+
+@pytest.mark.parametrize("bias", ["boff", "bon"])
+def test_spectrum_and_rate_errors_agree(tmp_path, write_run, bias):
+    write_run(str(tmp_path / f"SSi_Co60_0_{bias}_filtered.root"), weighted=bias == "bon")
+    sim = g4_sim_proc("internals", str(tmp_path), bias=bias, plots=False, cache=False)
+    counts, counts_err = sim.counts["SSi"]["Co60"], sim.counts_err["SSi"]["Co60"]
+    rate, rate_err = sim.rate(0, sim.edges[1], layer="SSi", isotope="Co60")
+    width = sim.edges[1] - sim.edges[0]
+    assert counts[0] > 0 and np.isclose(rate, counts[0] * width)
+    assert np.isclose(rate_err, counts_err[0] * width)
+    # the activity sigma alone would give counts * sigma / activity, the statistics add to it
+    row = norm_table.loc[("internals", "SSi", "Co60")]
+    assert np.all(counts_err > counts * row["rate_err"] / row["rate"])
+
+    # the activity scan of the same table gives the same errors
+    res = sim.activity_scan().evaluate(*sim.activity_scan().matrix(materials))
+    assert np.allclose(res["counts"][0], sim.counts["total"])
+    assert np.allclose(res["counts_err"][0], sim.counts_err["total"])